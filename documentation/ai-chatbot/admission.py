@@ -0,0 +1,128 @@
+# ============================================================================
+# ADMISSION CONTROL - Who waits for an inference worker, and in which order
+# Bounded waiting room with an urgent lane, round-robin between patients and
+# client deadlines; anything that cannot be served in time is refused at once
+# ============================================================================
+
+import json
+import math
+from collections import OrderedDict, deque
+from typing import NamedTuple, Optional
+
+from fallback_engine import DEFAULT_RULES_PATH
+from specialty_classifier import SpecialtyClassifier
+
+URGENT = "urgent"
+NORMAL = "normal"
+LANES = (URGENT, NORMAL)
+
+
+class QueueFullError(Exception):
+    """Request refused before reaching a worker (answered with 429)
+
+    ``reason`` is 'queue_full', 'patient_limit', 'deadline' (it could not be
+    answered before the client gives up), 'evicted' (an urgent request
+    took its place) or 'shutting_down' (this worker is draining, another
+    one will answer); ``retry_after`` is a hint in whole seconds.
+    """
+
+    def __init__(self, message, reason="queue_full", retry_after=1):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """The request waited past its client's timeout and was dropped unanswered"""
+
+
+class Ticket(NamedTuple):
+    """How a request should be queued: patient, lane and client deadline"""
+    patient_id: Optional[str] = None
+    urgent: bool = False
+    # time.monotonic() value after which the client no longer waits
+    deadline: Optional[float] = None
+
+    @property
+    def lane(self):
+        return URGENT if self.urgent else NORMAL
+
+
+def load_urgency_classifier(rules_path=DEFAULT_RULES_PATH):
+    """Red flags of the fallback rules plus the words patients use to say it is urgent"""
+    with open(rules_path, encoding='utf-8') as f:
+        rules = json.load(f)
+    tables = {}
+    for source in (rules["red_flags"], rules.get("urgency_keywords", {})):
+        for language, table in source.items():
+            tables.setdefault(language, {}).update(table)
+    return SpecialtyClassifier(tables, default_specialist=None)
+
+
+def retry_after_seconds(seconds):
+    return max(1, math.ceil(seconds))
+
+
+class AdmissionQueue:
+    """Requests waiting for a worker, in two lanes.
+
+    The urgent lane is always served first. Inside a lane patients take
+    turns: each one's requests wait in their own FIFO and the next request
+    comes from the patient who was served least recently, so a patient
+    sending a burst only delays their own messages. When the queue is full
+    an urgent request takes the place of the newest normal request of the
+    patient with the most waiting.
+
+    Not thread-safe: the inference executor calls it under its lock.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._lanes = {lane: OrderedDict() for lane in LANES}
+        self._sizes = {lane: 0 for lane in LANES}
+
+    def __len__(self):
+        return sum(self._sizes.values())
+
+    def queued(self, lane):
+        return self._sizes[lane]
+
+    def push(self, item, key):
+        """Queue ``item`` under patient ``key``; returns the item it evicted, if any
+
+        Raises QueueFullError when the queue is full and nothing can make room.
+        """
+        lane = item.ticket.lane
+        evicted = None
+        if len(self) >= self.capacity:
+            if lane != URGENT or not self._sizes[NORMAL]:
+                raise QueueFullError(f"Inference queue full ({len(self)} requests waiting)")
+            evicted = self._evict_normal()
+        self._lanes[lane].setdefault(key, deque()).append(item)
+        self._sizes[lane] += 1
+        return evicted
+
+    def _evict_normal(self):
+        patients = self._lanes[NORMAL]
+        key = max(patients, key=lambda patient: len(patients[patient]))
+        item = patients[key].pop()
+        if not patients[key]:
+            del patients[key]
+        self._sizes[NORMAL] -= 1
+        return item
+
+    def pop(self):
+        """Next request to run, or None when nothing is waiting"""
+        for lane in LANES:
+            patients = self._lanes[lane]
+            if not patients:
+                continue
+            key, items = next(iter(patients.items()))
+            item = items.popleft()
+            if items:
+                patients.move_to_end(key)
+            else:
+                del patients[key]
+            self._sizes[lane] -= 1
+            return item
+        return None
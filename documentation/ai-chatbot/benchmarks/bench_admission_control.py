@@ -0,0 +1,193 @@
+# ============================================================================
+# BENCHMARK - Goodput of /chat under overload, with and without admission control
+#
+# Open-loop load at --overload times what the inference workers can serve
+# (measured with FakeOllama's generation time), from --patients patients
+# plus one noisy patient sending --noisy-share of the traffic; --urgent-share
+# of the messages carry a red flag ('douleur dans la poitrine'). Clients give
+# up after --client-timeout seconds, like the backend client's 30 s.
+#
+#   unbounded  - the old limits: a deep queue, no deadlines and no
+#                per-patient limit, so the queue grows until answers arrive
+#                after clients left (the urgent lane is on in both modes)
+#   admission  - bounded queue, urgent lane, per-patient limit, deadlines
+#                from X-Request-Timeout, fast 429 + Retry-After
+#
+# Goodput counts answers that reached the client before its timeout.
+# Wasted generations are model calls whose answer nobody received.
+#
+# Usage: python bench_admission_control.py --overload 3 --duration 20
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from common import add_chatbot_to_path, free_port, start_uvicorn, summarize, use_temp_workdir
+from stub_model import FakeOllama
+from workload import generate_conversations
+
+URGENT_MESSAGE = "J'ai une douleur dans la poitrine et au bras gauche"
+NOISY_PATIENT = "patient-noisy"
+
+
+def post_chat(url, payload, timeout, send_timeout=True):
+    """(outcome, seconds): 'ok', 'timeout', '429', '504'... as seen by a client waiting ``timeout``"""
+    headers = {"Content-Type": "application/json"}
+    if send_timeout:
+        headers["X-Request-Timeout"] = f"{timeout:g}"
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            outcome = "ok" if response.status == 200 else str(response.status)
+    except urllib.error.HTTPError as e:
+        outcome = str(e.code)
+    except (socket.timeout, TimeoutError, urllib.error.URLError):
+        outcome = "timeout"
+    return outcome, time.perf_counter() - started
+
+
+def schedule(args, rate):
+    """Seeded open-loop arrivals: (send time, patient, message, urgent)"""
+    rng = random.Random(args.seed)
+    conversations = generate_conversations(args.seed, args.patients, 3, 5)
+    arrivals, t = [], 0.0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= args.duration:
+            return arrivals
+        if rng.random() < args.noisy_share:
+            patient, message = NOISY_PATIENT, "J'ai encore une question sur mon traitement"
+        else:
+            conversation = rng.choice(conversations)
+            patient, message = conversation.patient_id, rng.choice(conversation.messages)
+        urgent = rng.random() < args.urgent_share
+        arrivals.append((t, patient, URGENT_MESSAGE if urgent else message, urgent))
+
+
+def run(server, args, mode, arrivals):
+    model = FakeOllama(tokens_per_s=args.tokens_per_s, first_token_s=args.first_token_ms / 1000)
+    if mode == "unbounded":
+        config = server.ChatbotConfig(
+            db_path=f"bench_{mode}.db", max_concurrency=args.workers, queue_depth=100000,
+            max_per_patient=0, request_timeout=0, model_warmup=False
+        )
+    else:
+        config = server.ChatbotConfig(
+            db_path=f"bench_{mode}.db", max_concurrency=args.workers, queue_depth=args.queue_depth,
+            max_per_patient=args.max_per_patient, model_warmup=False
+        )
+    app = server.create_app(config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = app.state.services.bot
+        bot.client = model
+        uvicorn_server, thread = start_uvicorn(app, free_port())
+    url = f"http://127.0.0.1:{uvicorn_server.config.port}/chat"
+
+    results = []
+    lock = threading.Lock()
+
+    def client(patient, message, urgent):
+        payload = {"message": message, "patient_id": patient, "language": "fr"}
+        outcome, seconds = post_chat(url, payload, args.client_timeout, send_timeout=mode == "admission")
+        with lock:
+            results.append((patient, urgent, outcome, seconds))
+
+    threads = []
+    started = time.perf_counter()
+    for at, patient, message, urgent in arrivals:
+        delay = started + at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        thread_ = threading.Thread(target=client, args=(patient, message, urgent))
+        thread_.start()
+        threads.append(thread_)
+    for thread_ in threads:
+        thread_.join()
+    elapsed = time.perf_counter() - started
+
+    # Let the unbounded queue drain to count the generations it still runs for nobody
+    executor = app.state.services.executor
+    while executor.stats()["in_flight"]:
+        time.sleep(0.1)
+    inference = executor.stats()
+    with contextlib.redirect_stdout(io.StringIO()):
+        uvicorn_server.should_exit = True
+        thread.join()
+
+    outcomes = Counter(outcome for _, _, outcome, _ in results)
+    answered = [seconds for _, _, outcome, seconds in results if outcome == "ok"]
+    refused = [seconds for _, _, outcome, seconds in results if outcome == "429"]
+    urgent_answered = [seconds for _, urgent, outcome, seconds in results if urgent and outcome == "ok"]
+    urgent_total = sum(1 for _, urgent, _, _ in results if urgent)
+    noisy = [outcome for patient, _, outcome, _ in results if patient == NOISY_PATIENT]
+    others = [outcome for patient, _, outcome, _ in results if patient != NOISY_PATIENT]
+    return {
+        "mode": mode,
+        "requests": len(results),
+        "offered_per_s": round(len(results) / args.duration, 2),
+        "outcomes": dict(outcomes),
+        "server_rejections": inference["rejected_by_reason"],
+        "server_expired": inference["expired"],
+        "goodput_per_s": round(len(answered) / elapsed, 2),
+        "answered_share": round(len(answered) / len(results), 3),
+        "model_calls": model.calls,
+        "wasted_generations": model.calls - len(answered),
+        "answered_latency": summarize(answered),
+        "refusal_latency": summarize(refused),
+        "urgent_answered": f"{len(urgent_answered)}/{urgent_total}",
+        "urgent_latency": summarize(urgent_answered),
+        "noisy_patient_answered": f"{noisy.count('ok')}/{len(noisy)}",
+        "other_patients_answered": f"{others.count('ok')}/{len(others)}"
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/chat goodput under overload")
+    parser.add_argument("--overload", type=float, default=3.0, help="offered load / serving capacity")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of arrivals")
+    parser.add_argument("--client-timeout", type=float, default=3.0, help="seconds a client waits")
+    parser.add_argument("--workers", type=int, default=2, help="CHATBOT_MAX_CONCURRENCY")
+    parser.add_argument("--queue-depth", type=int, default=8, help="CHATBOT_QUEUE_DEPTH (admission mode)")
+    parser.add_argument("--max-per-patient", type=int, default=2, help="CHATBOT_MAX_PER_PATIENT (admission mode)")
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--noisy-share", type=float, default=0.3, help="traffic share of the noisy patient")
+    parser.add_argument("--urgent-share", type=float, default=0.1)
+    parser.add_argument("--tokens-per-s", type=float, default=200.0, help="fake model decode speed")
+    parser.add_argument("--first-token-ms", type=float, default=50.0, help="fake model prompt + first token time")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    # Capacity from the fake model's generation time for a typical answer
+    model = FakeOllama(tokens_per_s=args.tokens_per_s, first_token_s=args.first_token_ms / 1000)
+    words = len(model.reply_for([{"role": "user", "content": "J'ai mal de tête depuis deux jours"}]).split(" "))
+    service_time = args.first_token_ms / 1000 + words / args.tokens_per_s
+    capacity = args.workers / service_time
+    arrivals = schedule(args, capacity * args.overload)
+    print(f"⚙️ capacity ≈ {capacity:.1f} answers/s, offering {len(arrivals) / args.duration:.1f} req/s "
+          f"for {args.duration:g}s, clients wait {args.client_timeout:g}s")
+
+    results = [run(server, args, mode, arrivals) for mode in ("unbounded", "admission")]
+    print(json.dumps(results, indent=2))
+    for result in results:
+        print(f"📊 {result['mode']:10} goodput {result['goodput_per_s']:>6}/s  answered {result['answered_share']:.0%}  "
+              f"wasted {result['wasted_generations']:>4}  urgent {result['urgent_answered']}  "
+              f"noisy {result['noisy_patient_answered']}  others {result['other_patients_answered']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# ============================================================================
+# BENCHMARK - Request throughput of the CPU-bound paths at 1, 2, 4, 8 workers
+#
+# Starts the real server (python colab_medical_chatbot_fixed.py --workers N)
+# against an instant model: an OpenAI-compatible stub serving FakeOllama
+# with no generation time, so what is left is the chatbot's own CPU work.
+# --clients closed-loop clients then run each scenario for --duration s:
+#   chat     - POST /chat: history, prompt, post-processing (specialist,
+#              disclaimer, bold terms) and persistence of a long answer
+#   history  - GET /conversations/{id}?page_size=--page-size on conversations
+#              pre-filled with --history-messages messages (SQLite read and
+#              JSON serialization)
+# The drain check then sends SIGTERM to a 2-worker server while slow
+# generations are running and counts how many were still answered and saved.
+#
+# Scaling needs as many free cores as workers (plus the clients): on a
+# 1-CPU machine every worker count gives about the same throughput.
+#
+# Usage: python bench_api_workers.py --workers 1,2,4,8 --duration 10
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from common import CHATBOT_DIR, add_chatbot_to_path, free_port, start_uvicorn, summarize, use_temp_workdir
+from stub_model import FakeOllama
+from stub_server import create_openai_stub_app
+from workload import generate_conversations
+
+SCENARIOS = ("chat", "history")
+
+
+def request(url, payload=None, timeout=120):
+    """(HTTP status, decoded JSON body or None)"""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    headers = {"Content-Type": "application/json"} if payload is not None else {}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers), timeout=timeout) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except OSError:
+        return None, None
+
+
+def start_model(first_token_s):
+    """OpenAI-compatible stub model on a background thread; returns (server, backends JSON path)"""
+    model = FakeOllama(tokens_per_s=1e9, first_token_s=first_token_s, reply_sentences=6)
+    with contextlib.redirect_stdout(io.StringIO()):
+        server, _ = start_uvicorn(create_openai_stub_app(model), free_port())
+    path = os.path.abspath(f"backends_{server.config.port}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"backends": [{
+            "name": "stub", "type": "openai", "url": f"http://127.0.0.1:{server.config.port}/v1"
+        }]}, f)
+    return server, path
+
+
+def fill_history(db_path, conversations, messages):
+    """``messages`` saved messages in each conversation, like a long chat"""
+    add_chatbot_to_path()
+    from chat_store import INSERT_MESSAGE_SQL, configure_connection, create_schema, utc_timestamp
+
+    model = FakeOllama(reply_sentences=6)
+    conn = configure_connection(sqlite3.connect(db_path))
+    create_schema(conn)
+    for c in conversations:
+        rows = []
+        for i in range(messages):
+            question = c.messages[i // 2 % len(c.messages)]
+            text = question if i % 2 == 0 else model.reply_for([{"role": "user", "content": question}])
+            rows.append((c.conversation_id, c.patient_id, text, "user" if i % 2 == 0 else "assistant", utc_timestamp()))
+        conn.executemany(INSERT_MESSAGE_SQL, rows)
+    conn.commit()
+    conn.close()
+
+
+class Server:
+    """The chatbot server as a child process, like a production launch"""
+
+    def __init__(self, workers, db_path, backends, args, extra_env=None):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        env = {
+            **os.environ,
+            "CHATBOT_MAX_PER_PATIENT": "0",
+            "CHATBOT_QUEUE_DEPTH": str(args.clients * 2),
+            "CHATBOT_HEALTH_INTERVAL": "1",
+            **(extra_env or {})
+        }
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(CHATBOT_DIR, "colab_medical_chatbot_fixed.py"), "--no-tunnel",
+             "--workers", str(workers), "--port", str(self.port), "--db-path", db_path,
+             "--backends", backends, "--log-level", "warning"],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        self.output = []
+        threading.Thread(target=lambda: self.output.extend(self.process.stdout), daemon=True).start()
+        self.wait_ready(workers)
+
+    def wait_ready(self, workers, timeout=120):
+        """Until /readyz answered 200 from every worker (told apart by /status worker_pid)"""
+        deadline = time.monotonic() + timeout
+        ready = set()
+        while len(ready) < workers:
+            if time.monotonic() > deadline or self.process.poll() is not None:
+                self.stop()
+                raise RuntimeError("server did not become ready:\n" + "".join(self.output[-20:]))
+            status, body = request(f"{self.base_url}/status", timeout=5)
+            if status == 200 and body["readiness"]["ready"]:
+                ready.add(body["worker_pid"])
+            else:
+                time.sleep(0.1)
+
+    def worker_pids(self, samples):
+        return {body["worker_pid"] for status, body in (request(f"{self.base_url}/status") for _ in range(samples))
+                if status == 200}
+
+    def stop(self, sig=signal.SIGTERM, timeout=120):
+        if self.process.poll() is None:
+            self.process.send_signal(sig)
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        return "".join(self.output)
+
+
+def load(clients, duration, call):
+    """``clients`` threads calling ``call(client, i)`` until ``duration`` is over"""
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(n):
+        i = 0
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            status = call(n, i)
+            i += 1
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run(args, workers, scenario, conversations, db_path, backends):
+    server = Server(workers, db_path, backends, args)
+    base_url = server.base_url
+    try:
+        if scenario == "chat":
+            def call(n, i):
+                c = conversations[(n + i * args.clients) % len(conversations)]
+                return request(f"{base_url}/chat", {
+                    "message": c.messages[i % len(c.messages)],
+                    "conversation_id": f"{c.conversation_id}-w{workers}",
+                    "patient_id": c.patient_id,
+                    "language": c.language
+                })[0]
+        else:
+            def call(n, i):
+                c = conversations[(n + i * args.clients) % len(conversations)]
+                return request(f"{base_url}/conversations/{c.conversation_id}?patient_id={c.patient_id}"
+                               f"&page_size={args.page_size}")[0]
+
+        latencies, statuses, elapsed = load(args.clients, args.duration, call)
+        pids = server.worker_pids(workers * 8)
+    finally:
+        server.stop()
+    return {
+        "scenario": scenario,
+        "workers": workers,
+        "requests": len(latencies),
+        "statuses": dict(statuses),
+        "requests_per_s": round(statuses[200] / elapsed, 1),
+        "latency": summarize(latencies),
+        "workers_answering": len(pids)
+    }
+
+
+def drain_check(args, conversations, db_path):
+    """SIGTERM during slow generations: were the admitted requests answered and saved?"""
+    model_server, backends = start_model(args.drain_model_ms / 1000)
+    server = Server(2, db_path, backends, args, {"CHATBOT_MAX_CONCURRENCY": str(args.clients)})
+    outcomes = Counter()
+    answered = []
+    lock = threading.Lock()
+
+    def client(n):
+        c = conversations[n % len(conversations)]
+        conversation_id = f"{c.conversation_id}-drain"
+        status, _ = request(f"{server.base_url}/chat", {
+            "message": c.messages[0], "conversation_id": conversation_id,
+            "patient_id": c.patient_id, "language": c.language
+        })
+        with lock:
+            outcomes[status] += 1
+            if status == 200:
+                answered.append((conversation_id, c.patient_id))
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    # Every request admitted and generating when the shutdown starts
+    time.sleep(min(0.5, args.drain_model_ms / 2000))
+    stopped = time.perf_counter()
+    output = server.stop()
+    shutdown_s = time.perf_counter() - stopped
+    for thread in threads:
+        thread.join()
+    model_server.should_exit = True
+
+    conn = sqlite3.connect(db_path)
+    saved = sum(
+        conn.execute("SELECT COUNT(*) FROM chat_history WHERE conversation_id = ? AND patient_id = ?", key).fetchone()[0]
+        for key in answered
+    )
+    conn.close()
+    return {
+        "requests": args.clients,
+        "outcomes": {str(status): count for status, count in outcomes.items()},
+        "messages_saved": f"{saved}/{2 * len(answered)}",
+        "shutdown_s": round(shutdown_s, 2),
+        "server_exit_code": server.process.returncode,
+        "server_log_tail": output.strip().splitlines()[-12:]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU-bound request throughput by API worker count")
+    parser.add_argument("--workers", default="1,2,4,8", help="worker counts, comma separated")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--clients", type=int, default=16, help="concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario and worker count")
+    parser.add_argument("--conversations", type=int, default=64)
+    parser.add_argument("--history-messages", type=int, default=100, help="messages pre-filled per conversation")
+    parser.add_argument("--page-size", type=int, default=100, help="history page size")
+    parser.add_argument("--drain-model-ms", type=float, default=2000.0,
+                        help="generation time during the drain check (0 skips it)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    use_temp_workdir()
+    conversations = generate_conversations(args.seed, args.conversations, 4, 6)
+    db_path = os.path.abspath("bench_workers.db")
+    fill_history(db_path, conversations, args.history_messages)
+    model_server, backends = start_model(0.0)
+
+    report = {"config": vars(args), "cpus": os.cpu_count(), "results": []}
+    for scenario in args.scenarios.split(","):
+        for workers in (int(value) for value in args.workers.split(",")):
+            result = run(args, workers, scenario, conversations, db_path, backends)
+            report["results"].append(result)
+            print(f"📊 {scenario:8} {workers} workers: {result['requests_per_s']:>7} req/s  "
+                  f"p50 {result['latency']['p50_ms']} ms  p99 {result['latency']['p99_ms']} ms  "
+                  f"statuses {result['statuses']}  answering {result['workers_answering']}")
+    model_server.should_exit = True
+
+    if args.drain_model_ms > 0:
+        report["drain"] = drain_check(args, conversations, db_path)
+        print(f"🛑 drain: {report['drain']['outcomes']} saved {report['drain']['messages_saved']} "
+              f"in {report['drain']['shutdown_s']}s (exit {report['drain']['server_exit_code']})")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
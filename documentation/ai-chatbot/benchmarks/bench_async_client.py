@@ -0,0 +1,133 @@
+# ============================================================================
+# BENCHMARK - Backend client throughput: requests threads vs asyncio/httpx
+#
+# Serves the stub chatbot API (fixed /chat latency) and drives it with N
+# concurrent conversations, each sending --messages messages in sequence:
+#   requests_threads - ColabMedicalChatbot, one thread + Session per conversation
+#   async            - one AsyncColabMedicalChatbot, one task per conversation
+#   sync_facade      - SyncColabMedicalChatbot from N threads, sharing one pool
+# The async modes use --pool connections (and the same concurrency limit);
+# conversations beyond it wait on the semaphore instead of opening sockets.
+#
+# Usage: python bench_async_client.py --levels 1 50 500 --latency 0.1 --pool 32
+# ============================================================================
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import threading
+import time
+
+from common import add_backend_ai_to_path, free_port, start_uvicorn, summarize
+from stub_server import create_stub_app
+
+add_backend_ai_to_path()
+from colab_async_client import AsyncColabMedicalChatbot, SyncColabMedicalChatbot  # noqa: E402
+from colab_integration import ColabMedicalChatbot  # noqa: E402
+
+
+def run_threads(level, messages, make_worker):
+    """Run ``make_worker(i)`` on ``level`` threads; return (latencies, statuses)"""
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def conversation(i, send):
+        for m in range(messages):
+            start = time.perf_counter()
+            result = send(f"Question {m} de la conversation {i}", f"patient-{i}", f"conv-{i}")
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(result["status"])
+
+    threads = [threading.Thread(target=conversation, args=(i, make_worker(i))) for i in range(level)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses
+
+
+def bench_requests_threads(base_url, level, messages, pool):
+    # ColabMedicalChatbot prints a connection banner per instance
+    with contextlib.redirect_stdout(io.StringIO()):
+        clients = [ColabMedicalChatbot(base_url) for _ in range(level)]
+    try:
+        return run_threads(level, messages, lambda i: clients[i].send_message)
+    finally:
+        for client in clients:
+            client.session.close()
+
+
+def bench_sync_facade(base_url, level, messages, pool):
+    chatbot = SyncColabMedicalChatbot.from_url(base_url, max_concurrency=pool, max_connections=pool)
+    try:
+        return run_threads(level, messages, lambda i: chatbot.send_message)
+    finally:
+        chatbot.close()
+
+
+def bench_async(base_url, level, messages, pool):
+    async def main():
+        latencies, statuses = [], []
+        async with AsyncColabMedicalChatbot(base_url, max_concurrency=pool, max_connections=pool) as chatbot:
+            async def conversation(i):
+                for m in range(messages):
+                    start = time.perf_counter()
+                    result = await chatbot.send_message(
+                        f"Question {m} de la conversation {i}", f"patient-{i}", f"conv-{i}"
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    statuses.append(result["status"])
+
+            await asyncio.gather(*[conversation(i) for i in range(level)])
+        return latencies, statuses
+
+    return asyncio.run(main())
+
+
+MODES = {
+    "requests_threads": bench_requests_threads,
+    "async": bench_async,
+    "sync_facade": bench_sync_facade,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async backend client throughput")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 50, 500], help="concurrent conversations")
+    parser.add_argument("--messages", type=int, default=4, help="messages per conversation")
+    parser.add_argument("--latency", type=float, default=0.1, help="stub /chat latency (s)")
+    parser.add_argument("--pool", type=int, default=32, help="async client connections")
+    args = parser.parse_args()
+
+    port = free_port()
+    start_uvicorn(create_stub_app(latency=args.latency), port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    report = {"config": vars(args), "results": []}
+    for level in args.levels:
+        for name, bench in MODES.items():
+            threads_before = threading.active_count()
+            start = time.perf_counter()
+            latencies, statuses = bench(base_url, level, args.messages, args.pool)
+            wall = time.perf_counter() - start
+            ok = statuses.count("success")
+            report["results"].append({
+                "mode": name,
+                "concurrent_conversations": level,
+                "messages_per_s": round(ok / wall, 1),
+                "errors": len(statuses) - ok,
+                "latency": summarize(latencies),
+                "threads_used": level if name != "async" else threading.active_count() - threads_before
+            })
+            print(f"📊 {name:>16} x{level:<4} {report['results'][-1]['messages_per_s']:>8} msg/s "
+                  f"p99={report['results'][-1]['latency']['p99_ms']}ms errors={len(statuses) - ok}")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# ============================================================================
+# BENCHMARK - chat_history write throughput
+#
+# Writes N chat turns (user + assistant message) three ways:
+#   per_message_commit - original behaviour: 2 INSERTs + 2 commits per turn,
+#                        default rollback journal with synchronous=FULL
+#   batched            - one executemany + commit per turn, WAL + NORMAL
+#   write_behind       - turns queued and flushed in batches, WAL + NORMAL
+#
+# Usage: python bench_chat_persistence.py --turns 100000
+# ============================================================================
+
+import argparse
+import json
+import sqlite3
+import time
+
+from common import add_chatbot_to_path, use_temp_workdir
+
+add_chatbot_to_path()
+from chat_store import ChatHistoryWriter, SQLiteConnectionPool, create_schema  # noqa: E402
+
+USER_MESSAGE = "J'ai mal à la tête depuis deux jours, que dois-je faire ?"
+ASSISTANT_MESSAGE = (
+    "Je comprends votre inquiétude. Reposez-vous et hydratez-vous. "
+    "👨‍⚕️ **Recommandation médicale**: consultez un **neurologue** si cela persiste."
+)
+
+
+def run_per_message_commit(turns):
+    conn = sqlite3.connect("per_message.db")
+    create_schema(conn)
+    start = time.perf_counter()
+    for i in range(turns):
+        for message, sender in ((USER_MESSAGE, "user"), (ASSISTANT_MESSAGE, "assistant")):
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO chat_history (conversation_id, patient_id, message, sender)
+                VALUES (?, ?, ?, ?)
+            ''', (f"conv-{i % 1000}", f"patient-{i % 1000}", message, sender))
+            conn.commit()
+    elapsed = time.perf_counter() - start
+    count = conn.execute("SELECT COUNT(*) FROM chat_history").fetchone()[0]
+    conn.close()
+    return count, elapsed
+
+
+def run_writer(turns, name, write_behind):
+    pool = SQLiteConnectionPool(name, synchronous="NORMAL")
+    with pool.write() as conn:
+        create_schema(conn)
+    writer = ChatHistoryWriter(pool, write_behind=write_behind, flush_size=256, flush_interval=0.5)
+    start = time.perf_counter()
+    for i in range(turns):
+        writer.save_messages(f"conv-{i % 1000}", f"patient-{i % 1000}", [
+            (USER_MESSAGE, "user"),
+            (ASSISTANT_MESSAGE, "assistant")
+        ])
+    writer.close()
+    elapsed = time.perf_counter() - start
+    with pool.read() as conn:
+        count = conn.execute("SELECT COUNT(*) FROM chat_history").fetchone()[0]
+    pool.close()
+    return count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="chat_history write throughput")
+    parser.add_argument("--turns", type=int, default=100000)
+    args = parser.parse_args()
+
+    use_temp_workdir()
+    runs = {
+        "per_message_commit": lambda: run_per_message_commit(args.turns),
+        "batched": lambda: run_writer(args.turns, "batched.db", write_behind=False),
+        "write_behind": lambda: run_writer(args.turns, "write_behind.db", write_behind=True),
+    }
+
+    results = {}
+    for mode, run in runs.items():
+        rows, elapsed = run()
+        assert rows == 2 * args.turns, f"{mode}: expected {2 * args.turns} rows, found {rows}"
+        results[mode] = {"seconds": round(elapsed, 2), "turns_per_sec": round(args.turns / elapsed)}
+        print(f"📊 {mode}: {results[mode]}")
+
+    print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
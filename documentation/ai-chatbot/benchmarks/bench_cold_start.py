@@ -0,0 +1,141 @@
+# ============================================================================
+# BENCHMARK - Import time and cold start of the chatbot server
+#
+# In fresh Python processes (scratch working directory each time):
+#   - import: time to import colab_medical_chatbot_fixed, and whether the
+#     import left side effects behind (a medical_chatbot.db file)
+#   - serve: time from launching the CLI (--no-tunnel) until the first
+#     GET /conversations/{id} answers 200, i.e. the bot and database are up,
+#     plus the startup phases the server reports (no Ollama here, so the
+#     model warm-up fails fast)
+# Then, in this process, launch() with a stub model that takes
+# --model-load seconds to load: readiness should follow the load time
+# instead of the former fixed 8 s sleep.
+# Point --chatbot-dir at another checkout to compare versions; use
+# --skip-serve for versions without the command line entry point.
+#
+# Usage: python bench_cold_start.py --runs 5
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from common import CHATBOT_DIR, add_chatbot_to_path, free_port, summarize, use_temp_workdir
+from stub_model import SlowStubModel
+
+PHASES_PREFIX = "⏱️ Startup phases: "
+
+IMPORT_SNIPPET = """
+import sys, time
+sys.path.insert(0, {chatbot_dir!r})
+started = time.perf_counter()
+import colab_medical_chatbot_fixed
+print(time.perf_counter() - started)
+"""
+
+
+def measure_import(chatbot_dir):
+    workdir = tempfile.mkdtemp(prefix="chatbot_import_")
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(chatbot_dir=chatbot_dir)],
+        cwd=workdir, capture_output=True, text=True, check=True, timeout=120
+    ).stdout
+    process_seconds = time.perf_counter() - started
+    import_seconds = float(output.strip().splitlines()[-1])
+    side_effects = os.path.exists(os.path.join(workdir, "medical_chatbot.db"))
+    return import_seconds, process_seconds, side_effects
+
+
+def measure_serve(chatbot_dir, timeout):
+    workdir = tempfile.mkdtemp(prefix="chatbot_serve_")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/conversations/cold-start?patient_id=bench"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(chatbot_dir, "colab_medical_chatbot_fixed.py"),
+         "--no-tunnel", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    ready = None
+    try:
+        while ready is None:
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("server did not answer in time")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        ready = time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        # The phases are printed once launch() returns
+        time.sleep(0.5)
+    finally:
+        process.send_signal(signal.SIGINT)
+        output, _ = process.communicate(timeout=30)
+    phases = [line.split(PHASES_PREFIX, 1)[1] for line in output.splitlines() if PHASES_PREFIX in line]
+    return ready, json.loads(phases[0]) if phases else None
+
+
+def measure_launch(model_load, timeout):
+    """launch() in this process with a stub model taking ``model_load`` s to load"""
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    app = server.create_app()
+    app.state.services.bot.client = SlowStubModel(latency=model_load)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        uvicorn_server, thread, _ = server.launch(
+            port=free_port(), host="127.0.0.1", tunnel=False, log_level="warning",
+            startup_timeout=timeout, app=app
+        )
+    ready = time.perf_counter() - started
+    uvicorn_server.should_exit = True
+    thread.join()
+    return {
+        "model_load_s": model_load,
+        "ready_after_s": round(ready, 3),
+        "ready": app.state.services.ready,
+        "phases": app.state.services.startup_timings
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chatbot import time and cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--chatbot-dir", default=CHATBOT_DIR)
+    parser.add_argument("--skip-serve", action="store_true")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--model-load", type=float, default=3.0, help="stub model load time (s)")
+    args = parser.parse_args()
+
+    imports = [measure_import(args.chatbot_dir) for _ in range(args.runs)]
+    report = {
+        "config": vars(args),
+        "import": summarize([run[0] for run in imports]),
+        "import_process": summarize([run[1] for run in imports]),
+        "import_creates_database": any(run[2] for run in imports)
+    }
+    if not args.skip_serve:
+        serves = [measure_serve(args.chatbot_dir, args.timeout) for _ in range(args.runs)]
+        report["first_ready_request"] = summarize([run[0] for run in serves])
+        report["startup_phases_last_run"] = serves[-1][1]
+        report["launch_with_stub_model"] = measure_launch(args.model_load, args.timeout)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# ============================================================================
+# BENCHMARK - Prompt size and latency over long conversations
+#
+# Runs --conversations conversations of --turns turns through
+# generate_medical_response with a stub phi3:mini whose prefill cost grows
+# with the prompt (--prefill-rate tokens/s), once sending the raw 20-message
+# history (budget 0) and once with the token budgeter. Reports prompt
+# tokens, prefill and turn latency per block of turns.
+#
+# Usage: python bench_context_budget.py --turns 50 --budget 1500
+# ============================================================================
+
+import argparse
+import json
+import time
+
+from common import add_chatbot_to_path, summarize, use_temp_workdir
+from stub_model import SlowStubModel
+
+QUESTIONS = [
+    "J'ai mal à la tête depuis deux jours, surtout le matin au réveil.",
+    "La douleur augmente quand je regarde l'écran, est-ce normal ?",
+    "J'ai pris du paracétamol mais l'effet ne dure que quelques heures.",
+    "عندي الدوخة ملي كنوقف بزربة",
+    "Est-ce que le stress peut provoquer ces maux de tête ?",
+    "Je dors mal depuis une semaine, cela peut-il jouer ?",
+    "Faut-il faire une prise de sang ou un scanner ?",
+]
+
+# About 170 words, the length of a typical phi3:mini answer
+REPLY = " ".join([
+    "Je comprends votre inquiétude et je vous remercie pour ces précisions.",
+    "Les maux de tête peuvent avoir de nombreuses causes, souvent bénignes :",
+    "fatigue, stress, déshydratation, manque de sommeil ou tension musculaire.",
+    "Essayez de boire régulièrement, de faire des pauses loin des écrans et",
+    "de garder des horaires de sommeil réguliers. Notez dans un carnet l'heure",
+    "d'apparition de la douleur, son intensité et ce qui la soulage, cela aidera",
+    "beaucoup le médecin. Si la douleur devient très intense, brutale, ou si",
+    "elle s'accompagne de fièvre, de raideur de la nuque, de troubles de la vue",
+    "ou de vomissements, il faut consulter en urgence. Sinon, si les symptômes",
+    "persistent au-delà de quelques jours malgré ces mesures, une consultation",
+    "est recommandée pour un examen clinique complet et, si besoin, des examens",
+    "complémentaires adaptés à votre situation.",
+] * 2)
+
+
+def run(bot, conversations, turns, tag):
+    """Return per-turn records (turn index, prompt tokens, prefill, latency)"""
+    records = []
+    for c in range(conversations):
+        for turn in range(turns):
+            start = time.perf_counter()
+            result = bot.generate_medical_response(
+                QUESTIONS[turn % len(QUESTIONS)], f"{tag}-{c}", f"patient-{c}"
+            )
+            elapsed = time.perf_counter() - start
+            assert result["status"] == "success", result["response"]
+            records.append((turn, result["prompt_tokens"], result["prefill_ms"], elapsed))
+    return records
+
+
+def by_block(records, block):
+    report = []
+    for first in range(0, max(r[0] for r in records) + 1, block):
+        rows = [r for r in records if first <= r[0] < first + block]
+        report.append({
+            "turns": f"{first + 1}-{first + block}",
+            "prompt_tokens_max": max(r[1] for r in rows),
+            "prefill": summarize([r[2] / 1000 for r in rows]),
+            "latency": summarize([r[3] for r in rows])
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw history vs token-budgeted context")
+    parser.add_argument("--conversations", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=1500, help="CHATBOT_PROMPT_TOKEN_BUDGET")
+    parser.add_argument("--prefill-rate", type=float, default=2000, help="stub prompt tokens/s")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub decode time (s)")
+    parser.add_argument("--block", type=int, default=10, help="turns per report row")
+    args = parser.parse_args()
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+    from context_budget import ContextBudgeter
+
+    bot = server.MedicalChatbotColab()
+    bot.client = SlowStubModel(latency=args.latency, reply=REPLY, prefill_tokens_per_s=args.prefill_rate)
+
+    report = {"config": vars(args)}
+    for name, budget in (("raw_history", 0), ("budgeted", args.budget)):
+        bot.context_budgeter = ContextBudgeter(
+            max_prompt_tokens=budget, summary_tokens=server.SUMMARY_TOKEN_BUDGET, window=server.HISTORY_WINDOW
+        )
+        records = run(bot, args.conversations, args.turns, name)
+        report[name] = {
+            "prompt_tokens": summarize([r[1] / 1000 for r in records]),
+            "turn_latency": summarize([r[3] for r in records]),
+            "by_turn": by_block(records, args.block)
+        }
+        print(f"📊 {name}: prompt tokens p50={report[name]['prompt_tokens']['p50_ms']:.0f} "
+              f"max={report[name]['prompt_tokens']['max_ms']:.0f}, "
+              f"turn p50={report[name]['turn_latency']['p50_ms']}ms")
+
+    summary = bot.summaries.get("budgeted-0", "patient-0")
+    report["example_summary"] = summary[0] if summary else None
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# ============================================================================
+# BENCHMARK - SQLite history reads per turn with the conversation cache
+#
+# Replays an interleaved multi-turn workload (many patients, several turns
+# each) through generate_medical_response with an instant stub model, once
+# with the context cache disabled and once enabled, and reports history
+# database reads per turn, cache counters and time spent fetching history.
+# Each enabled turn's context is checked against a fresh database read.
+#
+# Usage: python bench_context_cache.py --conversations 200 --turns 10
+# ============================================================================
+
+import argparse
+import json
+import random
+import time
+
+from common import add_chatbot_to_path, summarize, use_temp_workdir
+from stub_model import EchoStubModel
+
+QUESTIONS = [
+    "J'ai mal à la tête depuis deux jours",
+    "Est-ce que je dois prendre du paracétamol ?",
+    "La douleur augmente le soir",
+    "عندي الحريق فالمعدة",
+    "J'ai aussi un peu de fièvre",
+    "Quand dois-je consulter un médecin ?"
+]
+
+
+def replay(bot, conversations, turns, seed, verify):
+    """Run every turn in a shuffled interleaving; return history timings"""
+    rng = random.Random(seed)
+    schedule = [c for c in range(conversations) for _ in range(turns)]
+    rng.shuffle(schedule)
+
+    history_times = []
+    get_history = bot.get_conversation_history
+
+    def timed_history(conversation_id, patient_id, limit=20):
+        start = time.perf_counter()
+        history = get_history(conversation_id, patient_id, limit)
+        history_times.append(time.perf_counter() - start)
+        if verify:
+            reads = bot.history_db_reads
+            rows, _ = bot.get_conversation_page(conversation_id, patient_id, page_size=limit)
+            bot.history_db_reads = reads
+            expected = [(message, sender, timestamp) for _, message, sender, timestamp in rows]
+            assert history == expected, f"stale context for {conversation_id}"
+        return history
+
+    bot.get_conversation_history = timed_history
+    try:
+        for conversation in schedule:
+            bot.generate_medical_response(
+                rng.choice(QUESTIONS), f"cache-{seed}-{conversation}", f"patient-{conversation}"
+            )
+    finally:
+        bot.get_conversation_history = get_history
+    return history_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History reads per turn with/without the context cache")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=10, help="turns per conversation")
+    parser.add_argument("--cache-size", type=int, default=1000, help="max cached conversations")
+    args = parser.parse_args()
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+    from conversation_cache import ConversationCache
+
+    bot = server.MedicalChatbotColab()
+    bot.client = EchoStubModel(latency=0)
+    total_turns = args.conversations * args.turns
+    report = {"config": vars(args)}
+
+    for name, size, seed in (("no_cache", 0, 1), ("cache", args.cache_size, 2)):
+        bot.context_cache = ConversationCache(window=server.HISTORY_WINDOW, max_conversations=size)
+        bot.history_db_reads = 0
+        history_times = replay(bot, args.conversations, args.turns, seed, verify=size > 0)
+        report[name] = {
+            "db_reads_per_turn": round(bot.history_db_reads / total_turns, 3),
+            "history_lookup": summarize(history_times),
+            "cache": bot.context_cache.stats()
+        }
+        print(f"📊 {name}: {report[name]['db_reads_per_turn']} DB reads/turn")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# ============================================================================
+# BENCHMARK - Event loop responsiveness while /chat generations are running
+#
+# Starts the FastAPI app on a local port with a stubbed slow phi3:mini, then
+# measures latency of GET / and GET /conversations/{id} twice: once with the
+# server idle and once while N concurrent /chat calls are in flight.
+# With inference on the worker pool both columns should stay flat.
+#
+# Usage: python bench_event_loop_latency.py --concurrent 16 --latency 3
+# ============================================================================
+
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from common import add_chatbot_to_path, free_port, start_uvicorn, summarize, use_temp_workdir
+from stub_model import SlowStubModel
+
+
+def http_get(url):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        response.read()
+        return response.status
+
+
+def http_post_json(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def probe(base_url, conversation_id, probes):
+    """Time sequential health checks and history reads"""
+    health, history = [], []
+    for _ in range(probes):
+        start = time.perf_counter()
+        http_get(f"{base_url}/")
+        health.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        http_get(f"{base_url}/conversations/{conversation_id}?patient_id=bench_patient")
+        history.append(time.perf_counter() - start)
+    return summarize(health), summarize(history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event loop latency under /chat load")
+    parser.add_argument("--concurrent", type=int, default=16, help="in-flight /chat calls")
+    parser.add_argument("--latency", type=float, default=3.0, help="stub generation time (s)")
+    parser.add_argument("--probes", type=int, default=100, help="probe requests per phase")
+    parser.add_argument("--workers", type=int, default=2, help="CHATBOT_MAX_CONCURRENCY")
+    args = parser.parse_args()
+
+    # Let every concurrent call queue instead of being rejected
+    os.environ["CHATBOT_MAX_CONCURRENCY"] = str(args.workers)
+    os.environ["CHATBOT_QUEUE_DEPTH"] = str(args.concurrent)
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    app = server.create_app()
+    bot = app.state.services.bot
+    bot.client = SlowStubModel(latency=args.latency)
+    conversation_id = "bench-conversation"
+    for i in range(10):
+        sender = "user" if i % 2 == 0 else "assistant"
+        bot.save_message(conversation_id, "bench_patient", f"message {i}", sender)
+
+    port = free_port()
+    start_uvicorn(app, port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    print(f"🚀 Idle phase: {args.probes} probes")
+    idle_health, idle_history = probe(base_url, conversation_id, args.probes)
+
+    print(f"🔥 Loaded phase: {args.concurrent} concurrent /chat calls "
+          f"({args.latency}s each, {args.workers} workers)")
+    statuses = Counter()
+    status_lock = threading.Lock()
+
+    def chat_call(i):
+        status = http_post_json(f"{base_url}/chat", {
+            "message": "J'ai mal à la tête depuis 2 jours",
+            "conversation_id": f"load-{i}",
+            "patient_id": f"patient-{i}"
+        })
+        with status_lock:
+            statuses[status] += 1
+
+    chat_threads = [threading.Thread(target=chat_call, args=(i,)) for i in range(args.concurrent)]
+    for thread in chat_threads:
+        thread.start()
+    # Give the calls time to reach the server before probing
+    time.sleep(min(0.5, args.latency / 4))
+    loaded_health, loaded_history = probe(base_url, conversation_id, args.probes)
+    for thread in chat_threads:
+        thread.join()
+
+    report = {
+        "config": vars(args),
+        "idle": {"health": idle_health, "history": idle_history},
+        "loaded": {"health": loaded_health, "history": loaded_history},
+        "chat_statuses": dict(statuses)
+    }
+    print(json.dumps(report, indent=2))
+
+    ratio = loaded_health["p99_ms"] / max(idle_health["p99_ms"], 0.01)
+    print(f"\n📊 GET / p99 idle={idle_health['p99_ms']}ms loaded={loaded_health['p99_ms']}ms "
+          f"(x{ratio:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# ============================================================================
+# BENCHMARK - Rule-based fallback engine throughput
+#
+# Answers a seeded mix of French and Darija patient messages (some with
+# red flags) with FallbackEngine, single-threaded, and reports answers per
+# second and per-answer latency. The target is well under 1 ms per answer,
+# so an outage never adds noticeable latency on top of the circuit breaker.
+#
+# Usage: python bench_fallback_engine.py --messages 20000
+# ============================================================================
+
+import argparse
+import json
+import random
+import time
+
+from common import add_chatbot_to_path, summarize
+
+add_chatbot_to_path()
+from fallback_engine import FallbackEngine  # noqa: E402
+
+PATIENT_MESSAGES = [
+    "J'ai mal de tête depuis deux jours",
+    "Je tousse beaucoup la nuit et j'ai du mal à respirer",
+    "J'ai des douleurs aux articulations des genoux",
+    "Mon cœur bat très vite et j'ai une douleur thoracique",
+    "J'ai des nausées et mal au ventre après les repas",
+    "Je me sens très fatigué et stressé ces derniers temps",
+    "J'ai une éruption sur la peau du bras",
+    "J'ai vomi du sang ce matin",
+    "Bonjour, je voudrais prendre rendez-vous",
+    "عندي وجع الراس من البارح",
+    "كنحس بخفقان فالقلب و وجع فالصدر",
+    "عندي كحة بزاف فالليل",
+    "الكرش كتضرني من بعد الماكلة",
+    "عندي السكري و بغيت نعرف شنو ناكل",
+    "تغاشيت البارح فالخدمة",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FallbackEngine answers per second")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = [rng.choice(PATIENT_MESSAGES) for _ in range(args.messages)]
+
+    started = time.perf_counter()
+    engine = FallbackEngine.from_files()
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    urgent = 0
+    started = time.perf_counter()
+    for message in messages:
+        t0 = time.perf_counter()
+        answer = engine.answer(message)
+        latencies.append(time.perf_counter() - t0)
+        urgent += answer.urgent
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "config": vars(args),
+        "load_ms": round(load_seconds * 1000, 2),
+        "answers_per_s": round(len(messages) / elapsed),
+        "urgent_answers": urgent,
+        "latency": summarize(latencies)
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"📊 {report['answers_per_s']} answers/s, p99 {report['latency']['p99_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# ============================================================================
+# BENCHMARK - "last N messages" history lookup as chat_history grows
+#
+# Fills a database with interleaved conversations (default 10M rows across
+# 1M conversations) and, at each size checkpoint, times random lookups with:
+#   legacy - ORDER BY timestamp ASC LIMIT 20 on the old (conversation, patient)
+#            index: returns the OLDEST messages and sorts the whole conversation
+#   keyset - fetch_messages_before() on (conversation, patient, id)
+#
+# Then grows one conversation to --long-messages rows and pages through it
+# with OFFSET vs keyset cursors at increasing depth.
+#
+# Usage: python bench_history_query.py --rows 10000000 --conversations 1000000
+# ============================================================================
+
+import argparse
+import json
+import random
+import sqlite3
+import time
+
+from common import add_chatbot_to_path, summarize, use_temp_workdir
+
+add_chatbot_to_path()
+from chat_store import MESSAGES_BEFORE_SQL, create_schema, fetch_messages_before  # noqa: E402
+
+LEGACY_INDEX_SQL = '''
+    CREATE INDEX IF NOT EXISTS idx_conversation_patient
+    ON chat_history(conversation_id, patient_id)
+'''
+
+LEGACY_HISTORY_SQL = '''
+    SELECT message, sender, timestamp FROM chat_history
+    WHERE conversation_id = ? AND patient_id = ?
+    ORDER BY timestamp ASC LIMIT ?
+'''
+
+OFFSET_PAGE_SQL = '''
+    SELECT id, message, sender, timestamp FROM chat_history
+    WHERE conversation_id = ? AND patient_id = ?
+    ORDER BY id DESC LIMIT ? OFFSET ?
+'''
+
+LONG_CONVERSATION = ("long-conversation", "long-patient")
+
+
+def conversation_key(n):
+    return f"conv-{n}", f"patient-{n % 50000}"
+
+
+def insert_rows(conn, rng, start_row, end_row, conversations, chunk=100000):
+    """Append rows start_row..end_row, each to a random conversation"""
+    row = start_row
+    while row < end_row:
+        count = min(chunk, end_row - row)
+        batch = []
+        for i in range(row, row + count):
+            conversation_id, patient_id = conversation_key(rng.randrange(conversations))
+            sender = "user" if i % 2 == 0 else "assistant"
+            batch.append((conversation_id, patient_id, f"message {i}", sender, "2024-01-01 00:00:00"))
+        conn.executemany('''
+            INSERT INTO chat_history (conversation_id, patient_id, message, sender, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+        row += count
+
+
+def time_queries(conn, run_query, keys):
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        run_query(conn, key)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def uses_temp_sort(conn, sql, params):
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return any("TEMP B-TREE" in row[-1] for row in plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History lookup latency vs table size")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="total chat_history rows")
+    parser.add_argument("--conversations", type=int, default=1_000_000, help="distinct conversations")
+    parser.add_argument("--lookups", type=int, default=2000, help="random lookups per checkpoint")
+    parser.add_argument("--limit", type=int, default=20, help="messages per lookup")
+    parser.add_argument("--long-messages", type=int, default=100_000, help="size of the long conversation")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    use_temp_workdir()
+    rng = random.Random(args.seed)
+    conn = sqlite3.connect("history_bench.db")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    create_schema(conn)
+    # Keep the old index too, so the legacy query runs with the plan it had
+    conn.execute(LEGACY_INDEX_SQL)
+
+    checkpoints = sorted({args.rows // 1000, args.rows // 100, args.rows // 10, args.rows} - {0})
+    growth = []
+    filled = 0
+    for target in checkpoints:
+        build_start = time.perf_counter()
+        insert_rows(conn, rng, filled, target, args.conversations)
+        filled = target
+        keys = [conversation_key(rng.randrange(args.conversations)) for _ in range(args.lookups)]
+        growth.append({
+            "rows": filled,
+            "build_s": round(time.perf_counter() - build_start, 1),
+            "legacy": time_queries(conn, lambda c, k: c.execute(LEGACY_HISTORY_SQL, (*k, args.limit)).fetchall(), keys),
+            "keyset": time_queries(conn, lambda c, k: fetch_messages_before(c, *k, args.limit), keys)
+        })
+        print(f"📈 {filled:>11,} rows: keyset p50={growth[-1]['keyset']['p50_ms']}ms "
+              f"legacy p50={growth[-1]['legacy']['p50_ms']}ms")
+
+    # One very long conversation, interleaved with the rest of the table
+    conversation_id, patient_id = LONG_CONVERSATION
+    conn.executemany('''
+        INSERT INTO chat_history (conversation_id, patient_id, message, sender, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((conversation_id, patient_id, f"long {i}", "user" if i % 2 == 0 else "assistant",
+           "2024-01-01 00:00:00") for i in range(args.long_messages)))
+    conn.commit()
+
+    newest = fetch_messages_before(conn, conversation_id, patient_id, args.limit)
+    legacy_rows = conn.execute(LEGACY_HISTORY_SQL, (conversation_id, patient_id, args.limit)).fetchall()
+    assert [row[1] for row in newest][-1] == f"long {args.long_messages - 1}", "keyset must return the newest messages"
+    assert legacy_rows[0][0] == "long 0", "legacy query returns the oldest messages"
+
+    long_conversation = {
+        "legacy_last_n": time_queries(conn, lambda c, k: c.execute(LEGACY_HISTORY_SQL, (*k, args.limit)).fetchall(),
+                                      [LONG_CONVERSATION] * 50),
+        "keyset_last_n": time_queries(conn, lambda c, k: fetch_messages_before(c, *k, args.limit),
+                                      [LONG_CONVERSATION] * 50),
+        "pages": []
+    }
+    ids = [row[0] for row in conn.execute(
+        "SELECT id FROM chat_history WHERE conversation_id = ? AND patient_id = ? ORDER BY id DESC",
+        LONG_CONVERSATION
+    )]
+    depth = 1
+    while depth * args.limit < len(ids):
+        offset = depth * args.limit
+        cursor_id = ids[offset - 1]
+        offset_page = conn.execute(OFFSET_PAGE_SQL, (*LONG_CONVERSATION, args.limit, offset)).fetchall()
+        keyset_page = fetch_messages_before(conn, *LONG_CONVERSATION, args.limit, cursor_id)
+        assert [row[0] for row in offset_page][::-1] == [row[0] for row in keyset_page]
+        long_conversation["pages"].append({
+            "page": depth,
+            "offset": time_queries(conn, lambda c, k: c.execute(OFFSET_PAGE_SQL, (*k, args.limit, offset)).fetchall(),
+                                   [LONG_CONVERSATION] * 20),
+            "keyset": time_queries(conn, lambda c, k: fetch_messages_before(c, *k, args.limit, cursor_id),
+                                   [LONG_CONVERSATION] * 20)
+        })
+        depth *= 10
+
+    assert not uses_temp_sort(conn, MESSAGES_BEFORE_SQL, (*LONG_CONVERSATION, 2 ** 62, args.limit)), \
+        "keyset query must be served in index order"
+
+    report = {
+        "config": vars(args),
+        "growth": growth,
+        "long_conversation": long_conversation,
+        "legacy_uses_temp_sort": uses_temp_sort(conn, LEGACY_HISTORY_SQL, (*LONG_CONVERSATION, args.limit))
+    }
+    print(json.dumps(report, indent=2))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
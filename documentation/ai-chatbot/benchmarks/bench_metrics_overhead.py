@@ -0,0 +1,95 @@
+# ============================================================================
+# BENCHMARK - Cost of the /metrics instrumentation on the chat hot path
+#
+# 1. The recording one answer does (stage timers, token counters, decode
+#    speed, response histogram, in-flight gauge), repeated in a tight loop
+# 2. generate_medical_response with an instant stub model, i.e. the whole
+#    pipeline minus inference, for scale
+# 3. Rendering /metrics once both languages and all stages have samples
+# The instrumentation should stay a small fraction of (2) and invisible
+# next to a phi3:mini generation (seconds).
+#
+# Usage: python bench_metrics_overhead.py --requests 2000
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+from common import add_chatbot_to_path, summarize, use_temp_workdir
+from stub_model import SlowStubModel
+
+add_chatbot_to_path()
+from metrics import ChatMetrics  # noqa: E402
+
+STAGES = ("history", "prompt", "inference", "postprocess", "persist")
+
+
+def record_one_answer(metrics, language, model):
+    """Same calls as one generated /chat answer"""
+    in_flight = metrics.in_flight.labels("chat")
+    in_flight.inc()
+    started = time.perf_counter()
+    for stage in STAGES:
+        with metrics.stage(stage, language, model):
+            pass
+    metrics.record_generation(language, model, 420, 180, 6.0)
+    metrics.response_seconds.labels("chat", language, model, "generated").observe(time.perf_counter() - started)
+    in_flight.dec()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics recording and rendering cost")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--conversations", type=int, default=50)
+    args = parser.parse_args()
+
+    metrics = ChatMetrics()
+    recording = []
+    for i in range(args.requests):
+        language = "ar" if i % 3 == 0 else "fr"
+        t0 = time.perf_counter()
+        record_one_answer(metrics, language, "phi3:mini")
+        recording.append(time.perf_counter() - t0)
+
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = server.MedicalChatbotColab()
+    bot.client = SlowStubModel(latency=0.0)
+    pipeline = []
+    for i in range(args.requests):
+        language = "ar" if i % 3 == 0 else "fr"
+        t0 = time.perf_counter()
+        bot.generate_medical_response(
+            "J'ai mal à la tête depuis deux jours", f"conv-{i % args.conversations}", f"patient-{i}", language
+        )
+        pipeline.append(time.perf_counter() - t0)
+
+    renders = []
+    for _ in range(50):
+        t0 = time.perf_counter()
+        text = bot.metrics.render()
+        renders.append(time.perf_counter() - t0)
+
+    recording_us = sum(recording) / len(recording) * 1e6
+    pipeline_summary = summarize(pipeline)
+    report = {
+        "config": vars(args),
+        "recording_per_answer": summarize(recording),
+        "recording_mean_us": round(recording_us, 1),
+        "pipeline_without_model": pipeline_summary,
+        "recording_share_of_pipeline_p50": round(recording_us / 1000 / pipeline_summary["p50_ms"], 3),
+        "render": summarize(renders),
+        "exposition_lines": len(text.splitlines())
+    }
+    print(json.dumps(report, indent=2))
+    print(f"📊 recording {recording_us:.1f} µs per answer (mean), "
+          f"pipeline without model p50 {pipeline_summary['p50_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# ============================================================================
+# BENCHMARK - Micro-batching of /chat generations
+#
+# Serves the app with BatchedFakeOllama, a stub on one shared device where
+# a batch of n prompts costs far less than n separate generations, then has
+# 1, 8 and 32 concurrent patients play seeded conversations turn by turn,
+# with batching off (CHATBOT_BATCH_SIZE=1) and on. Reports aggregate
+# generated tokens per second, /chat latency percentiles and the batch
+# sizes the scheduler formed.
+#
+# Usage: python bench_micro_batching.py --users 1,8,32 --batch-size 8 --batch-wait-ms 10
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from common import add_chatbot_to_path, free_port, start_uvicorn, summarize, use_temp_workdir
+from stub_model import BatchedFakeOllama
+from workload import generate_conversations
+
+
+def http_post_json(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def play(base_url, conversations):
+    """One thread per patient, each sending its conversation's turns in order"""
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def patient(conversation):
+        for message in conversation.messages:
+            t0 = time.perf_counter()
+            status = http_post_json(f"{base_url}/chat", {
+                "message": message,
+                "conversation_id": conversation.conversation_id,
+                "patient_id": conversation.patient_id,
+                "language": conversation.language
+            })
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=patient, args=(c,)) for c in conversations]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run(server, args, users, batch_size):
+    model = BatchedFakeOllama(
+        tokens_per_s=args.tokens_per_s,
+        first_token_s=args.first_token_ms / 1000,
+        prefill_sequence_cost=args.prefill_cost,
+        decode_sequence_cost=args.decode_cost
+    )
+    config = server.ChatbotConfig(
+        db_path=f"bench_{users}_{batch_size}.db",
+        max_concurrency=args.workers,
+        queue_depth=users,
+        batch_size=batch_size,
+        batch_wait_ms=args.batch_wait_ms,
+        model_warmup=False
+    )
+    app = server.create_app(config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = app.state.services.bot
+        bot.client = model
+        bot.batcher = bot.create_batcher()
+        uvicorn_server, thread = start_uvicorn(app, free_port())
+    base_url = f"http://127.0.0.1:{uvicorn_server.config.port}"
+
+    conversations = generate_conversations(args.seed, users, args.turns, args.turns)
+    latencies, statuses, elapsed = play(base_url, conversations)
+    batching = bot.batcher.stats() if bot.batcher else None
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        uvicorn_server.should_exit = True
+        thread.join()
+    return {
+        "users": users,
+        "batch_size": batch_size,
+        "requests": len(latencies),
+        "statuses": dict(statuses),
+        "elapsed_s": round(elapsed, 2),
+        "tokens_per_s": round(model.generated_tokens / elapsed, 1),
+        "requests_per_s": round(len(latencies) / elapsed, 2),
+        "latency": summarize(latencies),
+        "model_passes": model.batches,
+        "batch_sizes": batching["batch_sizes"] if batching else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching throughput and latency")
+    parser.add_argument("--users", default="1,8,32", help="concurrent patients, comma separated")
+    parser.add_argument("--turns", type=int, default=4, help="messages per patient")
+    parser.add_argument("--batch-size", type=int, default=8, help="CHATBOT_BATCH_SIZE of the batched runs")
+    parser.add_argument("--batch-wait-ms", type=float, default=10.0, help="CHATBOT_BATCH_WAIT_MS")
+    parser.add_argument("--workers", type=int, default=8, help="inference workers (CHATBOT_MAX_CONCURRENCY)")
+    parser.add_argument("--tokens-per-s", type=float, default=400.0, help="stub decode speed of one sequence")
+    parser.add_argument("--first-token-ms", type=float, default=50.0, help="stub prompt read of one sequence")
+    parser.add_argument("--prefill-cost", type=float, default=0.5,
+                        help="extra prefill time per additional sequence in a batch (fraction of one)")
+    parser.add_argument("--decode-cost", type=float, default=0.1,
+                        help="extra decode step time per additional sequence in a batch (fraction of one)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    results = []
+    for users in (int(value) for value in args.users.split(",")):
+        for batch_size in (1, args.batch_size):
+            results.append(run(server, args, users, batch_size))
+            result = results[-1]
+            print(f"📊 {users:>3} users  batch {batch_size:>2}: {result['tokens_per_s']:>8} tokens/s  "
+                  f"p50 {result['latency']['p50_ms']} ms  p99 {result['latency']['p99_ms']} ms  "
+                  f"({result['model_passes']} model passes)")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# ============================================================================
+# BENCHMARK - /chat throughput over 1, 2, 4... model backends
+#
+# Each backend is a BatchedFakeOllama generating one answer at a time (one
+# device), at its own speed: --speeds cycles over the backends, so they are
+# deliberately unequal. With --openai every other backend is served over
+# HTTP by an OpenAI-compatible stub server instead of being called
+# in-process. --clients-per-backend patients per backend play seeded
+# conversations through POST /chat for --duration seconds.
+#
+# Reports answers/s against the capacity of the backends (the sum of their
+# answer rates), so scaling is linear when the efficiency stays flat, and
+# how the least-outstanding balancer spread the calls. A last run with
+# routing rules sends short messages and Darija to their own models.
+#
+# Usage: python bench_model_backends.py --backends 1,2,4 --speeds 200,150,100
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from common import add_chatbot_to_path, free_port, start_uvicorn, summarize, use_temp_workdir
+from stub_model import BatchedFakeOllama
+from stub_server import create_openai_stub_app
+from workload import all_messages, generate_conversations
+
+
+def http_post_json(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def play(base_url, conversations, duration):
+    """One thread per patient, replaying its conversation until ``duration`` is over"""
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def patient(conversation):
+        turn = 0
+        while time.perf_counter() < stop_at:
+            message = conversation.messages[turn % len(conversation.messages)]
+            turn += 1
+            t0 = time.perf_counter()
+            status = http_post_json(f"{base_url}/chat", {
+                "message": message,
+                "conversation_id": conversation.conversation_id,
+                "patient_id": conversation.patient_id,
+                "language": conversation.language
+            })
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=patient, args=(c,)) for c in conversations]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def answer_rate(model, messages):
+    """Answers per second of one stub backend on this workload"""
+    words = [len(model.reply_for([{"role": "user", "content": m}]).split(" ")) for m in messages]
+    return 1 / (model.first_token_s + sum(words) / len(words) / model.tokens_per_s)
+
+
+class StubFleet:
+    """Stub model servers, some behind an OpenAI-compatible HTTP front"""
+
+    def __init__(self):
+        self.servers = []
+
+    def backend(self, name, model, models, openai):
+        from model_backends import Backend, OpenAICompatibleClient
+        if not openai:
+            return Backend(name, model, models)
+        app = create_openai_stub_app(model, served_model=models[0])
+        with contextlib.redirect_stdout(io.StringIO()):
+            uvicorn_server, thread = start_uvicorn(app, free_port())
+        self.servers.append((uvicorn_server, thread))
+        return Backend(name, OpenAICompatibleClient(f"http://127.0.0.1:{uvicorn_server.config.port}/v1"), models)
+
+    def close(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for uvicorn_server, thread in self.servers:
+                uvicorn_server.should_exit = True
+                thread.join()
+
+
+def serve(server, args, name, backends, rules, patients):
+    """Run the workload against a router over ``backends``; returns (result, router stats)"""
+    from model_backends import ModelRouter
+
+    config = server.ChatbotConfig(
+        db_path=f"bench_{name}.db", max_concurrency=patients, queue_depth=patients, model_warmup=False
+    )
+    app = server.create_app(config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = app.state.services.bot
+        bot.client = ModelRouter(backends, server.MODEL_NAME, rules)
+        uvicorn_server, thread = start_uvicorn(app, free_port())
+    base_url = f"http://127.0.0.1:{uvicorn_server.config.port}"
+
+    conversations = generate_conversations(args.seed, patients, 4, 6, darija_share=args.darija_share)
+    latencies, statuses, elapsed = play(base_url, conversations, args.duration)
+    with contextlib.redirect_stdout(io.StringIO()):
+        uvicorn_server.should_exit = True
+        thread.join()
+    return {
+        "requests": len(latencies),
+        "statuses": dict(statuses),
+        "elapsed_s": round(elapsed, 2),
+        "answers_per_s": round(statuses[200] / elapsed, 2),
+        "latency": summarize(latencies)
+    }, bot.client.stats()
+
+
+def run_scaling(server, args, count, messages):
+    fleet = StubFleet()
+    backends, capacity = [], 0.0
+    for i in range(count):
+        model = BatchedFakeOllama(args.speeds[i % len(args.speeds)], args.first_token_ms / 1000)
+        capacity += answer_rate(model, messages)
+        openai = args.openai and i % 2 == 1
+        name = f"{'openai' if openai else 'ollama'}-{i}"
+        backends.append(fleet.backend(name, model, [server.MODEL_NAME], openai))
+    try:
+        result, routing = serve(server, args, f"scale_{count}", backends, [], args.clients_per_backend * count)
+    finally:
+        fleet.close()
+    return {
+        "backends": count,
+        "capacity_per_s": round(capacity, 2),
+        **result,
+        "efficiency": round(result["answers_per_s"] / capacity, 3),
+        "calls": {b["name"]: b["requests"] for b in routing["backends"]},
+        "backend_latency_ms": {b["name"]: b["latency_ms"] for b in routing["backends"]}
+    }
+
+
+def run_routing(server, args):
+    """Short messages to a small fast model, Darija to its own backend, the rest balanced"""
+    from model_backends import RoutingRule
+
+    fleet = StubFleet()
+    speed = args.speeds[0]
+    first_token_s = args.first_token_ms / 1000
+    backends = [
+        fleet.backend("ollama-0", BatchedFakeOllama(speed, first_token_s), [server.MODEL_NAME], False),
+        fleet.backend("ollama-1", BatchedFakeOllama(speed, first_token_s), [server.MODEL_NAME], False),
+        fleet.backend("small", BatchedFakeOllama(speed * 4, first_token_s / 4, reply_sentences=2),
+                      ["qwen2.5:0.5b"], False),
+        fleet.backend("darija", BatchedFakeOllama(speed, first_token_s), ["atlas-chat-2b"], args.openai)
+    ]
+    rules = [RoutingRule("atlas-chat-2b", language="ar"), RoutingRule("qwen2.5:0.5b", max_chars=args.short_chars)]
+    try:
+        result, routing = serve(server, args, "routing", backends, rules, args.clients_per_backend * len(backends))
+    finally:
+        fleet.close()
+    return {**result, "routed": routing["routed"], "calls": {b["name"]: b["requests"] for b in routing["backends"]}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/chat throughput over several model backends")
+    parser.add_argument("--backends", default="1,2,4", help="backend counts, comma separated")
+    parser.add_argument("--speeds", default="200,150,100", help="stub decode speeds (tokens/s), cycled over backends")
+    parser.add_argument("--first-token-ms", type=float, default=50.0, help="stub prompt read time")
+    parser.add_argument("--clients-per-backend", type=int, default=3, help="concurrent patients per backend")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per run")
+    parser.add_argument("--darija-share", type=float, default=0.3)
+    parser.add_argument("--short-chars", type=int, default=40, help="routing rule: messages up to this length")
+    parser.add_argument("--openai", action="store_true", help="serve every other backend over the OpenAI API")
+    parser.add_argument("--no-routing", action="store_true", help="skip the routing rules run")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    args.speeds = [float(value) for value in args.speeds.split(",")]
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    messages = all_messages(generate_conversations(args.seed, 50, 4, 6, darija_share=args.darija_share))
+    report = {"config": vars(args), "scaling": []}
+    for count in (int(value) for value in args.backends.split(",")):
+        result = run_scaling(server, args, count, messages)
+        report["scaling"].append(result)
+        print(f"📊 {count} backends: {result['answers_per_s']:>6} answers/s of {result['capacity_per_s']:>6} "
+              f"({result['efficiency']:.0%})  p50 {result['latency']['p50_ms']} ms  "
+              f"p99 {result['latency']['p99_ms']} ms  calls {result['calls']}")
+    if not args.no_routing:
+        report["routing"] = run_routing(server, args)
+        print(f"🔀 routing: {report['routing']['answers_per_s']} answers/s  routed {report['routing']['routed']}  "
+              f"calls {report['routing']['calls']}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
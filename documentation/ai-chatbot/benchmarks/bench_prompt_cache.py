@@ -0,0 +1,114 @@
+# ============================================================================
+# BENCHMARK - Multi-turn latency with Ollama's prompt cache and keep_alive
+#
+# Patients play long seeded conversations in rounds (one turn each, in
+# turn), with an idle pause every --burst rounds, against
+# PrefixCacheFakeOllama: parallel slots that keep the last prompt's tokens,
+# prefill only for the part of a prompt not already cached, and a model
+# that unloads after keep_alive. Three setups:
+#   before      - Ollama's default keep_alive, the summary refolded every turn
+#   keep_alive  - CHATBOT_KEEP_ALIVE=30m
+#   prefix      - keep_alive plus folding down to the low-water mark, so
+#                 the prompts of the next turns extend a cached prefix
+# Reports per-turn latency, prompt tokens evaluated vs cached and the number
+# of model loads. Ollama's 5 minute default is scaled down to
+# --default-keep-alive seconds, and the pauses with it.
+#
+# Usage: python bench_prompt_cache.py --patients 4 --turns 12
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+from common import add_chatbot_to_path, summarize, use_temp_workdir
+from stub_model import PrefixCacheFakeOllama
+from workload import generate_conversations
+
+SETUPS = {
+    "before": {"keep_alive": "", "fold_low_water": 1.0},
+    "keep_alive": {"keep_alive": "30m", "fold_low_water": 1.0},
+    "prefix": {"keep_alive": "30m", "fold_low_water": 0.5},
+}
+
+
+def run(server, args, name, setup):
+    model = PrefixCacheFakeOllama(
+        tokens_per_s=args.tokens_per_s,
+        prefill_tokens_per_s=args.prefill_tokens_per_s,
+        load_s=args.load_s,
+        default_keep_alive_s=args.default_keep_alive,
+        slots=args.slots
+    )
+    config = server.ChatbotConfig(db_path=f"bench_{name}.db", keep_alive=setup["keep_alive"], model_warmup=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = server.MedicalChatbotColab(config)
+    bot.client = model
+    bot.context_budgeter.fold_low_water = setup["fold_low_water"]
+
+    conversations = generate_conversations(args.seed, args.patients, 9, 9)
+    latencies, prompt_tokens, cached_tokens = [], 0, 0
+    for turn in range(args.turns):
+        if turn and turn % args.burst == 0:
+            time.sleep(args.pause)
+        for conversation in conversations:
+            message = conversation.messages[turn % len(conversation.messages)]
+            t0 = time.perf_counter()
+            result = bot.generate_medical_response(
+                message, conversation.conversation_id, conversation.patient_id, conversation.language
+            )
+            latencies.append(time.perf_counter() - t0)
+            if result["status"] != "success":
+                raise RuntimeError(result["response"])
+            prompt_tokens += result["prompt_tokens"]
+            cached_tokens += result["cached_tokens"]
+    bot.writer.close()
+    bot.db.close()
+
+    return {
+        "setup": name,
+        **setup,
+        "turns": len(latencies),
+        "latency": summarize(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+        "evaluated_tokens_per_turn": round(prompt_tokens / len(latencies), 1),
+        "cached_tokens_per_turn": round(cached_tokens / len(latencies), 1),
+        "cached_share": round(cached_tokens / (prompt_tokens + cached_tokens), 3),
+        "model_loads": model.loads
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt prefix cache and keep_alive on multi-turn latency")
+    parser.add_argument("--setups", default=",".join(SETUPS))
+    parser.add_argument("--patients", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=12, help="turns per patient")
+    parser.add_argument("--burst", type=int, default=4, help="rounds between idle pauses")
+    parser.add_argument("--pause", type=float, default=3.0, help="idle pause (s)")
+    parser.add_argument("--default-keep-alive", type=float, default=2.0,
+                        help="stub keep_alive when the chatbot sends none (Ollama: 5 min), in seconds")
+    parser.add_argument("--slots", type=int, default=4, help="parallel slots (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--tokens-per-s", type=float, default=200.0, help="stub decode speed")
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=1000.0, help="stub prompt evaluation speed")
+    parser.add_argument("--load-s", type=float, default=1.0, help="stub model load time")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    results = []
+    for name in args.setups.split(","):
+        result = run(server, args, name, SETUPS[name])
+        results.append(result)
+        print(f"📊 {name:10} p50 {result['latency']['p50_ms']:>8} ms  p99 {result['latency']['p99_ms']:>8} ms  "
+              f"evaluated {result['evaluated_tokens_per_turn']:>6}  cached {result['cached_share']:.0%}  "
+              f"loads {result['model_loads']}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
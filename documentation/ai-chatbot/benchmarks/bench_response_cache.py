@@ -0,0 +1,106 @@
+# ============================================================================
+# BENCHMARK - Response cache on repeated first questions
+#
+# Sends --requests first-turn questions (each in a new conversation) drawn
+# with a skewed distribution from a pool of common complaints, written in
+# several ways: same words with different case/accents/punctuation, and
+# reordered paraphrases. Compares no cache, exact tier, and exact + semantic
+# tier (stub bag-of-words embeddings), and checks every cached answer went
+# through the recommendation/disclaimer step for the question asked.
+#
+# Usage: python bench_response_cache.py --requests 300 --latency 0.2
+# ============================================================================
+
+import argparse
+import json
+import random
+import time
+
+from common import add_chatbot_to_path, summarize, use_temp_workdir
+from stub_model import SlowStubModel
+
+# (language, variants): the first two differ only in case/accents/punctuation,
+# the last ones are paraphrases with the same words in another order
+QUESTIONS = [
+    ("fr", ["J'ai mal à la tête depuis 2 jours", "j'ai mal a la tete depuis 2 jours !",
+            "Depuis 2 jours j'ai mal à la tête"]),
+    ("fr", ["J'ai de la fièvre et de la toux", "J'AI DE LA FIEVRE ET DE LA TOUX.",
+            "J'ai de la toux et de la fièvre"]),
+    ("fr", ["Mon enfant a mal au ventre", "mon enfant a mal au ventre ?",
+            "Mal au ventre, mon enfant a"]),
+    ("fr", ["J'ai des douleurs au dos le matin", "j'ai des douleurs au dos le matin",
+            "Le matin j'ai des douleurs au dos"]),
+    ("fr", ["Ma peau gratte beaucoup", "ma peau gratte beaucoup !!",
+            "Beaucoup, ma peau gratte"]),
+    ("ar", ["عندي الحريق فالمعدة", "عندي الحريق فالمعدة؟", "فالمعدة عندي الحريق"]),
+    ("ar", ["راسي كيضرني بزاف", "راسي كيضرني بزاف!", "بزاف راسي كيضرني"]),
+]
+
+
+def workload(requests, seed):
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(QUESTIONS))]
+    for _ in range(requests):
+        language, variants = rng.choices(QUESTIONS, weights)[0]
+        yield language, rng.choice(variants)
+
+
+def run(bot, requests, seed, tag):
+    latencies = []
+    tiers = {}
+    for i, (language, message) in enumerate(workload(requests, seed)):
+        start = time.perf_counter()
+        result = bot.generate_medical_response(message, f"{tag}-{i}", f"patient-{i}", language)
+        latencies.append(time.perf_counter() - start)
+        assert result["status"] == "success", result["response"]
+        tiers[result["cache"]] = tiers.get(result["cache"], 0) + 1
+        if result["cache"]:
+            # A hit must look exactly like a fresh answer to this question
+            expected = bot.finalize_response(bot.client.reply_for([]), message, language)
+            assert result["response"] == expected, "cached answer skipped post-processing"
+    return latencies, tiers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response cache hit rate and saved inference time")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub generation time (s)")
+    parser.add_argument("--threshold", type=float, default=0.95, help="semantic similarity threshold")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+    from response_cache import ResponseCache
+
+    bot = server.MedicalChatbotColab()
+    bot.client = SlowStubModel(latency=args.latency)
+
+    def stub_embed(text):
+        return bot.client.embed(model="stub-embed", input=text)["embeddings"][0]
+
+    modes = (
+        ("no_cache", None),
+        ("exact", ResponseCache()),
+        ("exact_semantic", ResponseCache(embed=stub_embed, similarity_threshold=args.threshold)),
+    )
+    report = {"config": vars(args)}
+    for name, cache in modes:
+        bot.response_cache = cache
+        started = time.perf_counter()
+        latencies, tiers = run(bot, args.requests, args.seed, name)
+        report[name] = {
+            "wall_s": round(time.perf_counter() - started, 2),
+            "latency": summarize(latencies),
+            "answers_by_tier": {str(k): v for k, v in tiers.items()},
+            "cache": cache.stats() if cache else None
+        }
+        hit_rate = cache.stats()["hit_rate"] if cache else 0.0
+        print(f"📊 {name}: {report[name]['wall_s']}s total, hit rate {hit_rate}")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# ============================================================================
+# BENCHMARK - Specialty detection cost vs keyword-table size
+#
+# Classifies a seeded batch of French and Darija patient messages with the
+# legacy nested substring scan and with the indexed SpecialtyClassifier,
+# while growing the keyword tables with synthetic entries. The indexed cost
+# per message should stay flat; the legacy scan grows with the table.
+#
+# Usage: python bench_specialty_classifier.py --messages 5000
+# ============================================================================
+
+import argparse
+import json
+import random
+import string
+import time
+
+from common import add_chatbot_to_path
+
+add_chatbot_to_path()
+from specialty_classifier import SpecialtyClassifier  # noqa: E402
+
+PATIENT_MESSAGES = [
+    "J'ai mal de tête depuis deux jours",
+    "Quelle dose de paracétamol pour mon fils ?",
+    "Je tousse beaucoup la nuit et j'ai du mal à respirer",
+    "J'ai des douleurs aux articulations des genoux",
+    "Mon cœur bat très vite et j'ai une douleur thoracique",
+    "J'ai des nausées et mal au ventre après les repas",
+    "Je me sens très fatigué et stressé ces derniers temps",
+    "J'ai une éruption sur la peau du bras",
+    "Mes yeux piquent et ma vue baisse",
+    "J'ai mal de gorge et le nez bouché",
+    "عندي وجع الراس من البارح",
+    "كنحس بخفقان فالقلب و وجع فالصدر",
+    "عندي كحة بزاف فالليل",
+    "الكرش كتضرني من بعد الماكلة",
+    "عندي السكري و بغيت نعرف شنو ناكل",
+    "كنحس بقلق و توتر بزاف",
+]
+
+
+def legacy_detect(tables, message):
+    """The original first-match substring scan"""
+    message_lower = message.lower()
+    for table in tables.values():
+        for specialist, keywords in table.items():
+            for keyword in keywords:
+                if keyword in message_lower:
+                    return specialist
+    return "médecin généraliste"
+
+
+def grow_tables(tables, extra_keywords, seed):
+    """Copy of ``tables`` padded with synthetic keywords that never match"""
+    rng = random.Random(seed)
+    grown = {language: {s: list(k) for s, k in table.items()} for language, table in tables.items()}
+    synthetic = grown.setdefault("synthetic", {})
+    for i in range(extra_keywords):
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(8)) + "q"
+        synthetic.setdefault(f"specialite-{i % 200}", []).append(word)
+    return grown
+
+
+def per_message_us(fn, messages):
+    start = time.perf_counter()
+    fn(messages)
+    return round((time.perf_counter() - start) / len(messages) * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy vs indexed specialty detection")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--sizes", default="0,1000,10000,100000", help="extra keywords per run")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = [rng.choice(PATIENT_MESSAGES) for _ in range(args.messages)]
+    base = SpecialtyClassifier.from_file()
+
+    results = []
+    for extra in [int(size) for size in args.sizes.split(",")]:
+        tables = grow_tables(base.tables, extra, args.seed)
+        keyword_count = sum(len(k) for table in tables.values() for k in table.values())
+
+        build_start = time.perf_counter()
+        classifier = SpecialtyClassifier(tables)
+        build_ms = round((time.perf_counter() - build_start) * 1000, 1)
+
+        results.append({
+            "keywords": keyword_count,
+            "index_build_ms": build_ms,
+            "indexed_us_per_message": per_message_us(classifier.classify_many, messages),
+            "legacy_us_per_message": per_message_us(
+                lambda batch: [legacy_detect(tables, m) for m in batch], messages
+            )
+        })
+        print(f"📊 {results[-1]}")
+
+    examples = {
+        message: {
+            "legacy": legacy_detect(base.tables, message),
+            "indexed": [match._asdict() for match in base.classify(message)]
+        }
+        for message in PATIENT_MESSAGES[:4]
+    }
+    print(json.dumps({"config": vars(args), "results": results, "examples": examples},
+                     indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# ============================================================================
+# BENCHMARK - Cost of health polling: /status, /healthz and /readyz
+#
+# Starts the FastAPI app with a stubbed slow phi3:mini, then polls each
+# endpoint while the server is idle and while N concurrent /chat calls are
+# in flight. Reports latency per endpoint and how many model generations
+# the polling itself caused (stub chat calls beyond the /chat load).
+# Served from the health monitor's cache, polling should cost no
+# generations and stay in the sub-millisecond range server side.
+# Point --chatbot-dir at another checkout to compare with a /status that
+# ran a test generation per call (use --endpoints / for versions without
+# the probes).
+#
+# Usage: python bench_status_endpoint.py --concurrent 8 --latency 2
+# ============================================================================
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from common import CHATBOT_DIR, free_port, start_uvicorn, summarize, use_temp_workdir
+from stub_model import SlowStubModel
+
+
+def http_get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=120) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def http_post_json(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def poll(base_url, endpoints, probes):
+    """Time sequential GETs of each endpoint, with the status codes seen"""
+    report = {}
+    for endpoint in endpoints:
+        latencies, statuses = [], Counter()
+        for _ in range(probes):
+            start = time.perf_counter()
+            statuses[http_get(base_url + endpoint)] += 1
+            latencies.append(time.perf_counter() - start)
+        report[endpoint] = {**summarize(latencies), "statuses": dict(statuses)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/status, /healthz and /readyz cost under /chat load")
+    parser.add_argument("--concurrent", type=int, default=8, help="in-flight /chat calls")
+    parser.add_argument("--latency", type=float, default=2.0, help="stub generation time (s)")
+    parser.add_argument("--probes", type=int, default=50, help="requests per endpoint and phase")
+    parser.add_argument("--workers", type=int, default=2, help="CHATBOT_MAX_CONCURRENCY")
+    parser.add_argument("--health-interval", type=float, default=1.0, help="CHATBOT_HEALTH_INTERVAL (s)")
+    parser.add_argument("--endpoints", default="/status,/healthz,/readyz")
+    parser.add_argument("--chatbot-dir", default=CHATBOT_DIR)
+    args = parser.parse_args()
+    endpoints = args.endpoints.split(",")
+
+    os.environ["CHATBOT_MAX_CONCURRENCY"] = str(args.workers)
+    os.environ["CHATBOT_QUEUE_DEPTH"] = str(args.concurrent)
+    os.environ["CHATBOT_HEALTH_INTERVAL"] = str(args.health_interval)
+    os.environ["CHATBOT_WARMUP"] = "false"
+
+    sys.path.insert(0, os.path.abspath(args.chatbot_dir))
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    app = server.create_app()
+    services = app.state.services
+    stub = SlowStubModel(latency=args.latency)
+    services.bot.client = stub
+
+    port = free_port()
+    start_uvicorn(app, port)
+    base_url = f"http://127.0.0.1:{port}"
+    # Let the first health check land
+    time.sleep(0.2)
+
+    print(f"🚀 Idle phase: {args.probes} probes per endpoint")
+    calls_before = stub.calls
+    idle = poll(base_url, endpoints, args.probes)
+    idle_generations = stub.calls - calls_before
+
+    print(f"🔥 Loaded phase: {args.concurrent} concurrent /chat calls "
+          f"({args.latency}s each, {args.workers} workers)")
+    statuses = Counter()
+    status_lock = threading.Lock()
+
+    def chat_call(i):
+        status = http_post_json(f"{base_url}/chat", {
+            "message": "J'ai mal à la tête depuis 2 jours",
+            "conversation_id": f"load-{i}",
+            "patient_id": f"patient-{i}"
+        })
+        with status_lock:
+            statuses[status] += 1
+
+    calls_before = stub.calls
+    chat_threads = [threading.Thread(target=chat_call, args=(i,)) for i in range(args.concurrent)]
+    for thread in chat_threads:
+        thread.start()
+    time.sleep(min(0.5, args.latency / 4))
+    started = time.perf_counter()
+    loaded = poll(base_url, endpoints, args.probes)
+    loaded_seconds = time.perf_counter() - started
+    for thread in chat_threads:
+        thread.join()
+    loaded_generations = stub.calls - calls_before - statuses[200]
+
+    health = getattr(services, "health", None)
+    report = {
+        "config": vars(args),
+        "idle": idle,
+        "loaded": loaded,
+        "loaded_phase_s": round(loaded_seconds, 2),
+        "generations_caused_by_polling": {"idle": idle_generations, "loaded": loaded_generations},
+        "health_checks_run": health.checks if health is not None else None,
+        "chat_statuses": dict(statuses)
+    }
+    print(json.dumps(report, indent=2))
+
+    for endpoint in endpoints:
+        print(f"📊 {endpoint} p99 idle={idle[endpoint]['p99_ms']}ms loaded={loaded[endpoint]['p99_ms']}ms")
+    print(f"📊 generations caused by polling: idle={idle_generations} loaded={loaded_generations}")
+
+
+if __name__ == "__main__":
+    main()
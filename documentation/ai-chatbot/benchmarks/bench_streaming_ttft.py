@@ -0,0 +1,85 @@
+# ============================================================================
+# BENCHMARK - Time to first token: /chat vs /chat/stream
+#
+# Serves the app with a stubbed phi3:mini that decodes word by word and
+# compares when the user sees the first text: at the end of the generation
+# for /chat, after the first token for /chat/stream.
+#
+# Usage: python bench_streaming_ttft.py --latency 4 --requests 10
+# ============================================================================
+
+import argparse
+import json
+import time
+import urllib.request
+
+from common import add_chatbot_to_path, free_port, start_uvicorn, summarize, use_temp_workdir
+from stub_model import SlowStubModel
+
+
+def post(url, payload):
+    return urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+
+
+def time_blocking_chat(base_url, payload):
+    start = time.perf_counter()
+    with urllib.request.urlopen(post(f"{base_url}/chat", payload), timeout=120) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def time_streaming_chat(base_url, payload):
+    """Return (time to first token, total time) for one streamed answer"""
+    start = time.perf_counter()
+    first_token = None
+    with urllib.request.urlopen(post(f"{base_url}/chat/stream", payload), timeout=120) as response:
+        for line in response:
+            event = json.loads(line.decode("utf-8"))
+            if event["type"] == "token" and first_token is None:
+                first_token = time.perf_counter() - start
+            if event["type"] in ("done", "error"):
+                break
+    return first_token, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first token, blocking vs streaming")
+    parser.add_argument("--latency", type=float, default=4.0, help="stub generation time (s)")
+    parser.add_argument("--requests", type=int, default=10, help="requests per mode")
+    args = parser.parse_args()
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    app = server.create_app()
+    bot = app.state.services.bot
+    bot.client = SlowStubModel(latency=args.latency)
+    port = free_port()
+    start_uvicorn(app, port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    blocking, stream_ttft, stream_total = [], [], []
+    for i in range(args.requests):
+        payload = {"message": "J'ai de la fièvre depuis hier", "conversation_id": f"ttft-{i}"}
+        blocking.append(time_blocking_chat(base_url, payload))
+        ttft, total = time_streaming_chat(base_url, payload)
+        stream_ttft.append(ttft)
+        stream_total.append(total)
+
+    report = {
+        "config": vars(args),
+        "chat_first_text": summarize(blocking),
+        "stream_time_to_first_token": summarize(stream_ttft),
+        "stream_total": summarize(stream_total)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
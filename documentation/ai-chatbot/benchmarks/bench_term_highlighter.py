@@ -0,0 +1,171 @@
+# ============================================================================
+# BENCHMARK - format_bold_text: legacy 28-regex loop vs compiled highlighter
+#
+# Builds a seeded corpus of ~500-token French and Darija answers (with the
+# specialist recommendation and disclaimer the bot appends), runs both
+# implementations over it, reports throughput and checks word by word that
+# the new highlighter bolds exactly what the legacy one did, except where
+# legacy left an artifact ('****', '**urgence**s').
+#
+# Usage: python bench_term_highlighter.py --responses 300 --repeat 5
+# ============================================================================
+
+import argparse
+import json
+import random
+import re
+import time
+
+from common import add_chatbot_to_path
+
+add_chatbot_to_path()
+from term_highlighter import MEDICAL_TERMS, TermHighlighter  # noqa: E402
+
+FRENCH_SENTENCES = [
+    "Je comprends que ces symptômes soient inquiétants pour vous.",
+    "Une douleur qui dure depuis plus de 48h mérite une consultation.",
+    "Buvez beaucoup d'eau et reposez-vous pendant quelques jours.",
+    "Si la douleur devient intense, c'est urgent : appelez les urgences.",
+    "Un médecin généraliste pourra faire un premier bilan.",
+    "Évitez de prendre un médicament sans avis médical.",
+    "Le traitement dépendra de la cause exacte de vos symptômes.",
+    "Notez l'évolution de la fièvre toutes les 24h.",
+    "Il est important de surveiller votre tension pendant quelques semaines.",
+    "Un cardiologue pourra vérifier votre cœur si les palpitations continuent.",
+    "Les troubles du sommeil peuvent durer plusieurs heures par nuit.",
+    "Un dermatologue examinera l'éruption cutanée.",
+    "Les Symptômes ORL comme le mal de gorge passent souvent en 72h.",
+    "Demandez conseil à votre docteur avant de changer de traitement.",
+    "Le gastro-entérologue peut prescrire des examens complémentaires.",
+    "En cas d'urgence, composez le 15 ou rendez-vous aux urgences.",
+]
+
+DARIJA_SENTENCES = [
+    "فاهم بلي هاد الأعراض كتقلقك بزاف.",
+    "إلا الوجع بقى أكثر من 48h خاصك دير consultation.",
+    "شرب الما بزاف وارتاح شي أيام.",
+    "إلا ولا الوجع قوي بزاف، هادشي urgent، سير للمستعجلات.",
+    "الطبيب العام يقدر يدير ليك فحص أولي.",
+    "ما تاخدش شي médicament بلا ما تشاور الطبيب.",
+    "الدوا كيتعلق بالسبب ديال المرض.",
+    "تبع السخانة كل 24h.",
+    "مهم تراقب الضغط ديالك شي semaines.",
+    "سير عند cardiologue إلا بقاو الخفقان.",
+    "النعاس كيتقطع شي heures فالليل.",
+    "الـ neurologue يقدر يشوف الصداع ديالك.",
+]
+
+TRAILERS = {
+    "fr": "\n\n👨‍⚕️ **Recommandation médicale**: Je vous conseille de consulter un **{specialist}** "
+          "pour les problèmes de tête.\n\n⚠️ **Rappel**: Cette conversation est à titre informatif "
+          "uniquement. **Consultez un professionnel de santé** pour tout problème médical.",
+    "ar": "\n\n👨‍⚕️ **نصيحة طبية**: نصحك تشوف **{specialist}** للمشاكل ديال الراس.\n\n"
+          "⚠️ **تذكير**: هاد المحادثة غير للمعلومات فقط. **شوف طبيب مختص** لأي مشكل صحي.",
+}
+
+SPECIALISTS = ["neurologue", "cardiologue", "médecin généraliste", "orl", "pneumologue", "urologue"]
+
+
+def build_corpus(responses, tokens_per_response, seed):
+    """Seeded list of answers of roughly ``tokens_per_response`` words each"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(responses):
+        language = "ar" if i % 3 == 0 else "fr"
+        pool = DARIJA_SENTENCES if language == "ar" else FRENCH_SENTENCES
+        words = []
+        while len(words) < tokens_per_response:
+            words.extend(rng.choice(pool).split())
+        body = " ".join(words)
+        corpus.append(body + TRAILERS[language].format(specialist=rng.choice(SPECIALISTS)))
+    return corpus
+
+
+def legacy_format_bold_text(text):
+    """The original implementation, kept here as the reference"""
+    for term in MEDICAL_TERMS:
+        pattern = re.compile(re.escape(term), re.IGNORECASE)
+        text = pattern.sub(f'**{term}**', text)
+    return text
+
+
+def check_output(original, highlighted):
+    """The highlighter may only add '**' around whole terms, never nest them"""
+    assert "****" not in highlighted, "empty or nested bold markers"
+    assert highlighted.replace("**", "") == original.replace("**", ""), "text was altered"
+    assert highlighted.count("**") % 2 == 0, "unbalanced bold markers"
+
+
+def has_legacy_artifact(text):
+    return "****" in text or re.search(r'\w\*\*\w', text) is not None
+
+
+def compare_with_legacy(legacy, new):
+    """Word by word, outside the legacy artifacts: same words, same bold.
+
+    Both implementations only add '**' (and legacy changes case), so the
+    outputs split into the same words. Returns how many words legacy broke.
+    """
+    legacy_words, new_words = legacy.split(), new.split()
+    assert len(legacy_words) == len(new_words), "word count differs from legacy"
+    artifacts = 0
+    for legacy_word, new_word in zip(legacy_words, new_words):
+        if has_legacy_artifact(legacy_word):
+            artifacts += 1
+        else:
+            assert new_word.lower() == legacy_word.lower(), \
+                f"{new_word!r} differs from legacy {legacy_word!r} without a reason"
+    return artifacts
+
+
+def timed(fn, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy vs compiled bold highlighter")
+    parser.add_argument("--responses", type=int, default=300)
+    parser.add_argument("--tokens", type=int, default=500, help="words per response")
+    parser.add_argument("--repeat", type=int, default=5, help="best-of-N timing runs")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.responses, args.tokens, args.seed)
+    highlighter = TermHighlighter()
+
+    outcomes = {"identical": 0, "fixed_artifacts": 0, "kept_original_case": 0, "words_compared": 0}
+    for text in corpus:
+        legacy = legacy_format_bold_text(text)
+        new = highlighter.highlight(text)
+        check_output(text, new)
+        artifacts = compare_with_legacy(legacy, new)
+        outcomes["words_compared"] += len(new.split()) - artifacts
+        if new == legacy:
+            outcomes["identical"] += 1
+        elif artifacts:
+            outcomes["fixed_artifacts"] += 1
+        else:
+            # Only remaining allowed difference: legacy lowercased 'Symptômes' etc.
+            outcomes["kept_original_case"] += 1
+
+    legacy_time = timed(legacy_format_bold_text, corpus, args.repeat)
+    new_time = timed(highlighter.highlight, corpus, args.repeat)
+
+    report = {
+        "config": vars(args),
+        "outputs": outcomes,
+        "legacy_responses_per_sec": round(len(corpus) / legacy_time, 1),
+        "compiled_responses_per_sec": round(len(corpus) / new_time, 1),
+        "speedup": round(legacy_time / new_time, 2)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
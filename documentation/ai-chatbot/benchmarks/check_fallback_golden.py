@@ -0,0 +1,66 @@
+# ============================================================================
+# GOLDEN CHECK - FallbackEngine answers for a fixed set of patient messages
+#
+# data/fallback_golden.jsonl holds one message per line with the expected
+# language, specialist, red flags and full answer text. Any change to the
+# keyword tables, rules or templates shows up here as a diff; review it,
+# then regenerate the file with --update.
+#
+# Usage: python check_fallback_golden.py [--update]
+# ============================================================================
+
+import argparse
+import json
+import os
+import sys
+
+from common import add_chatbot_to_path
+
+add_chatbot_to_path()
+from fallback_engine import FallbackEngine  # noqa: E402
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fallback_golden.jsonl")
+FIELDS = ("language", "specialist", "urgent", "red_flags", "text")
+
+
+def expected_record(engine, message, language=None):
+    answer = engine.answer(message, language)
+    record = {"message": message, "requested_language": language}
+    record.update({field: getattr(answer, field) for field in FIELDS})
+    record["red_flags"] = list(record["red_flags"])
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FallbackEngine answers with the golden set")
+    parser.add_argument("--update", action="store_true", help="rewrite the golden file from current answers")
+    args = parser.parse_args()
+
+    engine = FallbackEngine.from_files()
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = [json.loads(line) for line in f if line.strip()]
+
+    if args.update:
+        with open(GOLDEN_PATH, "w", encoding="utf-8", newline="\n") as f:
+            for record in golden:
+                fresh = expected_record(engine, record["message"], record.get("requested_language"))
+                f.write(json.dumps(fresh, ensure_ascii=False) + "\n")
+        print(f"✅ Rewrote {len(golden)} golden answers")
+        return
+
+    failures = 0
+    for record in golden:
+        actual = expected_record(engine, record["message"], record.get("requested_language"))
+        for field in FIELDS:
+            if actual[field] != record.get(field):
+                failures += 1
+                print(f"❌ {record['message']!r} {field}:\n   expected {record.get(field)!r}\n   got      {actual[field]!r}")
+
+    if failures:
+        print(f"❌ {failures} mismatches over {len(golden)} golden answers")
+        sys.exit(1)
+    print(f"✅ {len(golden)} golden answers match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# ============================================================================
+# BENCHMARK HELPERS - shared setup for the offline chatbot benchmarks
+# ============================================================================
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_AI_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(CHATBOT_DIR)), "plateforme-medicale", "backend", "ai"
+)
+
+
+def add_chatbot_to_path():
+    """Make the chatbot modules importable from the benchmarks folder"""
+    if CHATBOT_DIR not in sys.path:
+        sys.path.insert(0, CHATBOT_DIR)
+
+
+def add_backend_ai_to_path():
+    """Make the backend client modules (colab_integration, ...) importable"""
+    if BACKEND_AI_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_AI_DIR)
+
+
+def use_temp_workdir():
+    """Run from a scratch directory so benchmarks never touch the real database"""
+    workdir = tempfile.mkdtemp(prefix="chatbot_bench_")
+    os.chdir(workdir)
+    return workdir
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    """p50/p90/p99/max in milliseconds for a list of durations in seconds"""
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p90_ms": round(percentile(samples, 90) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2) if samples else 0.0
+    }
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_uvicorn(app, port, timeout=10.0):
+    """Serve ``app`` on a background thread and wait until it accepts requests"""
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    # Signal handlers can only be installed from the main thread
+    server.install_signal_handlers = lambda: None
+
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    deadline = time.monotonic() + timeout
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not start in time")
+        time.sleep(0.01)
+    return server, thread
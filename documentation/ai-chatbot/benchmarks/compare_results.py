@@ -0,0 +1,80 @@
+# ============================================================================
+# COMPARE RESULTS - Diff two run_suite.py reports
+#
+# For every scenario present in both reports, shows throughput and
+# mean and p50/p90/p99 latency side by side with the relative change, and flags a
+# regression when throughput drops or a percentile grows by more than
+# --threshold (10% by default). Exits with status 1 on any regression, so
+# it can gate a merge.
+#
+# Usage: python compare_results.py results/base.json results/new.json
+# ============================================================================
+
+import argparse
+import json
+import sys
+
+# (label, path in the scenario result, True when higher is better)
+FIELDS = [
+    ("throughput/s", ("throughput_per_s",), True),
+    ("mean us", ("mean_us",), False),
+    ("p50 ms", ("latency", "p50_ms"), False),
+    ("p90 ms", ("latency", "p90_ms"), False),
+    ("p99 ms", ("latency", "p99_ms"), False),
+]
+
+
+def lookup(result, path):
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def compare(base, new, threshold):
+    """Rows of (scenario, field, base, new, change, regressed)"""
+    rows = []
+    for scenario in base["scenarios"]:
+        if scenario not in new["scenarios"]:
+            continue
+        for label, path, higher_is_better in FIELDS:
+            before = lookup(base["scenarios"][scenario], path)
+            after = lookup(new["scenarios"][scenario], path)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            worse = -change if higher_is_better else change
+            rows.append((scenario, label, before, after, change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark suite reports")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"base: {base['meta'].get('commit')}   new: {new['meta'].get('commit')}")
+    if base["meta"].get("config") != new["meta"].get("config"):
+        print("⚠️ The two runs used different settings; numbers may not be comparable")
+
+    rows = compare(base, new, args.threshold)
+    print(f"\n{'scenario':26} {'metric':13} {'base':>10} {'new':>10} {'change':>8}")
+    for scenario, label, before, after, change, regressed in rows:
+        flag = "  ❌" if regressed else ""
+        print(f"{scenario:26} {label:13} {before:>10} {after:>10} {change:>+8.1%}{flag}")
+
+    regressions = [row for row in rows if row[5]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} regressions beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\n✅ No regression beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
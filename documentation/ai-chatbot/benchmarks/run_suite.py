@@ -0,0 +1,253 @@
+# ============================================================================
+# BENCHMARK SUITE - Offline, seeded, comparable across commits
+#
+# Runs the chatbot against FakeOllama (deterministic answers, configurable
+# first-token latency and token rate) with a seeded workload of multi-turn
+# French / Darija conversations, and reports throughput and latency
+# percentiles for each scenario:
+#   format_bold_text           - MedicalChatbotColab.format_bold_text on model answers
+#   detect_medical_specialty   - on every patient message of the workload
+#   chat                       - POST /chat, --patients virtual patients playing
+#                                their conversations turn by turn
+#   history                    - GET /conversations/{id} on those conversations
+#   status                     - GET /status
+# The JSON report records the commit it ran on; compare two reports with
+# compare_results.py.
+#
+# Usage: python run_suite.py --output results/$(git rev-parse --short HEAD).json
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import queue
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import datetime, timezone
+
+from common import CHATBOT_DIR, add_chatbot_to_path, free_port, start_uvicorn, summarize, use_temp_workdir
+from stub_model import FakeOllama
+from workload import all_messages, generate_conversations
+
+SCENARIOS = ("format_bold_text", "detect_medical_specialty", "chat", "history", "status")
+
+
+def http_get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=120) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def http_post_json(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def git_commit():
+    """Short commit of the chatbot checkout (with '+dirty' for local changes), or None"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=CHATBOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--", "."], cwd=CHATBOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+dirty" if dirty else "")
+
+
+def result(latencies, elapsed, **extra):
+    """Throughput plus latency percentiles of one scenario"""
+    return {
+        "operations": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_us": round(sum(latencies) / len(latencies) * 1e6, 1) if latencies else 0.0,
+        "latency": summarize(latencies),
+        **extra
+    }
+
+
+def timed_calls(fn, inputs, repeat):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for value in inputs:
+            t0 = time.perf_counter()
+            fn(value)
+            latencies.append(time.perf_counter() - t0)
+    return result(latencies, time.perf_counter() - started)
+
+
+def run_chat(base_url, conversations, patients):
+    """Each virtual patient takes the next conversation and plays all its turns"""
+    pending = queue.Queue()
+    for conversation in conversations:
+        pending.put(conversation)
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def patient():
+        while True:
+            try:
+                conversation = pending.get_nowait()
+            except queue.Empty:
+                return
+            for message in conversation.messages:
+                t0 = time.perf_counter()
+                status = http_post_json(f"{base_url}/chat", {
+                    "message": message,
+                    "conversation_id": conversation.conversation_id,
+                    "patient_id": conversation.patient_id,
+                    "language": conversation.language
+                })
+                with lock:
+                    latencies.append(time.perf_counter() - t0)
+                    statuses[status] += 1
+
+    threads = [threading.Thread(target=patient) for _ in range(patients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return result(latencies, time.perf_counter() - started, statuses=dict(statuses))
+
+
+def run_gets(urls):
+    latencies, statuses = [], Counter()
+    started = time.perf_counter()
+    for url in urls:
+        t0 = time.perf_counter()
+        statuses[http_get(url)] += 1
+        latencies.append(time.perf_counter() - t0)
+    return result(latencies, time.perf_counter() - started, statuses=dict(statuses))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline chatbot benchmark suite")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--conversations", type=int, default=30)
+    parser.add_argument("--min-turns", type=int, default=1)
+    parser.add_argument("--max-turns", type=int, default=5)
+    parser.add_argument("--darija-share", type=float, default=0.3)
+    parser.add_argument("--patients", type=int, default=8, help="concurrent virtual patients (chat)")
+    parser.add_argument("--workers", type=int, default=2, help="inference workers (CHATBOT_MAX_CONCURRENCY)")
+    parser.add_argument("--tokens-per-s", type=float, default=200.0, help="fake model decode speed")
+    parser.add_argument("--first-token-ms", type=float, default=50.0, help="fake model prompt + first token time")
+    parser.add_argument("--reads", type=int, default=300, help="GET requests for history and status")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the inputs of pure functions")
+    parser.add_argument("--output", default=None, help="also write the JSON report here")
+    args = parser.parse_args()
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    output = os.path.abspath(args.output) if args.output else None
+
+    add_chatbot_to_path()
+    use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    conversations = generate_conversations(
+        args.seed, args.conversations, args.min_turns, args.max_turns, args.darija_share
+    )
+    messages = all_messages(conversations)
+    model = FakeOllama(tokens_per_s=args.tokens_per_s, first_token_s=args.first_token_ms / 1000)
+    config = server.ChatbotConfig(max_concurrency=args.workers, queue_depth=args.patients, model_warmup=False)
+    app = server.create_app(config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = app.state.services.bot
+    bot.client = model
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "workload": {
+                "conversations": len(conversations),
+                "messages": len(messages),
+                "darija_conversations": sum(1 for c in conversations if c.language == "ar")
+            }
+        },
+        "scenarios": {}
+    }
+    results = report["scenarios"]
+
+    if "format_bold_text" in scenarios:
+        answers = [model.reply_for([{"role": "user", "content": message}]) for message in messages]
+        results["format_bold_text"] = timed_calls(bot.format_bold_text, answers, args.repeat)
+    if "detect_medical_specialty" in scenarios:
+        results["detect_medical_specialty"] = timed_calls(bot.detect_medical_specialty, messages, args.repeat)
+
+    if {"chat", "history", "status"} & set(scenarios):
+        port = free_port()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_uvicorn(app, port)
+        base_url = f"http://127.0.0.1:{port}"
+        # First health check, so /status reports the fake model as connected
+        time.sleep(0.2)
+
+        if "chat" in scenarios:
+            calls_before = model.calls
+            results["chat"] = run_chat(base_url, conversations, args.patients)
+            results["chat"]["model_calls"] = model.calls - calls_before
+        elif "history" in scenarios:
+            # No chat run: store the same conversations directly
+            for conversation in conversations:
+                for message in conversation.messages:
+                    bot.save_turn(conversation.conversation_id, conversation.patient_id, message,
+                                  model.reply_for([{"role": "user", "content": message}]))
+        if "history" in scenarios:
+            rng = random.Random(args.seed)
+            results["history"] = run_gets([
+                f"{base_url}/conversations/{c.conversation_id}?patient_id={c.patient_id}"
+                for c in (rng.choice(conversations) for _ in range(args.reads))
+            ])
+        if "status" in scenarios:
+            results["status"] = run_gets([f"{base_url}/status"] * args.reads)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    print()
+    for name, stats in results.items():
+        print(f"📊 {name:26} {stats['throughput_per_s']:>10}/s  p50 {stats['latency']['p50_ms']} ms  "
+              f"p99 {stats['latency']['p99_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
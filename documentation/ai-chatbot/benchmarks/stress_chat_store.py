@@ -0,0 +1,149 @@
+# ============================================================================
+# STRESS TEST - concurrent /chat writes and /conversations reads
+#
+# Many patients chat at once (each on its own conversation) while reader
+# threads poll /conversations/{id}. Afterwards every conversation must hold
+# exactly its turns, in order, each answer right after its own question.
+# Reports read latency measured under that write load.
+#
+# Usage: python stress_chat_store.py --patients 32 --turns 10 --readers 8
+# ============================================================================
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import urllib.request
+
+from common import add_chatbot_to_path, free_port, start_uvicorn, summarize, use_temp_workdir
+from stub_model import EchoStubModel
+
+
+def post_chat(base_url, conversation_id, patient_id, message):
+    request = urllib.request.Request(
+        f"{base_url}/chat",
+        data=json.dumps({
+            "message": message,
+            "conversation_id": conversation_id,
+            "patient_id": patient_id
+        }).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return json.loads(response.read())
+
+
+def get_history(base_url, conversation_id, patient_id):
+    url = f"{base_url}/conversations/{conversation_id}?patient_id={patient_id}"
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def verify(db_path, patients, turns):
+    """Every conversation has 2*turns rows: question k immediately followed by its answer"""
+    conn = sqlite3.connect(db_path)
+    problems = []
+    for p in range(patients):
+        rows = conn.execute(
+            "SELECT message, sender FROM chat_history WHERE conversation_id = ? AND patient_id = ? "
+            "ORDER BY id",
+            (f"stress-{p}", f"patient-{p}")
+        ).fetchall()
+        if len(rows) != 2 * turns:
+            problems.append(f"stress-{p}: {len(rows)} rows, expected {2 * turns}")
+            continue
+        for k in range(turns):
+            question, answer = rows[2 * k], rows[2 * k + 1]
+            expected = f"patient {p} turn {k}"
+            if question != (expected, "user") or answer[1] != "assistant" \
+                    or not answer[0].startswith(f"Réponse à: {expected}"):
+                problems.append(f"stress-{p}: turn {k} out of order or mixed up")
+                break
+    conn.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent chat writes vs history reads")
+    parser.add_argument("--patients", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub generation time (s)")
+    args = parser.parse_args()
+
+    os.environ["CHATBOT_MAX_CONCURRENCY"] = str(args.patients)
+    os.environ["CHATBOT_QUEUE_DEPTH"] = str(args.patients)
+
+    add_chatbot_to_path()
+    workdir = use_temp_workdir()
+    import colab_medical_chatbot_fixed as server
+
+    app = server.create_app()
+    bot = app.state.services.bot
+    bot.client = EchoStubModel(latency=args.latency)
+    port = free_port()
+    start_uvicorn(app, port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    errors = []
+    read_latencies = []
+    writers_done = threading.Event()
+    lock = threading.Lock()
+
+    def patient(p):
+        try:
+            for k in range(args.turns):
+                post_chat(base_url, f"stress-{p}", f"patient-{p}", f"patient {p} turn {k}")
+        except Exception as e:
+            with lock:
+                errors.append(f"writer {p}: {e}")
+
+    def reader(seed):
+        rng = random.Random(seed)
+        while not writers_done.is_set():
+            p = rng.randrange(args.patients)
+            start = time.perf_counter()
+            try:
+                get_history(base_url, f"stress-{p}", f"patient-{p}")
+            except Exception as e:
+                with lock:
+                    errors.append(f"reader: {e}")
+                continue
+            with lock:
+                read_latencies.append(time.perf_counter() - start)
+
+    writers = [threading.Thread(target=patient, args=(p,)) for p in range(args.patients)]
+    readers = [threading.Thread(target=reader, args=(r,)) for r in range(args.readers)]
+    start = time.perf_counter()
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    bot.writer.flush()
+    problems = verify(os.path.join(workdir, "medical_chatbot.db"), args.patients, args.turns)
+
+    report = {
+        "config": vars(args),
+        "seconds": round(elapsed, 2),
+        "turns_per_sec": round(args.patients * args.turns / elapsed, 1),
+        "history_reads_under_write_load": summarize(read_latencies),
+        "errors": errors[:10],
+        "integrity_problems": problems[:10]
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    assert not errors, f"{len(errors)} request errors"
+    assert not problems, f"{len(problems)} conversations lost or interleaved rows"
+    print("✅ No lost or interleaved rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# ============================================================================
+# STRESS TEST - Circuit breaker around the backend client
+#
+# Drives integrate_with_existing_backend() against the stub API while it is
+# switched between healthy, dead (502) and slow (/chat slower than the
+# client timeout) and checks that:
+#   - a dead backend opens the circuit after a few failures, and from then
+#     on messages get the rule-based fallback answer without reaching it
+#   - the background probe notices recovery and one trial call closes it
+#   - a slow backend opens it too, and a failed trial call re-opens it
+#   - history reads retry 503s with backoff and give up after read_retries
+# Also times the slow phase without a breaker for comparison.
+#
+# Usage: python stress_circuit_breaker.py --timeout 0.5 --messages 40
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import threading
+import time
+
+from common import add_backend_ai_to_path, free_port, start_uvicorn, summarize
+from stub_server import create_stub_app
+
+# Not the chatbot folder: colab_integration must find the fallback engine itself
+add_backend_ai_to_path()
+from circuit_breaker import CircuitBreaker  # noqa: E402
+from colab_integration import ColabMedicalChatbot, integrate_with_existing_backend  # noqa: E402
+
+STUB_REPLY_PREFIX = "Réponse à"
+
+
+def send_many(respond, count, threads=1):
+    """Send ``count`` messages over ``threads`` threads; return (latencies, fallbacks)"""
+    latencies, fallbacks = [], [0]
+    lock = threading.Lock()
+
+    def worker(index):
+        for i in range(index, count, threads):
+            start = time.perf_counter()
+            answer = respond(f"Message {i}", f"conv-{i % 7}", f"patient-{i % 7}")
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                fallbacks[0] += not answer.startswith(STUB_REPLY_PREFIX)
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies, fallbacks[0]
+
+
+def wait_for_state(breaker, state, timeout):
+    deadline = time.monotonic() + timeout
+    while breaker.state != state:
+        if time.monotonic() > deadline:
+            raise AssertionError(f"breaker stayed {breaker.state}, expected {state}")
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Circuit breaker behaviour against a toggled stub")
+    parser.add_argument("--timeout", type=float, default=0.5, help="client /chat timeout (s)")
+    parser.add_argument("--messages", type=int, default=40, help="messages per phase")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent senders in the dead phase")
+    parser.add_argument("--probe-interval", type=float, default=0.2)
+    args = parser.parse_args()
+
+    app = create_stub_app(latency=0.01)
+    app.state.slow_latency = args.timeout * 4
+    port = free_port()
+    start_uvicorn(app, port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        client = ColabMedicalChatbot(base_url, timeout=args.timeout)
+    breaker = CircuitBreaker(min_calls=5, probe=client.test_connection, probe_interval=args.probe_interval)
+    respond = integrate_with_existing_backend(base_url, breaker=breaker, client=client, require_fallback=True)
+    assert respond.fallback_engine is not None
+    report = {"config": vars(args), "phases": {}}
+
+    # 1. Healthy: everything goes to the model
+    latencies, fallbacks = send_many(respond, args.messages)
+    assert fallbacks == 0 and breaker.state == "closed"
+    report["phases"]["healthy"] = {"latency": summarize(latencies), "fallbacks": fallbacks}
+
+    # 2. Dead: a handful of fast failures, then the circuit opens
+    app.state.mode = "dead"
+    chat_requests = app.state.chat_requests
+    latencies, fallbacks = send_many(respond, args.messages * 10, threads=args.threads)
+    assert breaker.state == "open", breaker.stats()
+    assert fallbacks == args.messages * 10
+    # Only the failures that filled the window past the threshold (and the
+    # calls already in flight on the other threads) reached the backend
+    reached = app.state.chat_requests - chat_requests
+    assert reached <= math.ceil(breaker.window_size * breaker.failure_rate_threshold) + args.threads, reached
+    assert breaker.counters["rejected"] >= args.messages * 10 - reached, breaker.stats()
+    rejected = sorted(latencies)[:-reached]
+    report["phases"]["dead"] = {"latency": summarize(latencies), "rejected_fast_path": summarize(rejected),
+                                "reached_backend": reached, "breaker": breaker.stats()}
+
+    # 3. Recovery: the probe moves to half-open, one trial call closes the circuit
+    app.state.mode = "healthy"
+    start = time.perf_counter()
+    wait_for_state(breaker, "half_open", timeout=args.probe_interval * 20)
+    latencies, fallbacks = send_many(respond, args.messages)
+    assert breaker.state == "closed" and fallbacks == 0
+    report["phases"]["recovery"] = {"detected_after_s": round(time.perf_counter() - start, 3)}
+
+    # 4. Slow: timeouts open the circuit; the probe (health OK) lets a trial
+    #    through, it times out and the circuit opens again
+    app.state.mode = "slow"
+    opened_before = breaker.counters["opened"]
+    start = time.perf_counter()
+    latencies, fallbacks = send_many(respond, args.messages)
+    wait_for_state(breaker, "half_open", timeout=args.probe_interval * 20)
+    send_many(respond, 1)
+    assert breaker.state == "open" and breaker.counters["opened"] >= opened_before + 2, breaker.stats()
+    report["phases"]["slow"] = {
+        "wall_s": round(time.perf_counter() - start, 2),
+        "timed_out_calls": sum(1 for latency in latencies if latency >= args.timeout),
+        "latency": summarize(latencies),
+        "breaker": breaker.stats()
+    }
+
+    # Same slow phase with no breaker: every message waits for the timeout
+    no_breaker = integrate_with_existing_backend(
+        base_url, breaker=CircuitBreaker(min_calls=10 ** 9), client=client
+    )
+    start = time.perf_counter()
+    latencies, _ = send_many(no_breaker, args.messages)
+    report["phases"]["slow_without_breaker"] = {
+        "wall_s": round(time.perf_counter() - start, 2),
+        "latency": summarize(latencies)
+    }
+
+    # 5. Healthy again
+    app.state.mode = "healthy"
+    wait_for_state(breaker, "half_open", timeout=args.probe_interval * 20)
+    send_many(respond, 5)
+    assert breaker.state == "closed"
+
+    # 6. Idempotent reads retry 503s with jittered backoff
+    app.state.fail_next_reads = client.read_retries - 1
+    history = client.get_conversation_history("conv-1", "patient-1")
+    assert "error" not in history and history["history"], history
+    retried = client.retried_reads
+    app.state.fail_next_reads = client.read_retries
+    history = client.get_conversation_history("conv-1", "patient-1")
+    assert "error" in history
+    app.state.fail_next_reads = 0
+    report["phases"]["read_retries"] = {"recovered_after_retries": retried,
+                                        "total_retries": client.retried_reads}
+
+    breaker.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print("✅ Circuit breaker behaved as expected")
+
+
+if __name__ == "__main__":
+    main()
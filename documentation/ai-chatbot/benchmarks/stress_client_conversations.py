@@ -0,0 +1,114 @@
+# ============================================================================
+# STRESS TEST - Hundreds of parallel conversations through one client
+#
+# Every thread owns one conversation handle and sends --messages messages
+# tagged with its own conversation. Checks there is no cross-talk: each
+# answer echoes the message that was sent and comes back on the handle's
+# conversation, and each server-side history holds exactly that
+# conversation's messages, in order. Compares throughput of one shared
+# client (ColabMedicalChatbot, then the async client's sync facade) against
+# one ColabMedicalChatbot per thread.
+#
+# Usage: python stress_client_conversations.py --conversations 300 --messages 5
+# ============================================================================
+
+import argparse
+import contextlib
+import io
+import json
+import threading
+import time
+
+from common import add_backend_ai_to_path, free_port, start_uvicorn
+from stub_server import create_stub_app
+
+add_backend_ai_to_path()
+from colab_async_client import SyncColabMedicalChatbot  # noqa: E402
+from colab_integration import ColabMedicalChatbot  # noqa: E402
+
+
+def run(conversations, messages, handles):
+    """Drive every handle on its own thread; return (wall seconds, failures)"""
+    failures = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(handles))
+
+    def conversation(i, handle):
+        barrier.wait()
+        for m in range(messages):
+            text = f"[{handle.conversation_id}] message {m} du patient {i}"
+            result = handle.send(text)
+            problem = None
+            if result["status"] != "success":
+                problem = f"status {result['status']}: {result['response']}"
+            elif result["response"] != f"Réponse à: {text}":
+                problem = f"got another conversation's answer: {result['response']}"
+            elif result["conversation_id"] != handle.conversation_id:
+                problem = f"answered on {result['conversation_id']}"
+            if problem:
+                with lock:
+                    failures.append((handle.conversation_id, problem))
+
+    threads = [threading.Thread(target=conversation, args=(i, h)) for i, h in enumerate(handles)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    for i, handle in enumerate(handles):
+        history = handle.history(page_size=100)["history"]
+        expected = []
+        for m in range(messages):
+            text = f"[{handle.conversation_id}] message {m} du patient {i}"
+            expected += [text, f"Réponse à: {text}"]
+        if [item["message"] for item in history] != expected:
+            failures.append((handle.conversation_id, "history mixed with another conversation"))
+    return wall, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-talk and throughput of shared vs per-thread clients")
+    parser.add_argument("--conversations", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=5, help="messages per conversation")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub /chat latency (s)")
+    args = parser.parse_args()
+
+    port = free_port()
+    start_uvicorn(create_stub_app(latency=args.latency), port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    # ColabMedicalChatbot prints a connection banner per instance
+    with contextlib.redirect_stdout(io.StringIO()):
+        shared = ColabMedicalChatbot(base_url, max_connections=args.conversations)
+        per_thread = [ColabMedicalChatbot(base_url) for _ in range(args.conversations)]
+    facade = SyncColabMedicalChatbot.from_url(base_url)
+
+    modes = {
+        "shared_client": [shared.new_conversation(f"patient-{i}") for i in range(args.conversations)],
+        "client_per_thread": [client.new_conversation(f"patient-{i}") for i, client in enumerate(per_thread)],
+        "shared_async_facade": [facade.new_conversation(f"patient-{i}") for i in range(args.conversations)],
+    }
+
+    report = {"config": vars(args), "results": {}}
+    total_failures = 0
+    for name, handles in modes.items():
+        wall, failures = run(args.conversations, args.messages, handles)
+        total_failures += len(failures)
+        report["results"][name] = {
+            "messages_per_s": round(args.conversations * args.messages / wall, 1),
+            "wall_s": round(wall, 2),
+            "cross_talk_or_errors": len(failures),
+            "examples": failures[:3]
+        }
+        print(f"📊 {name}: {report['results'][name]['messages_per_s']} msg/s, {len(failures)} failures")
+
+    facade.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    assert total_failures == 0, f"{total_failures} conversations saw cross-talk or errors"
+    print("✅ No cross-talk")
+
+
+if __name__ == "__main__":
+    main()
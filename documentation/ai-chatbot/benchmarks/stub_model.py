@@ -0,0 +1,346 @@
+# ============================================================================
+# STUB MODEL - Offline stand-in for ollama.Client used by the benchmarks
+# ============================================================================
+
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+import unicodedata
+
+
+class SlowStubModel:
+    """Mimics ``ollama.Client.chat`` with a fixed, blocking generation delay.
+
+    With ``stream=True`` the reply is yielded word by word, spreading the same
+    total latency evenly across the tokens like a real decode loop.
+
+    With ``prefill_tokens_per_s`` set, reading the prompt also takes time
+    (about 4 characters per token) and the response carries Ollama's
+    prompt_eval_count / prompt_eval_duration fields.
+
+    ``list`` and ``ps`` answer instantly with phi3:mini installed and loaded.
+    """
+
+    def __init__(self, latency=2.0, reply=None, prefill_tokens_per_s=None):
+        self.latency = latency
+        self.prefill_tokens_per_s = prefill_tokens_per_s
+        self.reply = reply or (
+            "Je comprends votre inquiétude. Reposez-vous et hydratez-vous bien. "
+            "Si les symptômes persistent plus de 48h, une consultation est conseillée."
+        )
+        self.calls = 0
+
+    def chat(self, model, messages, options=None, stream=False, **kwargs):
+        self.calls += 1
+        reply = self.reply_for(messages)
+        if stream:
+            return self._stream(model, messages, reply)
+        prefill = self._prefill(messages)
+        time.sleep(self.latency)
+        return {"model": model, "message": {"role": "assistant", "content": reply}, **prefill}
+
+    def reply_for(self, messages):
+        return self.reply
+
+    def _prefill(self, messages):
+        if not self.prefill_tokens_per_s:
+            return {}
+        tokens = sum(len(m["content"]) // 4 + 4 for m in messages)
+        duration = tokens / self.prefill_tokens_per_s
+        time.sleep(duration)
+        return {"prompt_eval_count": tokens, "prompt_eval_duration": int(duration * 1e9)}
+
+    def _stream(self, model, messages, reply):
+        prefill = self._prefill(messages)
+        words = reply.split(" ")
+        delay = self.latency / len(words)
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            token = word if i == 0 else " " + word
+            yield {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+        yield {"model": model, "message": {"role": "assistant", "content": ""}, "done": True, **prefill}
+
+    def list(self):
+        return {"models": [{"model": "phi3:mini", "name": "phi3:mini"}]}
+
+    def ps(self):
+        return {"models": [{"model": "phi3:mini", "name": "phi3:mini"}]}
+
+    def embed(self, model, input, **kwargs):
+        """Bag-of-words hashing embedding: same words -> same vector, order ignored"""
+        text = "".join(
+            char for char in unicodedata.normalize("NFKD", input.lower())
+            if not unicodedata.combining(char)
+        )
+        vector = [0.0] * 256
+        for word in re.findall(r"\w+", text):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[digest[0]] += 1.0 if digest[1] % 2 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return {"model": model, "embeddings": [[x / norm for x in vector]]}
+
+
+class EchoStubModel(SlowStubModel):
+    """Replies with the last user message so tests can match answers to questions"""
+
+    def reply_for(self, messages):
+        return f"Réponse à: {messages[-1]['content']}"
+
+
+FRENCH_REPLY_SENTENCES = [
+    "Je comprends votre inquiétude face à ces symptômes.",
+    "Reposez-vous et buvez beaucoup d'eau pendant quelques jours.",
+    "Une douleur qui dure plus de 48h mérite une consultation.",
+    "Notez l'évolution de la fièvre et de la douleur chaque jour.",
+    "Évitez de prendre un médicament sans avis médical.",
+    "Un médecin pourra faire un examen et proposer un traitement adapté.",
+    "Si les symptômes s'aggravent, consultez rapidement.",
+    "Le stress et le manque de sommeil peuvent aggraver ces troubles.",
+]
+DARIJA_REPLY_SENTENCES = [
+    "كنفهم القلق ديالك على هاد الأعراض.",
+    "ارتاح و شرب الما بزاف شي أيام.",
+    "إلا بقا الوجع كثر من يومين خاصك تشوف طبيب.",
+    "تبع الحرارة و الوجع كل نهار.",
+    "ما تاخدش دوا بلا ما تسول الطبيب.",
+    "الطبيب غادي يفحصك و يعطيك العلاج المناسب.",
+]
+_ARABIC_LETTER = re.compile(r"[؀-ۿ]")
+
+
+class FakeOllama(SlowStubModel):
+    """Deterministic stand-in for ``ollama.Client`` timed like a real model.
+
+    A generation takes ``first_token_s`` (prompt read and first token), then
+    one word every ``1 / tokens_per_s`` seconds. The reply depends only on
+    the last user message (French or Darija sentences picked by a stable
+    seed), so a seeded workload gets the same answers on every run and
+    every machine. Responses carry Ollama's prompt_eval_count, eval_count
+    and eval_duration fields.
+    """
+
+    def __init__(self, tokens_per_s=50.0, first_token_s=0.2, reply_sentences=4):
+        super().__init__(latency=0.0)
+        self.tokens_per_s = tokens_per_s
+        self.first_token_s = first_token_s
+        self.reply_sentences = reply_sentences
+
+    def reply_for(self, messages):
+        message = messages[-1]["content"]
+        sentences = DARIJA_REPLY_SENTENCES if _ARABIC_LETTER.search(message) else FRENCH_REPLY_SENTENCES
+        # String seeds are hashed with SHA-512: same message, same reply, any process
+        rng = random.Random(message)
+        return " ".join(rng.sample(sentences, min(self.reply_sentences, len(sentences))))
+
+    def _counts(self, messages, words):
+        prompt_tokens = sum(len(m["content"]) // 4 + 4 for m in messages)
+        return {
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.first_token_s * 1e9),
+            "eval_count": len(words),
+            "eval_duration": int(len(words) / self.tokens_per_s * 1e9)
+        }
+
+    def chat(self, model, messages, options=None, stream=False, **kwargs):
+        self.calls += 1
+        words = self.reply_for(messages).split(" ")
+        if stream:
+            return self._stream_words(model, messages, words)
+        time.sleep(self.first_token_s + len(words) / self.tokens_per_s)
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": " ".join(words)},
+            **self._counts(messages, words)
+        }
+
+    def _stream_words(self, model, messages, words):
+        time.sleep(self.first_token_s)
+        delay = 1.0 / self.tokens_per_s
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(delay)
+            token = word if i == 0 else " " + word
+            yield {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+        yield {
+            "model": model,
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            **self._counts(messages, words)
+        }
+
+
+class BatchedFakeOllama(FakeOllama):
+    """FakeOllama on one shared device, where batching amortizes the cost.
+
+    Generations hold the device while they run, so concurrent ``chat`` calls
+    queue behind each other like separate passes competing for one CPU/GPU.
+    ``chat_batch`` runs several prompts in one pass: the prompt reads cost
+    ``first_token_s * (1 + prefill_sequence_cost * (n - 1))`` and every
+    decode step ``(1 / tokens_per_s) * (1 + decode_sequence_cost * (n - 1))``
+    until the longest reply is done. Decoding is memory bound, so an extra
+    sequence adds little; prefill is compute bound and adds more.
+    ``generated_tokens`` counts the words of every reply.
+    """
+
+    def __init__(self, tokens_per_s=50.0, first_token_s=0.2, reply_sentences=4,
+                 prefill_sequence_cost=0.5, decode_sequence_cost=0.1):
+        super().__init__(tokens_per_s, first_token_s, reply_sentences)
+        self.prefill_sequence_cost = prefill_sequence_cost
+        self.decode_sequence_cost = decode_sequence_cost
+        self.batches = 0
+        self.generated_tokens = 0
+        self._device = threading.Lock()
+        self._counter_lock = threading.Lock()
+
+    def _run_on_device(self, word_counts):
+        extra = len(word_counts) - 1
+        prefill = self.first_token_s * (1 + self.prefill_sequence_cost * extra)
+        step = (1 / self.tokens_per_s) * (1 + self.decode_sequence_cost * extra)
+        with self._device:
+            time.sleep(prefill + max(word_counts) * step)
+        with self._counter_lock:
+            self.calls += len(word_counts)
+            self.batches += 1
+            self.generated_tokens += sum(word_counts)
+        return step
+
+    def _response(self, model, messages, words, step):
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": " ".join(words)},
+            **self._counts(messages, words),
+            "eval_duration": int(len(words) * step * 1e9)
+        }
+
+    def chat(self, model, messages, options=None, stream=False, **kwargs):
+        if stream:
+            return super().chat(model, messages, options, stream=True)
+        words = self.reply_for(messages).split(" ")
+        step = self._run_on_device([len(words)])
+        return self._response(model, messages, words, step)
+
+    def chat_batch(self, model, messages, options=None, **kwargs):
+        """One response per prompt of ``messages`` (a list of message lists)"""
+        replies = [self.reply_for(prompt).split(" ") for prompt in messages]
+        step = self._run_on_device([len(words) for words in replies])
+        return [self._response(model, prompt, words, step) for prompt, words in zip(messages, replies)]
+
+
+def keep_alive_seconds(value, default):
+    """Ollama's keep_alive (None, seconds, '30m', '2h', -1) in seconds; inf for ever"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, str):
+        units = {"s": 1, "m": 60, "h": 3600}
+        if value[-1:] in units:
+            return float(value[:-1]) * units[value[-1]]
+        value = float(value)
+    return math.inf if value < 0 else float(value)
+
+
+class PrefixCacheFakeOllama(FakeOllama):
+    """FakeOllama that models llama.cpp's prompt cache and Ollama's model unloading.
+
+    Each of ``slots`` parallel slots remembers the tokens of its last prompt
+    and answer. A request reuses the slot sharing the longest prefix with
+    its prompt and only prefills the rest, at ``prefill_tokens_per_s``;
+    prompt_eval_count reports those evaluated tokens, like Ollama, and
+    prompt_cache_count the reused ones, like llama.cpp's cache_n. The model
+    unloads (dropping every slot) once it has been idle longer than the
+    request's keep_alive (``default_keep_alive_s`` when none is sent), and
+    the next request pays ``load_s``. One request runs at a time.
+
+    Prompts are counted with the chatbot's own token estimate: construct
+    it after common.add_chatbot_to_path(). Streaming is not cached.
+    """
+
+    def __init__(self, tokens_per_s=50.0, prefill_tokens_per_s=400.0, load_s=1.5, default_keep_alive_s=300.0,
+                 slots=1, reply_sentences=4):
+        super().__init__(tokens_per_s, first_token_s=0.0, reply_sentences=reply_sentences)
+        from context_budget import MESSAGE_OVERHEAD_TOKENS, estimate_tokens
+        self._overhead = MESSAGE_OVERHEAD_TOKENS
+        self._estimate = estimate_tokens
+        self.prefill_tokens_per_s = prefill_tokens_per_s
+        self.load_s = load_s
+        self.default_keep_alive_s = default_keep_alive_s
+        self.slots = slots
+        self.loads = 0
+        self.prompt_tokens = 0
+        self.evaluated_tokens = 0
+        # Token lists of the slots, least recently used first
+        self._slots = []
+        self._unload_at = None
+        self._device = threading.Lock()
+
+    def _tokens(self, role, text):
+        return [f"<|{role}|>"] * self._overhead + [
+            piece for word in text.split() for piece in [word] * self._estimate(word)
+        ]
+
+    def _prompt_tokens(self, messages):
+        return [token for m in messages for token in self._tokens(m["role"], m["content"])]
+
+    def _take_slot(self, prompt):
+        """(slot index, cached tokens) for ``prompt``, like llama.cpp's slot selection
+
+        The slot sharing the longest prefix wins if that covers at least
+        half the prompt; otherwise a free slot, or the least recently used.
+        """
+        shared = []
+        for tokens in self._slots:
+            count = 0
+            for a, b in zip(tokens, prompt):
+                if a != b:
+                    break
+                count += 1
+            shared.append(count)
+        if shared:
+            best = max(range(len(shared)), key=shared.__getitem__)
+            if shared[best] >= len(prompt) / 2:
+                return best, shared[best]
+        if len(self._slots) < self.slots:
+            self._slots.append([])
+            return len(self._slots) - 1, 0
+        return 0, shared[0]
+
+    def chat(self, model, messages, options=None, stream=False, keep_alive=None, **kwargs):
+        if stream:
+            return super().chat(model, messages, options, stream=True)
+        words = self.reply_for(messages).split(" ")
+        prompt = self._prompt_tokens(messages)
+        with self._device:
+            now = time.monotonic()
+            load = 0.0
+            if self._unload_at is None or now >= self._unload_at:
+                load = self.load_s
+                self._slots.clear()
+                self.loads += 1
+            slot, cached = self._take_slot(prompt)
+            # llama.cpp always evaluates at least the last prompt token
+            evaluated = max(1, len(prompt) - cached)
+            prefill = evaluated / self.prefill_tokens_per_s
+            decode = len(words) / self.tokens_per_s
+            time.sleep(load + prefill + decode)
+            self._slots[slot] = prompt + self._tokens("assistant", " ".join(words))
+            self._slots.append(self._slots.pop(slot))
+            self._unload_at = time.monotonic() + keep_alive_seconds(keep_alive, self.default_keep_alive_s)
+            self.calls += 1
+            self.prompt_tokens += len(prompt)
+            self.evaluated_tokens += evaluated
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": " ".join(words)},
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": evaluated,
+            "prompt_cache_count": len(prompt) - evaluated,
+            "prompt_eval_duration": int(prefill * 1e9),
+            "eval_count": len(words),
+            "eval_duration": int(decode * 1e9)
+        }
+
+    def ps(self):
+        loaded = self._unload_at is not None and time.monotonic() < self._unload_at
+        return {"models": [{"model": "phi3:mini", "name": "phi3:mini"}] if loaded else []}
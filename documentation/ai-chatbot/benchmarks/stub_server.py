@@ -0,0 +1,146 @@
+# ============================================================================
+# STUB SERVER - Minimal stand-in for the chatbot HTTP API
+#
+# Same routes and JSON shapes as colab_medical_chatbot_fixed.py, without
+# Ollama or SQLite: /chat waits ``latency`` seconds (asyncio.sleep, so any
+# number of requests can wait at once) and echoes the question. Used to
+# benchmark and test the backend clients.
+#
+# app.state.mode switches its health at runtime:
+#   "healthy" - normal answers
+#   "slow"    - /chat takes app.state.slow_latency seconds, health check still OK
+#   "dead"    - every route answers 502, like ngrok with no tunnel behind it
+# app.state.fail_next_reads makes that many history reads answer 503.
+# app.state.chat_requests counts every POST /chat that reached the stub,
+# answered or not (chat_calls only counts answered ones).
+#
+# create_openai_stub_app serves a stub model over the OpenAI chat API, to
+# benchmark the OpenAI-compatible model backend.
+# ============================================================================
+
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class ChatRequest(BaseModel):
+    message: str
+    conversation_id: Optional[str] = None
+    patient_id: Optional[str] = "default_patient"
+    language: Optional[str] = "fr"
+
+
+def create_stub_app(latency=0.1):
+    """FastAPI app answering "Réponse à: <message>" after ``latency`` seconds"""
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.histories = {}
+    app.state.chat_calls = 0
+    app.state.mode = "healthy"
+    app.state.slow_latency = 60.0
+    app.state.fail_next_reads = 0
+    app.state.chat_requests = 0
+
+    @app.middleware("http")
+    async def simulate_outage(request: Request, call_next):
+        if request.url.path == "/chat":
+            app.state.chat_requests += 1
+        if app.state.mode == "dead":
+            return JSONResponse({"detail": "Tunnel not found"}, status_code=502)
+        if request.url.path.startswith("/conversations/") and app.state.fail_next_reads > 0:
+            app.state.fail_next_reads -= 1
+            return JSONResponse({"detail": "Service Unavailable"}, status_code=503)
+        return await call_next(request)
+
+    @app.get("/")
+    async def health_check():
+        return {"status": "healthy"}
+
+    @app.post("/reset-conversation")
+    async def reset_conversation():
+        return {"conversation_id": str(uuid.uuid4()), "status": "success"}
+
+    @app.post("/chat")
+    async def chat(request: ChatRequest):
+        app.state.chat_calls += 1
+        await asyncio.sleep(app.state.slow_latency if app.state.mode == "slow" else app.state.latency)
+        conversation_id = request.conversation_id or str(uuid.uuid4())
+        response = f"Réponse à: {request.message}"
+        history = app.state.histories.setdefault((conversation_id, request.patient_id), [])
+        history.extend([(request.message, "user"), (response, "assistant")])
+        return {
+            "response": response,
+            "conversation_id": conversation_id,
+            "patient_id": request.patient_id,
+            "status": "success",
+            "timestamp": datetime.now().isoformat()
+        }
+
+    @app.get("/conversations/{conversation_id}")
+    async def conversation_history(conversation_id: str, patient_id: str = "default_patient",
+                                   page_size: int = 20, cursor: Optional[int] = None):
+        history = app.state.histories.get((conversation_id, patient_id), [])
+        return {
+            "conversation_id": conversation_id,
+            "patient_id": patient_id,
+            "history": [{"message": m, "sender": s} for m, s in history[-page_size:]],
+            "next_cursor": None
+        }
+
+    return app
+
+
+def create_openai_stub_app(model, served_model="phi3:mini"):
+    """OpenAI-compatible server (like llama.cpp's) in front of a stub ``model``
+
+    /v1/chat/completions (plain or streamed as SSE) and /v1/models, with
+    ``usage`` token counts. The stub's blocking ``chat`` runs in a thread,
+    so its own timing and locking decide the throughput.
+    """
+    from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+
+    def usage(response):
+        return {
+            "prompt_tokens": response.get("prompt_eval_count") or 0,
+            "completion_tokens": response.get("eval_count") or 0
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": served_model, "object": "model"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if not body.get("stream"):
+            response = await run_in_threadpool(model.chat, body["model"], body["messages"])
+            return {
+                "object": "chat.completion",
+                "model": body["model"],
+                "choices": [{"index": 0, "message": response["message"], "finish_reason": "stop"}],
+                "usage": usage(response)
+            }
+
+        chunks = await run_in_threadpool(model.chat, body["model"], body["messages"], stream=True)
+
+        async def events():
+            async for chunk in iterate_in_threadpool(chunks):
+                if chunk["message"]["content"]:
+                    delta = {"content": chunk["message"]["content"]}
+                    yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': delta}]})}\n\n"
+                if chunk.get("done"):
+                    yield f"data: {json.dumps({'choices': [], 'usage': usage(chunk)})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
@@ -0,0 +1,73 @@
+# ============================================================================
+# TRACE BREAKDOWN - Per-stage latency from a span file
+#
+# Run the chatbot (or any benchmark here) with CHATBOT_TRACE_FILE set, then
+# point this script at the file. For every span name it reports the total
+# duration and the self time (duration minus its child spans), e.g.
+#   POST /chat self time       -> handler + waiting for an inference worker
+#   history / prompt / persist -> SQLite and prompt building
+#   inference                  -> phi3:mini
+#   client POST /chat self     -> ngrok and network (when the backend client
+#                                 traced the call with its own tracer)
+#
+# Usage:
+#   CHATBOT_TRACE_FILE=/tmp/spans.jsonl python bench_event_loop_latency.py
+#   python trace_breakdown.py /tmp/spans.jsonl
+# ============================================================================
+
+import argparse
+import json
+from collections import defaultdict
+
+from common import summarize
+
+
+def load_spans(paths):
+    spans = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+    return spans
+
+
+def breakdown(spans):
+    children_ms = defaultdict(float)
+    for span in spans:
+        if span["parent_id"]:
+            children_ms[span["parent_id"]] += span["duration_ms"]
+
+    totals, self_times = defaultdict(list), defaultdict(list)
+    for span in spans:
+        name = f"{span['kind']} {span['name']}" if span["kind"] == "client" else span["name"]
+        totals[name].append(span["duration_ms"] / 1000)
+        self_times[name].append(max(0.0, span["duration_ms"] - children_ms[span["span_id"]]) / 1000)
+
+    return {
+        name: {"total": summarize(totals[name]), "self": summarize(self_times[name])}
+        for name in sorted(totals, key=lambda name: -sum(totals[name]))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency breakdown of a span file")
+    parser.add_argument("paths", nargs="+", help="JSON lines span files (server and/or client)")
+    args = parser.parse_args()
+
+    spans = load_spans(args.paths)
+    report = {
+        "spans": len(spans),
+        "traces": len({span["trace_id"] for span in spans}),
+        "errors": sum(1 for span in spans if span["error"]),
+        "by_span": breakdown(spans)
+    }
+    print(json.dumps(report, indent=2))
+
+    print(f"\n{'span':40} {'count':>6} {'p50 ms':>9} {'p99 ms':>9} {'self p50':>9} {'self p99':>9}")
+    for name, stats in report["by_span"].items():
+        total, own = stats["total"], stats["self"]
+        print(f"{name:40} {total['count']:>6} {total['p50_ms']:>9} {total['p99_ms']:>9} "
+              f"{own['p50_ms']:>9} {own['p99_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
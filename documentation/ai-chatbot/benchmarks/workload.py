@@ -0,0 +1,83 @@
+# ============================================================================
+# WORKLOAD - Seeded multi-turn French / Darija patient conversations
+#
+# The same seed always gives the same conversations (patients, languages,
+# opening complaints, follow-ups), so benchmark runs on different commits
+# send exactly the same traffic.
+# ============================================================================
+
+import random
+from typing import List, NamedTuple
+
+FRENCH_OPENINGS = [
+    "J'ai mal de tête depuis deux jours",
+    "Je tousse beaucoup la nuit et j'ai du mal à respirer",
+    "J'ai des douleurs aux articulations des genoux",
+    "Mon cœur bat très vite quand je monte les escaliers",
+    "J'ai des nausées et mal au ventre après les repas",
+    "Je me sens très fatigué et stressé ces derniers temps",
+    "J'ai une éruption sur la peau du bras qui gratte",
+    "Mes yeux piquent et ma vue baisse le soir",
+    "J'ai mal de gorge et le nez bouché depuis une semaine",
+    "Mon fils de 6 ans a de la fièvre depuis hier",
+    "J'ai des brûlures en urinant",
+    "Je dors très mal et je me réveille plusieurs fois par nuit",
+]
+FRENCH_FOLLOW_UPS = [
+    "Depuis hier c'est plus fort",
+    "Est-ce que je peux prendre du paracétamol ?",
+    "J'ai aussi un peu de fièvre, 38.5",
+    "C'est grave docteur ?",
+    "Quel spécialiste dois-je consulter ?",
+    "La douleur revient surtout le matin",
+    "J'ai déjà eu ça l'année dernière",
+    "Merci, et combien de temps ça dure en général ?",
+]
+DARIJA_OPENINGS = [
+    "عندي وجع الراس من البارح",
+    "كنحس بخفقان فالقلب و وجع فالصدر",
+    "عندي كحة بزاف فالليل",
+    "الكرش كتضرني من بعد الماكلة",
+    "عندي السكري و بغيت نعرف شنو ناكل",
+    "كنحس بقلق و توتر بزاف",
+    "ولدي عندو السخانة من البارح",
+    "عندي حكة فالجلد ديال يدي",
+]
+DARIJA_FOLLOW_UPS = [
+    "من البارح ولا كثر",
+    "واش نقدر ناخد دوا ديال الراس؟",
+    "عندي شوية ديال السخانة",
+    "واش هادشي خطير؟",
+    "شمن طبيب خاصني نشوف؟",
+    "الوجع كيرجع غير فالصباح",
+    "شكرا، و شحال كيدوم هادشي؟",
+]
+
+
+class Conversation(NamedTuple):
+    conversation_id: str
+    patient_id: str
+    language: str
+    messages: List[str]
+
+
+def generate_conversations(seed=42, count=50, min_turns=1, max_turns=5, darija_share=0.3):
+    """``count`` conversations of ``min_turns``..``max_turns`` patient messages"""
+    rng = random.Random(seed)
+    conversations = []
+    for i in range(count):
+        darija = rng.random() < darija_share
+        openings, follow_ups = (DARIJA_OPENINGS, DARIJA_FOLLOW_UPS) if darija else (FRENCH_OPENINGS, FRENCH_FOLLOW_UPS)
+        turns = rng.randint(min_turns, max_turns)
+        messages = [rng.choice(openings)] + rng.sample(follow_ups, min(turns - 1, len(follow_ups)))
+        conversations.append(Conversation(
+            conversation_id=f"bench-{seed}-{i}",
+            patient_id=f"patient-{seed}-{i}",
+            language="ar" if darija else "fr",
+            messages=messages
+        ))
+    return conversations
+
+
+def all_messages(conversations):
+    return [message for conversation in conversations for message in conversation.messages]
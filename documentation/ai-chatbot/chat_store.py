@@ -0,0 +1,332 @@
+# ============================================================================
+# CHAT STORE - SQLite persistence for chat_history
+# ============================================================================
+
+import atexit
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+INSERT_MESSAGE_SQL = '''
+    INSERT INTO chat_history (conversation_id, patient_id, message, sender, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+
+def create_schema(conn):
+    """Create chat_history and its index if they do not exist yet"""
+    cursor = conn.cursor()
+
+    # Create chat_history table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id TEXT NOT NULL,
+            patient_id TEXT NOT NULL,
+            message TEXT NOT NULL,
+            sender TEXT CHECK(sender IN ('user', 'assistant')) NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # History lookups seek on (conversation, patient) and walk id backwards,
+    # so "last N messages" and keyset pages never sort or scan the table
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_history_conversation_id
+        ON chat_history(conversation_id, patient_id, id)
+    ''')
+    # Superseded by the index above (same prefix)
+    cursor.execute("DROP INDEX IF EXISTS idx_conversation_patient")
+
+    # Rolling summary of the turns that no longer fit in the prompt
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            conversation_id TEXT NOT NULL,
+            patient_id TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            summarized_messages INTEGER NOT NULL,
+            last_message_key TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (conversation_id, patient_id)
+        )
+    ''')
+
+    conn.commit()
+
+
+# Keyset page: messages strictly older than the cursor, newest first
+MESSAGES_BEFORE_SQL = '''
+    SELECT id, message, sender, timestamp FROM chat_history
+    WHERE conversation_id = ? AND patient_id = ? AND id < ?
+    ORDER BY id DESC LIMIT ?
+'''
+
+
+def fetch_messages_before(conn, conversation_id, patient_id, limit, before_id=None):
+    """Up to ``limit`` messages older than ``before_id`` (the newest when None), oldest first.
+
+    Ordering is by id, not timestamp: ids follow insertion order even for a
+    question and its answer saved within the same second.
+    """
+    cursor_id = sys.maxsize if before_id is None else before_id
+    rows = conn.execute(
+        MESSAGES_BEFORE_SQL, (conversation_id, patient_id, cursor_id, limit)
+    ).fetchall()
+    rows.reverse()
+    return rows
+
+
+def configure_connection(conn, synchronous="NORMAL"):
+    """Switch a connection to WAL journaling with the given synchronous level.
+
+    WAL lets readers run while a write is in progress, and with
+    synchronous=NORMAL a commit no longer waits for an fsync: transactions
+    survive an application crash, but the last few commits can be lost if
+    the machine itself loses power.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    return conn
+
+
+class SQLiteConnectionPool:
+    """Connections to one SQLite file, split into a writer path and reader paths.
+
+    - one writer connection, used under ``writer_lock`` (SQLite allows a
+      single writer at a time anyway, so queuing here avoids busy retries)
+    - one reader connection per thread, created on first use and never
+      shared, so cursors and transactions of different threads cannot mix
+
+    In WAL mode readers see the last committed snapshot and never wait for
+    the writer, so history reads are not slowed down by message saves.
+    """
+
+    def __init__(self, path, synchronous="NORMAL", busy_timeout=30.0):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.writer_lock = threading.Lock()
+        self._writer = self._connect()
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+        return configure_connection(conn, self.synchronous)
+
+    @contextmanager
+    def read(self):
+        """This thread's reader connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        yield conn
+
+    @contextmanager
+    def write(self):
+        """The writer connection; commits on success, rolls back on error"""
+        with self.writer_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    def close(self):
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        with self.writer_lock:
+            self._writer.close()
+
+
+def utc_timestamp():
+    """Same format as SQLite CURRENT_TIMESTAMP, taken when the message is produced"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class SummaryStore:
+    """conversation_summaries rows, read through a small in-memory LRU.
+
+    Values are (summary, summarized_messages, last_message_key) tuples.
+    Saves are written through immediately: a summary changes at most once
+    per turn, and losing it would only mean rebuilding it from the window.
+    """
+
+    def __init__(self, pool, cache_size=1000):
+        self.pool = pool
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id, patient_id):
+        key = (conversation_id, patient_id)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        with self.pool.read() as conn:
+            row = conn.execute('''
+                SELECT summary, summarized_messages, last_message_key FROM conversation_summaries
+                WHERE conversation_id = ? AND patient_id = ?
+            ''', key).fetchone()
+        self._remember(key, row)
+        return row
+
+    def save(self, conversation_id, patient_id, summary, summarized_messages, last_message_key):
+        with self.pool.write() as conn:
+            conn.execute('''
+                INSERT INTO conversation_summaries
+                    (conversation_id, patient_id, summary, summarized_messages, last_message_key, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (conversation_id, patient_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    summarized_messages = excluded.summarized_messages,
+                    last_message_key = excluded.last_message_key,
+                    updated_at = excluded.updated_at
+            ''', (conversation_id, patient_id, summary, summarized_messages, last_message_key, utc_timestamp()))
+        self._remember((conversation_id, patient_id), (summary, summarized_messages, last_message_key))
+
+    def _remember(self, key, row):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = row
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+class ChatHistoryWriter:
+    """Writes chat messages in batches, optionally behind the request.
+
+    Every call to ``save_messages`` is one transaction (``executemany`` +
+    a single commit), so a user/assistant turn costs one commit instead of two.
+
+    With ``write_behind=True`` rows are queued in memory and flushed by a
+    background thread once ``flush_size`` rows are pending or
+    ``flush_interval`` seconds have passed, whichever comes first.
+
+    Durability contract for write-behind mode:
+    - ``flush()`` / ``close()`` persist everything queued so far; ``close()``
+      runs on server shutdown and at interpreter exit.
+    - If the process is killed, at most ``flush_interval`` seconds
+      (or ``flush_size`` rows) of messages are lost.
+    - Readers call ``flush_conversation()`` first, so a conversation's own
+      history always includes its queued messages.
+    """
+
+    def __init__(self, pool, write_behind=False, flush_size=64, flush_interval=0.5):
+        self.pool = pool
+        self.write_behind = write_behind
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._pending = []
+        self._pending_keys = set()
+        self._flushing_keys = set()
+        self._pending_lock = threading.Lock()
+        # Held for the whole pop-and-write, so readers never slip in between
+        self._flush_lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.rows_written = 0
+        self.flushes = 0
+
+        if write_behind:
+            self._flusher = threading.Thread(target=self._flush_loop, name="chat-writer", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def save_messages(self, conversation_id, patient_id, messages):
+        """Persist ``[(message, sender), ...]`` for one conversation as one batch.
+
+        Returns the timestamp stored with the rows.
+        """
+        timestamp = utc_timestamp()
+        rows = [
+            (conversation_id, patient_id, message, sender, timestamp)
+            for message, sender in messages
+        ]
+
+        if not self.write_behind:
+            self._write(rows)
+            return timestamp
+
+        with self._pending_lock:
+            self._pending.extend(rows)
+            self._pending_keys.add((conversation_id, patient_id))
+            should_flush = len(self._pending) >= self.flush_size
+        if should_flush:
+            self._wakeup.set()
+        return timestamp
+
+    def flush(self):
+        """Write every queued row now"""
+        with self._flush_lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, []
+                self._flushing_keys, self._pending_keys = self._pending_keys, set()
+            if not rows:
+                return
+            try:
+                self._write(rows)
+            except Exception:
+                # Put the batch back so the next flush retries it
+                with self._pending_lock:
+                    self._pending[:0] = rows
+                    self._pending_keys.update((row[0], row[1]) for row in rows)
+                raise
+            finally:
+                self._flushing_keys = set()
+
+    def flush_conversation(self, conversation_id, patient_id):
+        """Flush if this conversation has queued rows (read-your-writes)"""
+        key = (conversation_id, patient_id)
+        # Fast path: conversations with nothing queued never wait for a flush
+        if key not in self._pending_keys and key not in self._flushing_keys:
+            return
+        with self._flush_lock:
+            if key in self._pending_keys:
+                self.flush()
+
+    def pending_count(self):
+        with self._pending_lock:
+            return len(self._pending)
+
+    def close(self):
+        """Stop the background flusher and persist what is still queued"""
+        if self._closed:
+            return
+        self._closed = True
+        if self.write_behind:
+            self._wakeup.set()
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    def _write(self, rows):
+        with self.pool.write() as conn:
+            conn.executemany(INSERT_MESSAGE_SQL, rows)
+        self.rows_written += len(rows)
+        self.flushes += 1
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Chat history flush failed: {e}")
+                time.sleep(self.flush_interval)
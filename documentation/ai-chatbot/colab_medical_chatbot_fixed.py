@@ -1,217 +1,575 @@
 # ============================================================================
 # GOOGLE COLAB MEDICAL CHATBOT - COMPLETE INTEGRATION
-# Copy this entire code to your Google Colab notebook
+# Upload this folder (with its helper modules) to your Google Colab notebook
 # ============================================================================
 
-import ollama
+import argparse
+import dataclasses
 import json
-import sqlite3
+import os
+import signal
 import uuid
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
 from datetime import datetime
-import re
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import uvicorn
 import threading
-from pyngrok import ngrok
 import time
+import urllib.request
+
+from admission import DeadlineExceededError, QueueFullError, Ticket, load_urgency_classifier
+from chat_store import ChatHistoryWriter, SQLiteConnectionPool, SummaryStore, create_schema, fetch_messages_before
+from context_budget import ContextBudgeter, ConversationSummary, count_message_tokens, estimate_tokens, message_key
+from conversation_cache import ConversationCache
+from fallback_engine import DISCLAIMER_MARKERS, DISCLAIMERS, RECOMMENDATION_TEMPLATES, SPECIALIST_REASONS
+from health_monitor import HealthMonitor
+from inference_executor import InferenceExecutor
+from metrics import ChatMetrics
+from micro_batcher import MicroBatcher
+from model_backends import ModelRouter
+from response_cache import ResponseCache
+from specialty_classifier import SpecialtyClassifier
+from term_highlighter import TermHighlighter
+from tracing import JsonlExporter, Tracer, TracingMiddleware, trace_span, traced
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Ollama model answering patients
+MODEL_NAME = "phi3:mini"
+# Model servers: empty for one Ollama on OLLAMA_HOST, comma-separated Ollama
+# URLs, or a JSON registry (see data/backends.example.json) mixing Ollama and
+# OpenAI-compatible servers, with routing rules to other models. Requests go
+# to the backend with the fewest outstanding requests; raise
+# CHATBOT_MAX_CONCURRENCY to what the backends can run together.
+MODEL_BACKENDS = os.getenv("CHATBOT_BACKENDS", "")
+
+# SQLite file holding chat history and conversation summaries
+DB_PATH = os.getenv("CHATBOT_DB_PATH", "medical_chatbot.db")
+
+# Number of phi3:mini generations allowed to run at the same time
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("CHATBOT_MAX_CONCURRENCY", "2"))
+# Number of /chat requests allowed to wait for a free worker before we answer 429.
+# Urgent messages (red flags, 'urgence', 'poitrine'...) are served first and
+# patients take turns, each with at most CHATBOT_MAX_PER_PATIENT requests in
+# flight (0 = no limit).
+INFERENCE_QUEUE_DEPTH = int(os.getenv("CHATBOT_QUEUE_DEPTH", "16"))
+MAX_REQUESTS_PER_PATIENT = int(os.getenv("CHATBOT_MAX_PER_PATIENT", "4"))
+# patient_id of callers that send none. They are not one patient, so they are
+# told apart by conversation for fairness and the per-patient limit.
+ANONYMOUS_PATIENT_ID = "default_patient"
+# Seconds a /chat client waits for its answer, unless it sends X-Request-Timeout
+# (the backend client gives up after 30 s). Requests that cannot be answered
+# in time are refused or dropped instead of generating for nobody; 0 disables.
+REQUEST_TIMEOUT = float(os.getenv("CHATBOT_REQUEST_TIMEOUT", "30"))
+REQUEST_TIMEOUT_HEADER = "x-request-timeout"
+# Micro-batching of /chat generations, for model backends with a batch call
+# (chat_batch): requests arriving within CHATBOT_BATCH_WAIT_MS of each other
+# are sent in one call, up to CHATBOT_BATCH_SIZE at once. Ollama has no batch
+# call and already decodes concurrent requests together in its parallel slots
+# (OLLAMA_NUM_PARALLEL): with a client lacking chat_batch (the ModelRouter)
+# the setting is ignored with a warning. 1 disables batching.
+BATCH_MAX_SIZE = int(os.getenv("CHATBOT_BATCH_SIZE", "1"))
+BATCH_MAX_WAIT_MS = float(os.getenv("CHATBOT_BATCH_WAIT_MS", "10"))
+
+# Sampling options shared by the blocking and streaming generations
+GENERATION_OPTIONS = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "max_tokens": 500
+}
+
+# How long Ollama keeps phi3:mini (and its prompt cache) in memory after a
+# request: a duration ('30m', '2h'), seconds, or -1 for ever. Ollama's own
+# default is 5 minutes; empty leaves it to Ollama.
+MODEL_KEEP_ALIVE = os.getenv("CHATBOT_KEEP_ALIVE", "30m")
+
+# System prompts, one file per language in data/prompts/
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "prompts")
+
+def load_system_prompts(directory=PROMPTS_DIR):
+    """{'fr': ..., 'ar': ...} from system_<language>.txt"""
+    prompts = {}
+    for language in ("fr", "ar"):
+        with open(os.path.join(directory, f"system_{language}.txt"), encoding="utf-8") as f:
+            prompts[language] = f.read().strip()
+    return prompts
+
+def supported_language(language):
+    """'ar' for Darija, 'fr' for anything else: the key of the per-language
+    prompts and templates, and the only values of the language metric label"""
+    return "ar" if language == "ar" else "fr"
+
+SYSTEM_PROMPTS = load_system_prompts()
+SYSTEM_MESSAGES = {language: {"role": "system", "content": prompt} for language, prompt in SYSTEM_PROMPTS.items()}
+SUMMARY_HEADERS = {
+    "fr": "Résumé des échanges précédents avec ce patient:",
+    "ar": "ملخص المحادثة السابقة:"
+}
+
+def parse_keep_alive(value):
+    """CHATBOT_KEEP_ALIVE as Ollama expects it: None (unset), seconds, or a duration string"""
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return value
+    return int(seconds) if seconds.is_integer() else seconds
+
+# SQLite durability: NORMAL (WAL, no fsync per commit) or FULL (fsync every commit)
+SQLITE_SYNCHRONOUS = os.getenv("CHATBOT_SQLITE_SYNCHRONOUS", "NORMAL")
+# Write-behind buffers chat turns in memory and saves them in batches.
+# On a hard crash up to CHATBOT_FLUSH_INTERVAL seconds of messages can be lost.
+WRITE_BEHIND_ENABLED = os.getenv("CHATBOT_WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_FLUSH_SIZE = int(os.getenv("CHATBOT_FLUSH_SIZE", "64"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("CHATBOT_FLUSH_INTERVAL", "0.5"))
+
+# Recent history windows kept in memory so follow-up turns skip SQLite.
+# Only valid while this process is the sole writer of medical_chatbot.db;
+# set CHATBOT_CONTEXT_CACHE_SIZE=0 to disable.
+HISTORY_WINDOW = 20
+CONTEXT_CACHE_SIZE = int(os.getenv("CHATBOT_CONTEXT_CACHE_SIZE", "1000"))
+CONTEXT_CACHE_MAX_MB = float(os.getenv("CHATBOT_CONTEXT_CACHE_MB", "64"))
+CONTEXT_CACHE_IDLE_TTL = float(os.getenv("CHATBOT_CONTEXT_CACHE_TTL", "1800"))
+
+# Prompt size cap (system prompt + summary + history + new message), in
+# estimated phi3:mini tokens. Older turns beyond it are folded into a rolling
+# summary of at most CHATBOT_SUMMARY_TOKENS. 0 sends the raw history window.
+PROMPT_TOKEN_BUDGET = int(os.getenv("CHATBOT_PROMPT_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("CHATBOT_SUMMARY_TOKENS", "256"))
+
+# Opt-in cache of phi3:mini answers to first-turn questions (no history).
+# The semantic tier needs an Ollama embedding model, e.g. nomic-embed-text.
+RESPONSE_CACHE_ENABLED = os.getenv("CHATBOT_RESPONSE_CACHE", "false").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("CHATBOT_RESPONSE_CACHE_SIZE", "500"))
+RESPONSE_CACHE_TTL = float(os.getenv("CHATBOT_RESPONSE_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MODEL = os.getenv("CHATBOT_SEMANTIC_CACHE_MODEL", "")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("CHATBOT_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+# One-token generation at startup so phi3:mini is loaded before the first patient
+MODEL_WARMUP_ENABLED = os.getenv("CHATBOT_WARMUP", "true").lower() == "true"
+
+# Seconds between background checks of Ollama (model list, no generation)
+# and SQLite; /status, /healthz and /readyz only read the cached result
+HEALTH_CHECK_INTERVAL = float(os.getenv("CHATBOT_HEALTH_INTERVAL", "10"))
+
+# Request tracing: spans (HTTP request, pipeline stages, inference) are
+# appended as JSON lines to CHATBOT_TRACE_FILE; off when unset. A caller's
+# sampled traceparent header is always traced.
+TRACE_FILE = os.getenv("CHATBOT_TRACE_FILE", "")
+TRACE_SAMPLE_RATE = float(os.getenv("CHATBOT_TRACE_SAMPLE_RATE", "1.0"))
+# Requests sent with 'X-Chatbot-Profile: sample' (or 'cprofile') are profiled
+# into this folder (flamegraph-ready .folded stacks, or .prof); off when unset
+PROFILE_DIR = os.getenv("CHATBOT_PROFILE_DIR", "")
+
+# API worker processes (--workers). Each one opens its own chatbot, inference
+# pool and SQLite connections in its lifespan; CHATBOT_MAX_CONCURRENCY is per
+# worker. With more than one worker the next turn of a conversation may land
+# on another process, so the in-memory history window and summary caches and
+# write-behind are turned off: every turn reads and writes SQLite (WAL).
+API_WORKERS = int(os.getenv("CHATBOT_WORKERS", "1"))
+# On shutdown, seconds to wait for open requests and in-flight generations
+# before closing; queued chat messages are always flushed
+DRAIN_TIMEOUT = float(os.getenv("CHATBOT_DRAIN_TIMEOUT", "30"))
+# How the parent process hands its ChatbotConfig to the workers it spawns
+WORKER_CONFIG_ENV = "CHATBOT_WORKER_CONFIG"
+
+@dataclass
+class ChatbotConfig:
+    """Settings of one chatbot app; defaults come from the CHATBOT_* variables above"""
+    db_path: str = DB_PATH
+    backends: str = MODEL_BACKENDS
+    max_concurrency: int = MAX_CONCURRENT_GENERATIONS
+    queue_depth: int = INFERENCE_QUEUE_DEPTH
+    max_per_patient: int = MAX_REQUESTS_PER_PATIENT
+    request_timeout: float = REQUEST_TIMEOUT
+    batch_size: int = BATCH_MAX_SIZE
+    batch_wait_ms: float = BATCH_MAX_WAIT_MS
+    sqlite_synchronous: str = SQLITE_SYNCHRONOUS
+    write_behind: bool = WRITE_BEHIND_ENABLED
+    flush_size: int = WRITE_BEHIND_FLUSH_SIZE
+    flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL
+    history_window: int = HISTORY_WINDOW
+    context_cache_size: int = CONTEXT_CACHE_SIZE
+    context_cache_mb: float = CONTEXT_CACHE_MAX_MB
+    context_cache_ttl: float = CONTEXT_CACHE_IDLE_TTL
+    prompt_token_budget: int = PROMPT_TOKEN_BUDGET
+    summary_tokens: int = SUMMARY_TOKEN_BUDGET
+    response_cache: bool = RESPONSE_CACHE_ENABLED
+    response_cache_size: int = RESPONSE_CACHE_SIZE
+    response_cache_ttl: float = RESPONSE_CACHE_TTL
+    semantic_cache_model: str = SEMANTIC_CACHE_MODEL
+    semantic_cache_threshold: float = SEMANTIC_CACHE_THRESHOLD
+    model_warmup: bool = MODEL_WARMUP_ENABLED
+    keep_alive: str = MODEL_KEEP_ALIVE
+    health_interval: float = HEALTH_CHECK_INTERVAL
+    trace_file: str = TRACE_FILE
+    trace_sample_rate: float = TRACE_SAMPLE_RATE
+    profile_dir: str = PROFILE_DIR
+    workers: int = API_WORKERS
+    drain_timeout: float = DRAIN_TIMEOUT
+
+def worker_config(config):
+    """``config`` made safe for several worker processes sharing one database"""
+    if config.workers <= 1:
+        return config
+    return dataclasses.replace(config, context_cache_size=0, write_behind=False)
 
 # ============================================================================
 # MEDICAL CHATBOT CLASS (Keep your existing class - it's perfect!)
 # ============================================================================
 
 class MedicalChatbotColab:
-    def __init__(self):
-        self.client = ollama.Client()
+    def __init__(self, config=None):
+        self.config = config or ChatbotConfig()
+        # ollama.Client look-alike over the configured model servers
+        self.client = ModelRouter.from_spec(self.config.backends, MODEL_NAME)
         self.setup_database()
-        self.medical_specialists = {
-            'neurologue': ['tête', 'vertige', 'migraine', 'neurologique', 'mal de tête'],
-            'cardiologue': ['cœur', 'poitrine', 'palpitation', 'cardiaque', 'thorax'],
-            'gastro-entérologue': ['ventre', 'estomac', 'digestif', 'nausée', 'abdomen'],
-            'dermatologue': ['peau', 'éruption', 'dermatologique', 'acné'],
-            'gynécologue': ['menstruel', 'gynécologique', 'femme', 'règles', 'utérus'],
-            'urologue': ['urinaire', 'rein', 'vessie', 'prostate'],
-            'pneumologue': ['respiration', 'poumon', 'toux', 'asthme'],
-            'rhumatologue': ['articulation', 'douleur', 'arthrite', 'os'],
-            'endocrinologue': ['diabète', 'thyroïde', 'hormonal', 'sucre'],
-            'psychiatre': ['anxiété', 'dépression', 'mental', 'stress'],
-            'orl': ['oreille', 'nez', 'gorge', 'sinusite'],
-            'ophtalmologue': ['yeux', 'vision', 'vue', 'œil'],
-            'médecin généraliste': ['général', 'consultation', 'fatigue']
-        }
+        self.highlighter = TermHighlighter()
+        # French and Darija keyword tables live in data/specialty_keywords.json
+        self.specialty_classifier = SpecialtyClassifier.from_file()
+        self.medical_specialists = self.specialty_classifier.tables['fr']
+        # Red flags and urgency words: those messages skip ahead in the queue
+        self.urgency_classifier = load_urgency_classifier()
+        self.context_budgeter = ContextBudgeter(
+            max_prompt_tokens=self.config.prompt_token_budget,
+            summary_tokens=self.config.summary_tokens,
+            window=self.config.history_window
+        )
+        self.keep_alive = parse_keep_alive(self.config.keep_alive)
+        self.response_cache = self.create_response_cache() if self.config.response_cache else None
+        # Stage timings, token counts and errors, scraped from /metrics
+        self.metrics = ChatMetrics()
+        self.batcher = self.create_batcher()
+    
+    def create_batcher(self):
+        """Micro-batcher of generations, or None when batching is off or the model client has no batch call"""
+        config = self.config
+        if config.batch_size <= 1:
+            return None
+        if not hasattr(self.client, "chat_batch"):
+            print(f"⚠️ CHATBOT_BATCH_SIZE={config.batch_size} ignored: the model client has no batch call")
+            return None
+        return MicroBatcher(
+            self.generate_batch,
+            max_batch_size=config.batch_size,
+            max_wait=config.batch_wait_ms / 1000
+        )
+    
+    def create_response_cache(self):
+        """Exact cache, plus the embedding tier when a semantic cache model is set"""
+        config = self.config
+        embed = None
+        if config.semantic_cache_model:
+            def embed(text):
+                return self.client.embed(model=config.semantic_cache_model, input=text)['embeddings'][0]
+        return ResponseCache(
+            max_entries=config.response_cache_size,
+            ttl=config.response_cache_ttl,
+            embed=embed,
+            similarity_threshold=config.semantic_cache_threshold
+        )
     
     def setup_database(self):
         """Initialize SQLite database for Colab"""
-        self.conn = sqlite3.connect('medical_chatbot.db', check_same_thread=False)
-        cursor = self.conn.cursor()
-        
-        # Create chat_history table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                conversation_id TEXT NOT NULL,
-                patient_id TEXT NOT NULL,
-                message TEXT NOT NULL,
-                sender TEXT CHECK(sender IN ('user', 'assistant')) NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create index for performance
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_conversation_patient 
-            ON chat_history(conversation_id, patient_id)
-        ''')
+        # One writer connection plus one reader per thread (WAL), so history
+        # reads on the event loop never wait behind saves from the workers
+        config = self.config
+        self.db = SQLiteConnectionPool(config.db_path, synchronous=config.sqlite_synchronous)
+        with self.db.write() as conn:
+            create_schema(conn)
         
-        self.conn.commit()
+        self.writer = ChatHistoryWriter(
+            self.db,
+            write_behind=config.write_behind,
+            flush_size=config.flush_size,
+            flush_interval=config.flush_interval
+        )
+        self.context_cache = ConversationCache(
+            window=config.history_window,
+            max_conversations=config.context_cache_size,
+            max_bytes=int(config.context_cache_mb * 1024 * 1024),
+            idle_ttl=config.context_cache_ttl
+        )
+        self.history_db_reads = 0
+        self.summaries = SummaryStore(self.db, cache_size=config.context_cache_size)
         print("✅ Database initialized")
     
-    def get_conversation_history(self, conversation_id, patient_id, limit=20):
-        """Retrieve conversation history"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT message, sender, timestamp FROM chat_history 
-            WHERE conversation_id = ? AND patient_id = ? 
-            ORDER BY timestamp ASC LIMIT ?
-        ''', (conversation_id, patient_id, limit))
+    def warm_up_model(self):
+        """Generate a single token so Ollama loads the phi3:mini weights now (on every backend)"""
+        messages = [{"role": "user", "content": "Bonjour"}]
+        if hasattr(self.client, "warm_up"):
+            self.client.warm_up(messages, options={"num_predict": 1}, keep_alive=self.keep_alive)
+            return
+        self.client.chat(model=MODEL_NAME, messages=messages, options={"num_predict": 1}, keep_alive=self.keep_alive)
+    
+    def get_conversation_history(self, conversation_id, patient_id, limit=None):
+        """Retrieve the most recent messages of a conversation, oldest first"""
+        limit = limit or self.config.history_window
+        
+        def load(count):
+            rows, _ = self.get_conversation_page(conversation_id, patient_id, page_size=count)
+            return [(message, sender, timestamp) for _, message, sender, timestamp in rows]
+        
+        return self.context_cache.get_or_load((conversation_id, patient_id), limit, load)
+    
+    def get_conversation_page(self, conversation_id, patient_id, page_size=20, cursor=None):
+        """One page of history going back in time: (rows, next_cursor)
+        
+        Rows are (id, message, sender, timestamp), oldest first. Pass
+        next_cursor back as cursor to get the page before; it is None once
+        the start of the conversation is reached.
+        """
+        # Messages still queued for write-behind must be visible to their own conversation
+        self.writer.flush_conversation(conversation_id, patient_id)
+        self.history_db_reads += 1
+        with self.db.read() as conn:
+            rows = fetch_messages_before(conn, conversation_id, patient_id, page_size + 1, cursor)
         
-        return cursor.fetchall()
+        has_more = len(rows) > page_size
+        if has_more:
+            rows = rows[1:]
+        next_cursor = rows[0][0] if has_more else None
+        return rows, next_cursor
     
     def save_message(self, conversation_id, patient_id, message, sender):
         """Save message to database"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO chat_history (conversation_id, patient_id, message, sender)
-            VALUES (?, ?, ?, ?)
-        ''', (conversation_id, patient_id, message, sender))
-        self.conn.commit()
+        self.save_messages(conversation_id, patient_id, [(message, sender)])
     
-    def detect_medical_specialty(self, message):
-        """Detect appropriate medical specialist"""
-        message_lower = message.lower()
-        
-        for specialist, keywords in self.medical_specialists.items():
-            for keyword in keywords:
-                if keyword in message_lower:
-                    return specialist, f"pour les problèmes de {keyword}"
+    def save_turn(self, conversation_id, patient_id, user_message, assistant_message):
+        """Save a user/assistant pair in a single transaction"""
+        self.save_messages(conversation_id, patient_id, [
+            (user_message, 'user'),
+            (assistant_message, 'assistant')
+        ])
+    
+    def save_messages(self, conversation_id, patient_id, messages):
+        """Persist messages, then append them to the cached history window"""
+        timestamp = self.writer.save_messages(conversation_id, patient_id, messages)
+        self.context_cache.append(
+            (conversation_id, patient_id),
+            [(message, sender, timestamp) for message, sender in messages]
+        )
+    
+    def detect_medical_specialty(self, message, language="fr"):
+        """Detect appropriate medical specialist, with the reason in the answer's language"""
+        reasons = SPECIALIST_REASONS[supported_language(language)]
+        matches = self.specialty_classifier.classify(message, top_k=1)
+        if matches:
+            best = matches[0]
+            return best.specialist, reasons["matched"].format(keyword=best.keywords[0])
         
-        return "médecin généraliste", "pour une consultation générale"
+        return self.specialty_classifier.default_specialist, reasons["default"]
+    
+    def is_urgent(self, message):
+        return bool(self.urgency_classifier.classify(message, top_k=1))
     
     def format_bold_text(self, text):
         """Add bold formatting to important medical terms"""
-        medical_terms = [
-            'urgent', 'important', 'consultation', 'médecin', 'docteur',
-            'symptômes', 'douleur', 'traitement', 'médicament', 'urgence',
-            'neurologue', 'cardiologue', 'gastro-entérologue', 'dermatologue',
-            'gynécologue', 'urologue', 'pneumologue', 'rhumatologue',
-            'endocrinologue', 'psychiatre', 'orl', 'ophtalmologue',
-            '24h', '48h', '72h', 'heures', 'jours', 'semaines'
-        ]
+        return self.highlighter.highlight(text)
+    
+    @contextmanager
+    def stage(self, name, language):
+        """Time one pipeline stage for /metrics and, on traced requests, as a span"""
+        with self.metrics.stage(name, language, MODEL_NAME), trace_span(name):
+            yield
+    
+    def build_context_messages(self, message, history, language="fr", summary=""):
+        """Build the chat messages sent to phi3:mini (system prompt, summary, history, new message)"""
+        # Same system message for every conversation of a language: Ollama
+        # reuses its prefill across patients. Then the parts that change the
+        # least: the summary (only changes when turns are folded), history
+        # oldest first, and the new message last.
+        templates = supported_language(language)
+        context_messages = [SYSTEM_MESSAGES[templates]]
+        
+        # Add the summary of turns that no longer fit in the prompt
+        if summary:
+            context_messages.append({"role": "system", "content": f"{SUMMARY_HEADERS[templates]}\n{summary}"})
+        
+        # Add conversation history
+        for msg, sender, timestamp in history:
+            role = "user" if sender == "user" else "assistant"
+            context_messages.append({"role": role, "content": msg})
         
-        for term in medical_terms:
-            # Case-insensitive replacement with bold formatting
-            pattern = re.compile(re.escape(term), re.IGNORECASE)
-            text = pattern.sub(f'**{term}**', text)
+        # Add current message
+        context_messages.append({"role": "user", "content": message})
         
-        return text
+        return context_messages
     
-    def generate_medical_response(self, message, conversation_id, patient_id, language="fr"):
-        """Generate medical response with context and recommendations"""
-        try:
-            # Get conversation history
+    def prepare_context(self, message, conversation_id, patient_id, language="fr"):
+        """Context messages fitted to the prompt token budget: (messages, estimated tokens)"""
+        with self.stage("history", language):
             history = self.get_conversation_history(conversation_id, patient_id)
+        
+        with self.stage("prompt", language):
+            summary = None
+            if self.context_budgeter.enabled:
+                stored = self.summaries.get(conversation_id, patient_id)
+                summary = ConversationSummary._make(stored) if stored else None
             
-            # Build conversation context
-            system_prompt = """Tu es un assistant médical IA spécialisé en français. Tes réponses doivent:
-            
-1. TOUJOURS inclure des disclaimers médicaux appropriés
-2. Recommander des spécialistes médicaux quand nécessaire
-3. Utiliser un formatage en gras pour les informations importantes
-4. Ne JAMAIS donner de diagnostic direct
-5. Être empathique et professionnel
-6. Répondre en français ou darija marocain selon la langue de l'utilisateur
-7. Te souvenir de l'historique de conversation pour éviter de répéter les mêmes questions
-
-Format de réponse souhaité:
-- Réponse empathique à la question
-- Conseils généraux appropriés
-- 👨‍⚕️ **Recommandation médicale**: [Spécialiste recommandé]
-- ⚠️ **Rappel**: Consultez toujours un **professionnel de santé**"""
-
-            if language == "ar":
-                system_prompt = """أنت مساعد طبي ذكي متخصص في اللغة العربية والدارجة المغربية. يجب أن تكون إجاباتك:
-
-1. تتضمن دائماً تنبيهات طبية مناسبة
-2. توصي بالأطباء المختصين عند الضرورة
-3. تستخدم التنسيق الغامق للمعلومات المهمة
-4. لا تعطي تشخيصاً مباشراً أبداً
-5. تكون متعاطفة ومهنية
-6. تجيب بالدارجة المغربية
-7. تتذكر تاريخ المحادثة لتجنب تكرار نفس الأسئلة
-
-تنسيق الإجابة المطلوب:
-- إجابة متعاطفة للسؤال
-- نصائح عامة مناسبة
-- 👨‍⚕️ **نصيحة طبية**: [الطبيب المختص الموصى به]
-- ⚠️ **تذكير**: شوف دائماً **طبيب مختص**"""
-            
-            context_messages = [{"role": "system", "content": system_prompt}]
-            
-            # Add conversation history
-            for msg, sender, timestamp in history:
-                role = "user" if sender == "user" else "assistant"
-                context_messages.append({"role": role, "content": msg})
-            
-            # Add current message
-            context_messages.append({"role": "user", "content": message})
-            
-            # Generate response using phi3:mini
-            response = self.client.chat(
-                model='phi3:mini',
-                messages=context_messages,
-                options={
-                    "temperature": 0.7,
-                    "top_p": 0.9,
-                    "max_tokens": 500
-                }
-            )
-            
-            ai_response = response['message']['content']
-            
-            # Detect and add specialist recommendation if not present
-            if "👨‍⚕️" not in ai_response:
-                specialist, reason = self.detect_medical_specialty(message)
-                if language == "ar":
-                    specialist_recommendation = f"\n\n👨‍⚕️ **نصيحة طبية**: نصحك تشوف **{specialist}** {reason}."
-                else:
-                    specialist_recommendation = f"\n\n👨‍⚕️ **Recommandation médicale**: Je vous conseille de consulter un **{specialist}** {reason}."
-                ai_response += specialist_recommendation
+            base_tokens = count_message_tokens(self.build_context_messages(message, [], language))
+            plan = self.context_budgeter.plan(base_tokens, history, summary, language)
+            if plan.folded:
+                self.summaries.save(
+                    conversation_id, patient_id, plan.summary,
+                    (summary.summarized_messages if summary else 0) + len(plan.folded),
+                    message_key(plan.folded[-1])
+                )
             
-            # Add medical disclaimer if not present
-            disclaimer_check = "professionnel de santé" if language == "fr" else "طبيب مختص"
-            if disclaimer_check not in ai_response.lower():
-                if language == "ar":
-                    ai_response += "\n\n⚠️ **تذكير**: هاد المحادثة غير للمعلومات فقط. **شوف طبيب مختص** لأي مشكل صحي."
-                else:
-                    ai_response += "\n\n⚠️ **Rappel**: Cette conversation est à titre informatif uniquement. **Consultez un professionnel de santé** pour tout problème médical."
+            context_messages = self.build_context_messages(message, plan.history, language, plan.summary)
+            return context_messages, count_message_tokens(context_messages)
+    
+    @staticmethod
+    def prefill_stats(response, estimated_tokens):
+        """(prompt tokens evaluated, prompt tokens cached, prefill ms) of one generation
+        
+        prompt_eval_count only counts the tokens the model had to evaluate.
+        The cached count is only reported when the backend measures it
+        (prompt_cache_count, from an OpenAI-compatible server's usage or
+        llama.cpp's timings); Ollama does not, so it is None there.
+        Without prompt_eval_count the whole estimate counts as evaluated.
+        """
+        evaluated = response.get('prompt_eval_count')
+        if evaluated is None:
+            evaluated = estimated_tokens
+        cached = response.get('prompt_cache_count')
+        duration = response.get('prompt_eval_duration')
+        return evaluated, cached, round(duration / 1e6, 1) if duration else None
+    
+    def record_generation(self, response, language, prompt_tokens, text, seconds, cached_tokens=None):
+        """Token counts and decode speed of one model call, labelled with the model that answered
+        
+        Uses Ollama's eval_count / eval_duration; without them the answer
+        length is estimated and the speed is taken over the whole call.
+        """
+        completion_tokens = response.get('eval_count') or estimate_tokens(text)
+        duration = response.get('eval_duration')
+        decode_seconds = duration / 1e9 if duration else seconds
+        self.metrics.record_generation(
+            language, response.get('model') or MODEL_NAME, prompt_tokens, completion_tokens, decode_seconds,
+            cached_tokens
+        )
+    
+    def generate(self, context_messages):
+        """One phi3:mini generation, micro-batched with concurrent requests when enabled"""
+        # The batcher only exists for clients with a real batch call, the only
+        # thing worth the wait: every request of a batch gets its answer when
+        # the slowest one is done
+        if self.batcher is not None:
+            return self.batcher.submit(context_messages)
+        return self.client.chat(
+            model=MODEL_NAME, messages=context_messages, options=GENERATION_OPTIONS, keep_alive=self.keep_alive
+        )
+    
+    def generate_batch(self, batch):
+        """Generate answers for several prompts in one ``chat_batch`` call (one result or exception each)"""
+        return self.client.chat_batch(
+            model=MODEL_NAME, messages=batch, options=GENERATION_OPTIONS, keep_alive=self.keep_alive
+        )
+    
+    def close(self):
+        """Stop the micro-batcher once queued generations are done"""
+        if self.batcher is not None:
+            self.batcher.close()
+    
+    def lookup_cached_answer(self, message, conversation_id, patient_id, language="fr"):
+        """Response cache lookup for first-turn questions (None when the cache does not apply)"""
+        if self.response_cache is None:
+            return None
+        with self.stage("cache_lookup", language):
+            # Follow-up questions depend on the history: always generate
+            if self.get_conversation_history(conversation_id, patient_id, limit=1):
+                self.response_cache.record_bypass()
+                return None
+            return self.response_cache.lookup(language, message)
+    
+    def finalize_response(self, ai_response, message, language="fr"):
+        """Append specialist recommendation and disclaimer, then apply bold formatting"""
+        templates = supported_language(language)
+        
+        # Detect and add specialist recommendation if not present
+        if "👨‍⚕️" not in ai_response:
+            specialist, reason = self.detect_medical_specialty(message, templates)
+            ai_response += RECOMMENDATION_TEMPLATES[templates].format(specialist=specialist, reason=reason)
+        
+        # Add medical disclaimer if not present
+        if DISCLAIMER_MARKERS[templates] not in ai_response.lower():
+            ai_response += DISCLAIMERS[templates]
+        
+        # Format bold text
+        return self.format_bold_text(ai_response)
+    
+    @traced("generate_medical_response")
+    def generate_medical_response(self, message, conversation_id, patient_id, language="fr"):
+        """Generate medical response with context and recommendations"""
+        # Client-supplied: never let an arbitrary string become a label value
+        language = supported_language(language)
+        metrics = self.metrics
+        started = time.perf_counter()
+        in_flight = metrics.in_flight.labels("chat")
+        in_flight.inc()
+        try:
+            cached = self.lookup_cached_answer(message, conversation_id, patient_id, language)
+            if cached and cached.hit:
+                raw_response = cached.answer
+                prompt_tokens, cached_tokens, prefill_ms = None, None, None
+            else:
+                # Get conversation history, trimmed to the prompt budget
+                context_messages, estimated_tokens = self.prepare_context(
+                    message, conversation_id, patient_id, language
+                )
+                
+                # Generate response using phi3:mini
+                generation_started = time.perf_counter()
+                with trace_span("inference", model=MODEL_NAME):
+                    response = self.generate(context_messages)
+                generation_seconds = time.perf_counter() - generation_started
+                metrics.stage_seconds.labels("inference", language, MODEL_NAME).observe(generation_seconds)
+                prompt_tokens, cached_tokens, prefill_ms = self.prefill_stats(response, estimated_tokens)
+                raw_response = response['message']['content']
+                self.record_generation(
+                    response, language, prompt_tokens, raw_response, generation_seconds, cached_tokens
+                )
+                if cached:
+                    self.response_cache.store(cached, raw_response, generation_seconds)
             
-            # Format bold text
-            ai_response = self.format_bold_text(ai_response)
+            # Cached answers get the recommendation/disclaimer for this exact question too
+            with self.stage("postprocess", language):
+                ai_response = self.finalize_response(raw_response, message, language)
             
             # Save messages to database
-            self.save_message(conversation_id, patient_id, message, 'user')
-            self.save_message(conversation_id, patient_id, ai_response, 'assistant')
+            with self.stage("persist", language):
+                self.save_turn(conversation_id, patient_id, message, ai_response)
             
+            outcome = "cached" if cached and cached.hit else "generated"
+            metrics.response_seconds.labels("chat", language, MODEL_NAME, outcome).observe(
+                time.perf_counter() - started
+            )
             return {
                 "response": ai_response,
                 "conversation_id": conversation_id,
                 "status": "success",
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached_tokens,
+                "prefill_ms": prefill_ms,
+                "cache": cached.tier if cached else None,
                 "timestamp": datetime.now().isoformat()
             }
             
         except Exception as e:
+            metrics.record_error(e, language, MODEL_NAME)
+            metrics.response_seconds.labels("chat", language, MODEL_NAME, "error").observe(
+                time.perf_counter() - started
+            )
             error_msg = f"Désolé, une erreur s'est produite: {str(e)}. Veuillez réessayer."
             return {
                 "response": error_msg,
@@ -219,6 +577,107 @@ Format de réponse souhaité:
                 "status": "error",
                 "timestamp": datetime.now().isoformat()
             }
+        finally:
+            in_flight.dec()
+    
+    @traced("stream_medical_response")
+    def stream_medical_response(self, message, conversation_id, patient_id, language="fr"):
+        """Yield response tokens as phi3:mini produces them, then a final 'done' event.
+        
+        Token events carry the raw model text. The specialist recommendation,
+        disclaimer and bold formatting need the complete answer, so the 'done'
+        event carries the final formatted response (clients replace the streamed
+        text with it) and the messages are only saved at that point.
+        """
+        language = supported_language(language)
+        metrics = self.metrics
+        started = time.perf_counter()
+        first_token_at = None
+        in_flight = metrics.in_flight.labels("stream")
+        in_flight.inc()
+        try:
+            cached = self.lookup_cached_answer(message, conversation_id, patient_id, language)
+            if cached and cached.hit:
+                first_token_at = time.perf_counter()
+                yield {"type": "token", "content": cached.answer}
+                raw_response = cached.answer
+                prompt_tokens, cached_tokens, prefill_ms = None, None, None
+            else:
+                context_messages, estimated_tokens = self.prepare_context(
+                    message, conversation_id, patient_id, language
+                )
+                
+                generation_started = time.perf_counter()
+                parts = []
+                last_chunk = {}
+                with trace_span("inference", model=MODEL_NAME):
+                    for chunk in self.client.chat(
+                        model=MODEL_NAME,
+                        messages=context_messages,
+                        options=GENERATION_OPTIONS,
+                        keep_alive=self.keep_alive,
+                        stream=True
+                    ):
+                        last_chunk = chunk
+                        token = chunk['message']['content']
+                        if not token:
+                            continue
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        parts.append(token)
+                        yield {"type": "token", "content": token}
+                
+                generation_seconds = time.perf_counter() - generation_started
+                metrics.stage_seconds.labels("inference", language, MODEL_NAME).observe(generation_seconds)
+                raw_response = "".join(parts)
+                # Ollama reports prompt_eval_* and eval_* on the final chunk
+                prompt_tokens, cached_tokens, prefill_ms = self.prefill_stats(last_chunk, estimated_tokens)
+                self.record_generation(
+                    last_chunk, language, prompt_tokens, raw_response, generation_seconds, cached_tokens
+                )
+                if cached:
+                    self.response_cache.store(cached, raw_response, generation_seconds)
+            
+            with self.stage("postprocess", language):
+                ai_response = self.finalize_response(raw_response, message, language)
+            
+            # Save messages to database once the stream is complete
+            with self.stage("persist", language):
+                self.save_turn(conversation_id, patient_id, message, ai_response)
+            
+            finished = time.perf_counter()
+            if first_token_at is not None:
+                metrics.time_to_first_token.labels(language, MODEL_NAME).observe(first_token_at - started)
+            outcome = "cached" if cached and cached.hit else "generated"
+            metrics.response_seconds.labels("stream", language, MODEL_NAME, outcome).observe(finished - started)
+            yield {
+                "type": "done",
+                "response": ai_response,
+                "conversation_id": conversation_id,
+                "status": "success",
+                "time_to_first_token_ms": round(((first_token_at or finished) - started) * 1000, 1),
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached_tokens,
+                "prefill_ms": prefill_ms,
+                "cache": cached.tier if cached else None,
+                "total_time_ms": round((finished - started) * 1000, 1),
+                "timestamp": datetime.now().isoformat()
+            }
+            
+        except Exception as e:
+            metrics.record_error(e, language, MODEL_NAME)
+            metrics.response_seconds.labels("stream", language, MODEL_NAME, "error").observe(
+                time.perf_counter() - started
+            )
+            yield {
+                "type": "error",
+                "response": f"Désolé, une erreur s'est produite: {str(e)}. Veuillez réessayer.",
+                "conversation_id": conversation_id,
+                "status": "error",
+                "timestamp": datetime.now().isoformat()
+            }
+        finally:
+            in_flight.dec()
 
 # ============================================================================
 # FASTAPI MODELS (Required for your Windows backend integration)
@@ -227,7 +686,7 @@ Format de réponse souhaité:
 class ChatRequest(BaseModel):
     message: str
     conversation_id: Optional[str] = None
-    patient_id: Optional[str] = "default_patient"
+    patient_id: Optional[str] = ANONYMOUS_PATIENT_ID
     language: Optional[str] = "fr"
 
 class ChatResponse(BaseModel):
@@ -236,6 +695,10 @@ class ChatResponse(BaseModel):
     patient_id: str
     status: str
     timestamp: str
+    prompt_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    prefill_ms: Optional[float] = None
+    cache: Optional[str] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -252,27 +715,320 @@ class ConversationHistory(BaseModel):
 # FASTAPI APPLICATION (This is what your Windows app will connect to)
 # ============================================================================
 
-# Initialize the medical chatbot
-medical_bot = MedicalChatbotColab()
-print("✅ Medical Chatbot initialized")
-
-# Create FastAPI app
-app = FastAPI(
-    title="Medical Chatbot API - Google Colab",
-    description="AI Medical Assistant API powered by phi3:mini on Google Colab",
-    version="1.0.0"
-)
-
-# Add CORS middleware for Windows app integration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Configure this for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/", response_model=HealthResponse)
+class ChatbotServices:
+    """The chatbot (SQLite + Ollama client) and inference pool behind one app
+    
+    Nothing is created until first use, so importing this module or calling
+    create_app() stays instant; serving the app creates both at startup and
+    then warms the model up in the background. ``warmed_up`` is set when
+    that is over, ``ready`` tells whether it worked.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._bot = None
+        self._executor = None
+        self._health = None
+        exporter = JsonlExporter(config.trace_file) if config.trace_file else None
+        self.tracer = Tracer("medical-chatbot", exporter, config.trace_sample_rate)
+        self.warmed_up = threading.Event()
+        self.warmup_error = None
+        # Duration of each startup phase, in milliseconds
+        self.startup_timings = {}
+    
+    @property
+    def bot(self):
+        if self._bot is None:
+            with self._lock:
+                if self._bot is None:
+                    self._bot = MedicalChatbotColab(self.config)
+                    self._bot.metrics.registry.add_collector(self.collect_metrics)
+                    print("✅ Medical Chatbot initialized")
+        return self._bot
+    
+    @property
+    def executor(self):
+        # Generations run on this pool so the event loop keeps serving health
+        # checks and history reads while phi3:mini is busy
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # A worker waits in the micro-batcher while its batch fills:
+                    # a full batch needs at least batch_size of them
+                    max_concurrency = self.config.max_concurrency
+                    if self.bot.batcher is not None:
+                        max_concurrency = max(max_concurrency, self.config.batch_size)
+                    self._executor = InferenceExecutor(
+                        max_concurrency=max_concurrency,
+                        queue_depth=self.config.queue_depth,
+                        max_per_patient=self.config.max_per_patient
+                    )
+        return self._executor
+    
+    @property
+    def health(self):
+        if self._health is None:
+            with self._lock:
+                if self._health is None:
+                    self._health = HealthMonitor(
+                        self.bot.client, self.bot.db, model=MODEL_NAME, interval=self.config.health_interval
+                    )
+        return self._health
+    
+    @property
+    def ready(self):
+        return self.warmed_up.is_set() and self.warmup_error is None
+    
+    def ticket(self, request, http_request, default_timeout=0):
+        """Admission ticket of a chat request: patient, urgency and client deadline"""
+        timeout = default_timeout
+        header = http_request.headers.get(REQUEST_TIMEOUT_HEADER)
+        if header:
+            try:
+                timeout = float(header)
+            except ValueError:
+                pass
+        patient_id = request.patient_id
+        if patient_id is None or patient_id == ANONYMOUS_PATIENT_ID:
+            # A new conversation (no id yet) gets a bucket of its own (None)
+            patient_id = f"conversation:{request.conversation_id}" if request.conversation_id else None
+        return Ticket(
+            patient_id=patient_id,
+            urgent=self.bot.is_urgent(request.message),
+            deadline=time.monotonic() + timeout if timeout > 0 else None
+        )
+    
+    def not_ready_reasons(self):
+        """Why a load balancer should not send patients here yet (empty when ready)"""
+        reasons = []
+        if not self.warmed_up.is_set():
+            reasons.append("model warm-up in progress")
+        
+        health = self.health.snapshot()
+        if health["ollama"] is None:
+            reasons.append("health not checked yet")
+        else:
+            if health["stale"]:
+                reasons.append(f"last health check is {health['age_s']}s old")
+            if not health["ollama"]["reachable"]:
+                reasons.append("ollama unreachable")
+            elif not health["ollama"]["model_available"]:
+                reasons.append("phi3:mini not installed")
+            if not health["database"]["reachable"]:
+                reasons.append("database unreachable")
+        
+        inference = self.executor.stats()
+        if inference["in_flight"] >= inference["max_concurrency"] + inference["queue_depth"]:
+            reasons.append("inference queue full")
+        return reasons
+    
+    def collect_metrics(self):
+        """Pool, cache and health numbers, read when /metrics is scraped"""
+        bot = self.bot
+        inference = self.executor.stats()
+        families = [
+            ("chatbot_inference_workers", "gauge", "Generations allowed to run at once",
+             [({}, inference["max_concurrency"])]),
+            ("chatbot_inference_running", "gauge", "Generations running", [({}, inference["running"])]),
+            ("chatbot_inference_queued", "gauge", "Requests waiting for a worker", [({}, inference["queued"])]),
+            ("chatbot_inference_completed_total", "counter", "Finished inference tasks",
+             [({}, inference["completed"])]),
+            ("chatbot_inference_queued_urgent", "gauge", "Urgent requests waiting for a worker",
+             [({}, inference["queued_urgent"])]),
+            ("chatbot_inference_rejected_total", "counter", "Requests answered 429, by reason",
+             [({"reason": reason}, count) for reason, count in sorted(inference["rejected_by_reason"].items())]),
+            ("chatbot_inference_expired_total", "counter", "Queued requests dropped at their client's deadline",
+             [({}, inference["expired"])]),
+            ("chatbot_history_db_reads_total", "counter", "History reads that went to SQLite",
+             [({}, bot.history_db_reads)])
+        ]
+        
+        if bot.batcher is not None:
+            batching = bot.batcher.stats()
+            families += [
+                ("chatbot_batches_total", "counter", "Micro-batches sent to the model",
+                 [({}, batching["batches"])]),
+                ("chatbot_batched_requests_total", "counter", "Generations sent in micro-batches",
+                 [({}, batching["batched_requests"])]),
+                ("chatbot_batch_queued", "gauge", "Generations waiting for the next micro-batch",
+                 [({}, batching["queued"])])
+            ]
+        
+        if isinstance(bot.client, ModelRouter):
+            routing = bot.client.stats()
+            backends = routing["backends"]
+            families += [
+                ("chatbot_backend_up", "gauge", "Model backend taking requests (not cooling down after failures)",
+                 [({"backend": b["name"]}, int(b["healthy"])) for b in backends]),
+                ("chatbot_backend_in_flight", "gauge", "Requests outstanding on each model backend",
+                 [({"backend": b["name"]}, b["in_flight"]) for b in backends]),
+                ("chatbot_backend_requests_total", "counter", "Calls sent to each model backend",
+                 [({"backend": b["name"]}, b["requests"]) for b in backends]),
+                ("chatbot_backend_failures_total", "counter", "Failed calls of each model backend",
+                 [({"backend": b["name"]}, b["failures"]) for b in backends]),
+                ("chatbot_backend_latency_seconds", "gauge", "Moving average call duration of each model backend",
+                 [({"backend": b["name"]}, round(b["latency_ms"] / 1000, 4))
+                  for b in backends if b["latency_ms"] is not None]),
+                ("chatbot_routed_requests_total", "counter", "Chat requests by model after the routing rules",
+                 [({"model": model}, count) for model, count in sorted(routing["routed"].items())])
+            ]
+        
+        context = bot.context_cache.stats()
+        families += [
+            ("chatbot_context_cache_lookups_total", "counter", "History window cache lookups",
+             [({"result": "hit"}, context["hits"]), ({"result": "miss"}, context["misses"])]),
+            ("chatbot_context_cache_hit_ratio", "gauge", "History window cache hit rate",
+             [({}, context["hit_rate"])]),
+            ("chatbot_context_cache_conversations", "gauge", "Conversations cached",
+             [({}, context["conversations"])])
+        ]
+        
+        if bot.response_cache is not None:
+            cache = bot.response_cache.stats()
+            families += [
+                ("chatbot_response_cache_lookups_total", "counter", "Response cache lookups", [
+                    ({"result": "exact_hit"}, cache["exact_hits"]),
+                    ({"result": "semantic_hit"}, cache["semantic_hits"]),
+                    ({"result": "miss"}, cache["misses"]),
+                    ({"result": "bypass"}, cache["bypassed"])
+                ]),
+                ("chatbot_response_cache_hit_ratio", "gauge", "Response cache hit rate",
+                 [({}, cache["hit_rate"])]),
+                ("chatbot_response_cache_entries", "gauge", "Answers cached", [({}, cache["entries"])])
+            ]
+        
+        health = self.health.snapshot()
+        if health["ollama"] is not None:
+            families += [
+                ("chatbot_ollama_up", "gauge", "Ollama answered the last health check",
+                 [({"model": MODEL_NAME}, int(health["ollama"]["reachable"]))]),
+                ("chatbot_model_loaded", "gauge", "Model in Ollama memory at the last health check",
+                 [({"model": MODEL_NAME}, int(health["ollama"]["model_loaded"]))]),
+                ("chatbot_database_up", "gauge", "SQLite answered the last health check",
+                 [({}, int(health["database"]["reachable"]))]),
+                ("chatbot_health_check_age_seconds", "gauge", "Age of the cached health check",
+                 [({}, health["age_s"])])
+            ]
+        return families
+    
+    def _timed(self, phase, fn):
+        started = time.perf_counter()
+        result = fn()
+        self.startup_timings[f"{phase}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+    
+    def _open_reader(self):
+        with self.bot.db.read() as conn:
+            conn.execute("SELECT 1")
+    
+    def _start_chatbot(self):
+        # Reader connection of the calling (event loop) thread, used by history requests
+        self._open_reader()
+        return self.bot
+    
+    def _start_inference_pool(self):
+        # Workers read history before generating: give each its reader now
+        self.executor.run_on_each_worker(self._open_reader)
+        return self.executor
+    
+    def start(self):
+        """Create everything now instead of on the first request"""
+        return self._timed("chatbot", self._start_chatbot), self._timed("inference_pool", self._start_inference_pool)
+    
+    def warm_up(self):
+        """Load the model; sets ``warmed_up`` even when Ollama is not reachable"""
+        try:
+            if self.config.model_warmup:
+                self._timed("model_warmup", self.bot.warm_up_model)
+        except Exception as e:
+            self.warmup_error = str(e)
+            print(f"⚠️ Model warm-up failed: {e}")
+        finally:
+            self.warmed_up.set()
+    
+    async def drain(self, timeout):
+        """Refuse new generations and wait up to ``timeout`` s for the admitted ones
+        
+        Returns how many were still in flight (0 when fully drained).
+        """
+        if self._executor is None:
+            return 0
+        left = await self._executor.drain(timeout)
+        if left:
+            print(f"⚠️ {left} generations still running after {timeout:g}s of draining")
+        return left
+    
+    def close(self):
+        """Let running generations finish, then persist queued chat messages"""
+        if self._health is not None:
+            self._health.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._bot is not None:
+            pending = self._bot.writer.pending_count()
+            self._bot.close()
+            self._bot.writer.close()
+            self._bot.db.close()
+            if pending:
+                print(f"💾 Saved {pending} queued chat messages")
+        if self.tracer.exporter is not None:
+            self.tracer.exporter.close()
+
+def get_services(request: Request) -> ChatbotServices:
+    return request.app.state.services
+
+router = APIRouter()
+
+def create_app(config=None):
+    """Build the FastAPI app; the chatbot itself is created when it starts serving"""
+    services = ChatbotServices(config or ChatbotConfig())
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        services.start()
+        services.health.start()
+        # The model loads in the background so the API answers meanwhile
+        threading.Thread(target=services.warm_up, name="model-warmup", daemon=True).start()
+        yield
+        # uvicorn has stopped accepting connections: answer what was admitted
+        await services.drain(services.config.drain_timeout)
+        services.close()
+    
+    app = FastAPI(
+        title="Medical Chatbot API - Google Colab",
+        description="AI Medical Assistant API powered by phi3:mini on Google Colab",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+    app.state.services = services
+    
+    # Add CORS middleware for Windows app integration
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Configure this for production
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Outermost, so the request span covers the whole handler
+    app.add_middleware(TracingMiddleware, tracer=services.tracer, profile_dir=services.config.profile_dir)
+    app.include_router(router)
+    return app
+
+def create_worker_app():
+    """App factory of one worker process (``uvicorn --workers``, gunicorn)
+    
+    Reads the configuration the parent put in CHATBOT_WORKER_CONFIG, or the
+    CHATBOT_* variables, e.g.
+    ``gunicorn -w 4 -k uvicorn.workers.UvicornWorker 'colab_medical_chatbot_fixed:create_worker_app()'``
+    (with CHATBOT_WORKERS=4 so the per-process caches are turned off).
+    """
+    serialized = os.getenv(WORKER_CONFIG_ENV)
+    config = ChatbotConfig(**json.loads(serialized)) if serialized else ChatbotConfig()
+    return create_app(worker_config(config))
+
+@router.get("/", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint - Your Windows app will use this to test connection"""
     return HealthResponse(
@@ -282,19 +1038,44 @@ async def health_check():
         timestamp=datetime.now().isoformat()
     )
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
-    """Main chat endpoint - Your Windows app will send messages here"""
+@router.get("/healthz")
+async def liveness():
+    """Liveness probe: the process and its event loop answer (restart me if not)"""
+    return {"status": "alive"}
+
+@router.get("/readyz")
+async def readiness(services: ChatbotServices = Depends(get_services)):
+    """Readiness probe: 503 while patients should be sent to another instance"""
+    reasons = services.not_ready_reasons()
+    if reasons:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "reasons": reasons})
+    return {"status": "ready"}
+
+def overloaded(error):
+    """429 telling the client when to try again"""
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest,
+                        http_request: Request,
+                        services: ChatbotServices = Depends(get_services)):
+    """Main chat endpoint - Your Windows app will send messages here
+    
+    Answers 429 with Retry-After when the server is saturated, and 504 when
+    the request waited past its client's timeout (X-Request-Timeout header).
+    """
     try:
         # Generate conversation ID if not provided
         conversation_id = request.conversation_id or str(uuid.uuid4())
         
-        # Generate response
-        result = medical_bot.generate_medical_response(
+        # Generate response on the inference pool (never on the event loop)
+        result = await services.executor.submit(
+            services.bot.generate_medical_response,
             request.message,
             conversation_id,
             request.patient_id,
-            request.language
+            request.language,
+            ticket=services.ticket(request, http_request, services.config.request_timeout)
         )
         
         if result["status"] == "success":
@@ -303,35 +1084,119 @@ async def chat_endpoint(request: ChatRequest):
                 conversation_id=conversation_id,
                 patient_id=request.patient_id,
                 status="success",
-                timestamp=result["timestamp"]
+                timestamp=result["timestamp"],
+                prompt_tokens=result["prompt_tokens"],
+                cached_tokens=result["cached_tokens"],
+                prefill_ms=result["prefill_ms"],
+                cache=result["cache"]
             )
         else:
             raise HTTPException(status_code=500, detail=result["response"])
             
+    except QueueFullError as e:
+        raise overloaded(e)
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/conversations/{conversation_id}")
-async def get_conversation_history(conversation_id: str, patient_id: str = "default_patient"):
-    """Get conversation history - Your Windows app can retrieve chat history"""
+def format_stream_event(event, use_sse):
+    """Encode one stream event as an SSE frame or a JSON line"""
+    payload = json.dumps(event, ensure_ascii=False)
+    if use_sse:
+        return f"event: {event['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest,
+                               http_request: Request,
+                               services: ChatbotServices = Depends(get_services)):
+    """Streaming chat endpoint - tokens are sent as soon as phi3:mini produces them
+    
+    Responds with JSON lines by default, or Server-Sent Events when the client
+    sends 'Accept: text/event-stream'. Events: 'start', 'token'..., then 'done'
+    (final formatted response) or 'error'.
+    """
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    use_sse = "text/event-stream" in http_request.headers.get("accept", "")
+    
     try:
-        history = medical_bot.get_conversation_history(conversation_id, patient_id)
+        # Only a client-sent X-Request-Timeout sets a deadline: stream
+        # clients time out between chunks, not on the whole answer
+        events = services.executor.stream(
+            services.bot.stream_medical_response,
+            request.message,
+            conversation_id,
+            request.patient_id,
+            request.language,
+            ticket=services.ticket(request, http_request)
+        )
+    except QueueFullError as e:
+        raise overloaded(e)
+    
+    async def event_stream():
+        yield format_stream_event({
+            "type": "start",
+            "conversation_id": conversation_id,
+            "patient_id": request.patient_id
+        }, use_sse)
+        try:
+            async for event in events:
+                yield format_stream_event(event, use_sse)
+        except (QueueFullError, DeadlineExceededError) as e:
+            # Evicted by an urgent request or past the deadline before it started
+            yield format_stream_event({
+                "type": "error",
+                "response": f"Désolé, le service est surchargé: {str(e)}. Veuillez réessayer.",
+                "conversation_id": conversation_id,
+                "status": "error",
+                "timestamp": datetime.now().isoformat()
+            }, use_sse)
+        finally:
+            # Stops the worker early if the client disconnected mid-answer
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/conversations/{conversation_id}")
+async def get_conversation_history(conversation_id: str,
+                                   patient_id: str = ANONYMOUS_PATIENT_ID,
+                                   page_size: int = Query(20, ge=1, le=100),
+                                   cursor: Optional[int] = None,
+                                   services: ChatbotServices = Depends(get_services)):
+    """Get conversation history - Your Windows app can retrieve chat history
+    
+    Returns the most recent messages first page; send next_cursor back as
+    'cursor' to load older messages.
+    """
+    try:
+        rows, next_cursor = services.bot.get_conversation_page(
+            conversation_id, patient_id, page_size, cursor
+        )
         return {
             "conversation_id": conversation_id,
             "patient_id": patient_id,
             "history": [
                 {
+                    "id": message_id,
                     "message": msg,
                     "sender": sender,
                     "timestamp": timestamp
                 }
-                for msg, sender, timestamp in history
-            ]
+                for message_id, msg, sender, timestamp in rows
+            ],
+            "next_cursor": next_cursor
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/reset-conversation")
+@router.post("/reset-conversation")
 async def reset_conversation():
     """Create new conversation ID"""
     new_conversation_id = str(uuid.uuid4())
@@ -342,26 +1207,51 @@ async def reset_conversation():
         "timestamp": datetime.now().isoformat()
     }
 
-@app.get("/status")
-async def get_detailed_status():
-    """Detailed status endpoint for monitoring"""
-    try:
-        # Test ollama connection
-        test_response = medical_bot.client.chat(
-            model='phi3:mini',
-            messages=[{"role": "user", "content": "test"}],
-            options={"max_tokens": 10}
-        )
-        ollama_status = "connected"
-    except:
-        ollama_status = "disconnected"
+@router.get("/metrics")
+async def metrics_endpoint(services: ChatbotServices = Depends(get_services)):
+    """Prometheus scrape endpoint: pipeline stage histograms, tokens, errors, caches"""
+    return PlainTextResponse(
+        services.bot.metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@router.get("/status")
+async def get_detailed_status(services: ChatbotServices = Depends(get_services)):
+    """Detailed status endpoint for monitoring
+    
+    Served from the health monitor's cached checks: polling it never runs a
+    generation or waits on Ollama.
+    """
+    medical_bot = services.bot
+    health = services.health.snapshot()
+    if health["ollama"] is None or health["stale"]:
+        ollama_status = "unknown"
+    else:
+        ollama_status = "connected" if health["ollama"]["reachable"] else "disconnected"
+    reasons = services.not_ready_reasons()
     
     return {
         "api_status": "healthy",
+        "worker_pid": os.getpid(),
         "model": "phi3:mini",
         "ollama_status": ollama_status,
         "server": "Google Colab",
         "database": "SQLite",
+        "health": health,
+        "readiness": {"ready": not reasons, "reasons": reasons},
+        "inference": services.executor.stats(),
+        "batching": medical_bot.batcher.stats() if medical_bot.batcher else None,
+        "backends": medical_bot.client.stats() if isinstance(medical_bot.client, ModelRouter) else None,
+        "context_cache": {
+            **medical_bot.context_cache.stats(),
+            "history_db_reads": medical_bot.history_db_reads
+        },
+        "response_cache": medical_bot.response_cache.stats() if medical_bot.response_cache else None,
+        "startup": {
+            "ready": services.ready,
+            "warmup_error": services.warmup_error,
+            **services.startup_timings
+        },
         "timestamp": datetime.now().isoformat()
     }
 
@@ -369,40 +1259,39 @@ async def get_detailed_status():
 # SERVER STARTUP (This creates your API URL)
 # ============================================================================
 
-def start_api_server():
-    """Start the FastAPI server and create public URL"""
-    
-    print("🚀 Starting Medical Chatbot API Server...")
-    
-    # Start FastAPI server in background
-    def run_fastapi_server():
-        uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
-
-    # Start server in background thread
-    server_thread = threading.Thread(target=run_fastapi_server, daemon=True)
+def run_in_background(app, host="0.0.0.0", port=8000, log_level="info", drain_timeout=DRAIN_TIMEOUT):
+    """Serve ``app`` with uvicorn on a daemon thread; returns (server, thread)"""
+    server = uvicorn.Server(uvicorn.Config(
+        app, host=host, port=port, log_level=log_level, timeout_graceful_shutdown=drain_timeout
+    ))
+    server_thread = threading.Thread(target=server.run, daemon=True)
     server_thread.start()
+    return server, server_thread
 
-    # Wait for server to start
-    print("⏳ Waiting for server to start...")
-    time.sleep(8)
-
-    # Create public URL with ngrok
+def open_public_url(port=8000, ngrok_token=None):
+    """Expose the local port with ngrok; returns the public URL or None"""
     try:
+        # Imported here: only the public tunnel needs pyngrok
+        from pyngrok import ngrok
+        
         print("🌐 Creating public URL with ngrok...")
         
-        # Optional: Set ngrok auth token for better stability
-        # ngrok.set_auth_token("your_ngrok_token_here")
+        # Get your authtoken from: https://dashboard.ngrok.com/get-started/your-authtoken
+        ngrok_token = ngrok_token or os.getenv("NGROK_AUTHTOKEN")
+        if ngrok_token:
+            ngrok.set_auth_token(ngrok_token)
         
-        public_url = ngrok.connect(8000)
+        public_url = ngrok.connect(port)
         
         print(f"""
         ✅ SUCCESS! Your Medical Chatbot API is now running!
         
-        📍 Local URL: http://localhost:8000
+        📍 Local URL: http://localhost:{port}
         🌐 Public URL: {public_url}
         📖 API Documentation: {public_url}/docs
         🔍 Health Check: {public_url}/
         💬 Chat Endpoint: {public_url}/chat
+        ⚡ Streaming Chat: {public_url}/chat/stream
         
         ⚠️ IMPORTANT: Copy this URL to your Windows .env file:
         COLAB_API_URL={public_url}
@@ -424,18 +1313,145 @@ def start_api_server():
         
     except Exception as e:
         print(f"❌ Error creating public URL: {e}")
-        print("💡 You can still use the local URL: http://localhost:8000")
-        print("💡 Make sure you have internet connection for ngrok")
+        print(f"💡 You can still use the local URL: http://localhost:{port}")
+        print("💡 Make sure you have internet connection and NGROK_AUTHTOKEN is set")
         return None
 
+def wait_until_ready(url, deadline):
+    """Poll ``url`` until it answers 200; False if ``deadline`` passes first"""
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.05)
+    return False
+
+def launch(config=None, host="0.0.0.0", port=8000, tunnel=True, ngrok_token=None, log_level="info",
+           startup_timeout=120.0, app=None):
+    """Start the API in the background and wait until it is ready
+    
+    Phases: uvicorn started (socket bound, lifespan done: database and
+    inference workers open), local probe of GET /, phi3:mini warmed up,
+    then the ngrok tunnel. Their durations are printed and kept in
+    ``app.state.services.startup_timings`` (shown by /status).
+    
+    Returns (server, thread, public_url).
+    """
+    print("🚀 Starting Medical Chatbot API Server...")
+    launch_started = time.perf_counter()
+    deadline = time.monotonic() + startup_timeout
+    app = app or create_app(config)
+    services = app.state.services
+    timings = services.startup_timings
+    
+    def mark(phase, since):
+        timings[f"{phase}_ms"] = round((time.perf_counter() - since) * 1000, 1)
+        return time.perf_counter()
+    
+    phase_started = time.perf_counter()
+    server, server_thread = run_in_background(app, host, port, log_level, services.config.drain_timeout)
+    
+    print("⏳ Waiting for server to start...")
+    while not server.started and server_thread.is_alive() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    if not server.started:
+        server.should_exit = True
+        raise RuntimeError(f"API server did not start within {startup_timeout}s (port {port} in use?)")
+    phase_started = mark("server_start", phase_started)
+    
+    probe_host = "127.0.0.1" if host in ("0.0.0.0", "::", "") else host
+    if not wait_until_ready(f"http://{probe_host}:{port}/", deadline):
+        server.should_exit = True
+        raise RuntimeError(f"API server did not answer on port {port} within {startup_timeout}s")
+    phase_started = mark("local_probe", phase_started)
+    
+    print("🔥 Warming up phi3:mini...")
+    services.warmed_up.wait(max(0.0, deadline - time.monotonic()))
+    phase_started = mark("model_ready", phase_started)
+    if services.ready:
+        print("✅ Model loaded, API ready")
+    else:
+        print(f"⚠️ API up, model not ready: {services.warmup_error or 'warm-up still running'}")
+    
+    public_url = open_public_url(port, ngrok_token) if tunnel else None
+    if tunnel:
+        mark("tunnel", phase_started)
+    mark("total", launch_started)
+    print(f"⏱️ Startup phases: {json.dumps(timings)}")
+    return server, server_thread, public_url
+
+def serve_workers(config, host="0.0.0.0", port=8000, tunnel=True, ngrok_token=None, log_level="info"):
+    """Serve with ``config.workers`` uvicorn worker processes until interrupted
+    
+    Blocks in the supervisor process. Each worker imports this module and
+    builds its own app with create_worker_app(); Ctrl+C or SIGTERM makes
+    every worker drain and flush before exiting.
+    """
+    os.environ[WORKER_CONFIG_ENV] = json.dumps(dataclasses.asdict(config))
+    if tunnel:
+        # ngrok only forwards to the port: it can open before the workers listen
+        open_public_url(port, ngrok_token)
+    print(f"🚀 Starting Medical Chatbot API with {config.workers} workers on port {port}...")
+    uvicorn.run(
+        f"{os.path.splitext(os.path.basename(__file__))[0]}:create_worker_app",
+        factory=True,
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=host,
+        port=port,
+        workers=config.workers,
+        log_level=log_level,
+        timeout_graceful_shutdown=config.drain_timeout
+    )
+
+def start_api_server(config=None, port=8000, ngrok_token=None):
+    """Start the FastAPI server and create public URL (returns once it is ready, for notebooks)"""
+    _, _, public_url = launch(config, port=port, ngrok_token=ngrok_token)
+    return public_url
+
 # ============================================================================
 # START THE API SERVER
 # ============================================================================
 
-if __name__ == "__main__":
-    api_url = start_api_server()
+def main(argv=None):
+    """Command line entry point: serve until interrupted"""
+    parser = argparse.ArgumentParser(description="Medical Chatbot API (phi3:mini)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--db-path", default=DB_PATH, help="SQLite history file (CHATBOT_DB_PATH)")
+    parser.add_argument("--backends", default=MODEL_BACKENDS,
+                        help="Ollama URLs (comma-separated) or a backends JSON file (CHATBOT_BACKENDS)")
+    parser.add_argument("--no-tunnel", action="store_true", help="serve locally, without an ngrok public URL")
+    parser.add_argument("--ngrok-token", default=None, help="ngrok authtoken (default: NGROK_AUTHTOKEN)")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--workers", type=int, default=API_WORKERS,
+                        help="API worker processes (CHATBOT_WORKERS)")
+    parser.add_argument("--startup-timeout", type=float, default=120.0,
+                        help="seconds to wait for the server and the model warm-up")
+    parser.add_argument("--trace-file", default=TRACE_FILE, help="append request spans here (CHATBOT_TRACE_FILE)")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR,
+                        help="allow X-Chatbot-Profile requests, writing profiles here (CHATBOT_PROFILE_DIR)")
+    args = parser.parse_args(argv)
     
-    if api_url:
+    config = ChatbotConfig(
+        db_path=args.db_path, backends=args.backends, trace_file=args.trace_file, profile_dir=args.profile_dir,
+        workers=args.workers
+    )
+    if config.workers > 1:
+        serve_workers(config, args.host, args.port, tunnel=not args.no_tunnel, ngrok_token=args.ngrok_token,
+                      log_level=args.log_level)
+        return
+    
+    server, server_thread, api_url = launch(
+        config, args.host, args.port, tunnel=not args.no_tunnel, ngrok_token=args.ngrok_token,
+        log_level=args.log_level, startup_timeout=args.startup_timeout
+    )
+    
+    if args.no_tunnel:
+        print(f"📍 Serving locally at http://localhost:{args.port}")
+    elif api_url:
         print(f"""
         🎉 Setup Complete! 
         
@@ -449,10 +1465,25 @@ if __name__ == "__main__":
         ⚠️ Keep this Colab notebook running for the API to work!
         """)
     else:
-        print("""
+        print(f"""
         ⚠️ Public URL creation failed, but local server is running.
-        You can still test locally at: http://localhost:8000
+        You can still test locally at: http://localhost:{args.port}
         """)
+    
+    # Ctrl+C and SIGTERM (docker stop, systemd) stop the server the way
+    # uvicorn's own handlers do: drain, then flush. A second Ctrl+C skips the
+    # drain. Flags rather than KeyboardInterrupt, which can cut join() short.
+    def stop_server(signum, frame):
+        if server.should_exit and signum == signal.SIGINT:
+            server.force_exit = True
+        else:
+            print("🛑 Stopping server...")
+            server.should_exit = True
+
+    signal.signal(signal.SIGINT, stop_server)
+    signal.signal(signal.SIGTERM, stop_server)
+    while server_thread.is_alive():
+        server_thread.join(1)
 
-# Start the server automatically
-start_api_server() 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
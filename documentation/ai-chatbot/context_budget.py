@@ -0,0 +1,185 @@
+# ============================================================================
+# CONTEXT BUDGET - Keep phi3:mini prompts inside a token budget
+# Newest turns verbatim, older turns folded into a rolling summary
+# ============================================================================
+
+import hashlib
+import math
+import re
+from typing import NamedTuple
+
+# Latin words, Arabic words, single digits, then any other visible character
+_PIECES = re.compile(r'[^\W\d_]+|\d|\S', re.UNICODE)
+_ARABIC_LETTER = re.compile(r'[؀-ۿ]')
+_SENTENCE_END = re.compile(r'(?<=[.!?؟])\s')
+_RECOMMENDED = re.compile(r'\*\*(?:Recommandation médicale|نصيحة طبية)\*\*:.*?\*\*(.+?)\*\*')
+# Chat template tokens around every message (<|user|> ... <|end|>)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """Approximate phi3:mini (Llama SentencePiece) token count, stdlib only.
+
+    French words average ~3.5 characters per token; Arabic script falls back
+    to near character-level pieces; digits, punctuation and emoji count alone.
+    Slightly overestimates, which is the safe side for a budget.
+    """
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if len(piece) == 1:
+            tokens += 2 if ord(piece) > 0xFFFF else 1
+        elif _ARABIC_LETTER.match(piece):
+            tokens += len(piece)
+        else:
+            tokens += math.ceil(len(piece) / 3.5)
+    return tokens
+
+
+def count_message_tokens(messages, count_tokens=estimate_tokens):
+    """Prompt tokens of a chat message list, including template overhead"""
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def message_key(row):
+    """Stable identity of a (message, sender, timestamp) history row"""
+    message, sender, timestamp = row
+    return hashlib.sha1(f"{timestamp}|{sender}|{message}".encode("utf-8")).hexdigest()[:16]
+
+
+class ConversationSummary(NamedTuple):
+    text: str
+    summarized_messages: int
+    last_message_key: str
+
+
+class ContextPlan(NamedTuple):
+    summary: str
+    history: list
+    folded: list
+    estimated_tokens: int
+
+
+def _first_sentence(text, max_chars):
+    text = " ".join(text.replace("**", "").split())
+    sentence = _SENTENCE_END.split(text, 1)[0]
+    if len(sentence) > max_chars:
+        sentence = sentence[:max_chars].rsplit(" ", 1)[0] + "…"
+    return sentence
+
+
+def summarize_turns(rows, language="fr"):
+    """One line per message: what the patient said, what was recommended"""
+    patient, assistant = ("المريض", "المساعد") if language == "ar" else ("Patient", "Assistant")
+    lines = []
+    for message, sender, _ in rows:
+        if sender == "user":
+            lines.append(f"- {patient}: {_first_sentence(message, 160)}")
+            continue
+        recommended = _RECOMMENDED.search(message)
+        if recommended:
+            lines.append(f"- {assistant}: → {recommended.group(1)}")
+        else:
+            lines.append(f"- {assistant}: {_first_sentence(message, 100)}")
+    return lines
+
+
+class ContextBudgeter:
+    """Chooses which history messages go verbatim into the prompt.
+
+    - everything fits: the whole history is sent, no summary
+    - otherwise the newest messages that fit ``max_prompt_tokens`` are kept
+      and the rest is folded into a rolling summary of at most
+      ``summary_tokens`` (extractive, so it costs no extra generation)
+
+    The summary only ever grows forward: it remembers the last message it
+    covers, and each turn folds just the messages that newly left the
+    prompt. When the history window is full the oldest turn is folded even
+    if it would fit, so no message leaves the window unsummarized.
+    ``max_prompt_tokens=0`` disables budgeting.
+
+    Folding changes the prompt right after the system prompt, which throws
+    away Ollama's prefix cache for the whole conversation. So a fold goes
+    further than needed: only ``fold_low_water`` of the room (tokens and
+    window) stays verbatim, and the next turns just append to a prompt
+    whose prefix is already cached. 1.0 folds the minimum every turn.
+    """
+
+    def __init__(self, max_prompt_tokens=1500, summary_tokens=256, window=20, count_tokens=estimate_tokens,
+                 fold_low_water=0.5):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.summary_tokens = summary_tokens
+        self.window = window
+        self.count_tokens = count_tokens
+        self.fold_low_water = fold_low_water
+
+    @property
+    def enabled(self):
+        return self.max_prompt_tokens > 0
+
+    def plan(self, base_tokens, history, summary=None, language="fr"):
+        """Split ``history`` given the tokens of the system prompt and new message.
+
+        Returns a ContextPlan; ``folded`` lists the rows newly summarized, so
+        the caller only persists the summary when it is not empty.
+        """
+        previous_text = summary.text if summary else ""
+        start = self._summarized_prefix(history, summary)
+        unsummarized = list(history[start:])
+        if not self.enabled:
+            return ContextPlan(previous_text, unsummarized, [], base_tokens + self._tokens(unsummarized))
+
+        # Messages that will leave the window on the next turn are folded now
+        must_fold = 0
+        if len(history) >= self.window:
+            must_fold = max(0, len(history) - (self.window - 2) - start)
+
+        available = self.max_prompt_tokens - base_tokens
+        if not previous_text and not must_fold and self._tokens(unsummarized) <= available:
+            return ContextPlan("", unsummarized, [], base_tokens + self._tokens(unsummarized))
+
+        available -= self.summary_tokens + MESSAGE_OVERHEAD_TOKENS
+        kept, used = self._newest_fitting(unsummarized[must_fold:], available, len(history))
+        if len(kept) < len(unsummarized) and self.fold_low_water < 1:
+            # Folding anyway: fold down to the low-water mark in one go
+            kept, used = self._newest_fitting(
+                kept, available * self.fold_low_water, int((self.window - 2) * self.fold_low_water)
+            )
+        folded = unsummarized[:len(unsummarized) - len(kept)]
+
+        text = self._fold(previous_text, folded, language) if folded else previous_text
+        summary_cost = self.count_tokens(text) + MESSAGE_OVERHEAD_TOKENS if text else 0
+        return ContextPlan(text, kept, folded, base_tokens + used + summary_cost)
+
+    def _newest_fitting(self, rows, available, max_rows):
+        """Newest rows (oldest first) that fit ``available`` tokens and ``max_rows``: (rows, tokens)"""
+        kept = []
+        used = 0
+        for row in reversed(rows):
+            cost = self.count_tokens(row[0]) + MESSAGE_OVERHEAD_TOKENS
+            if used + cost > available or len(kept) >= max_rows:
+                break
+            kept.append(row)
+            used += cost
+        kept.reverse()
+        return kept, used
+
+    def _tokens(self, rows):
+        return sum(self.count_tokens(row[0]) + MESSAGE_OVERHEAD_TOKENS for row in rows)
+
+    @staticmethod
+    def _summarized_prefix(history, summary):
+        """Number of leading history rows already covered by the summary"""
+        if not summary:
+            return 0
+        for i in range(len(history) - 1, -1, -1):
+            if message_key(history[i]) == summary.last_message_key:
+                return i + 1
+        # The marker is older than the window: nothing in it is summarized yet
+        return 0
+
+    def _fold(self, previous_text, rows, language):
+        lines = previous_text.splitlines() + summarize_turns(rows, language)
+        # Oldest points go first when the summary outgrows its budget
+        while len(lines) > 1 and self.count_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
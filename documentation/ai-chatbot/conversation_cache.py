@@ -0,0 +1,181 @@
+# ============================================================================
+# CONVERSATION CACHE - Recent history windows kept in memory between turns
+# ============================================================================
+
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Rough per-message overhead of the tuple and deque slot, on top of the strings
+_MESSAGE_OVERHEAD = 120
+
+
+def _message_size(row):
+    return _MESSAGE_OVERHEAD + sum(sys.getsizeof(value) for value in row)
+
+
+class _Entry:
+    __slots__ = ("messages", "size", "last_access")
+
+    def __init__(self, messages, window):
+        self.messages = deque(messages, maxlen=window)
+        self.size = sum(_message_size(row) for row in self.messages)
+        self.last_access = time.monotonic()
+
+
+class ConversationCache:
+    """Last ``window`` messages of recently active conversations.
+
+    Keyed by (conversation_id, patient_id); each value is the list of
+    (message, sender, timestamp) tuples ``get_conversation_history`` returns.
+
+    - a miss loads the window from SQLite once; later turns append the
+      messages they save, so the next turn needs no database read
+    - bounded by ``max_conversations`` and ``max_bytes`` (LRU eviction) and
+      by ``idle_ttl`` seconds without access
+    - appends only touch conversations that are already cached: a partial
+      window is never created from writes alone
+    - a load that raced with a save of the same conversation is not stored,
+      so the cache can never hold a window older than the database
+
+    The database stays the source of truth: anything that changes
+    chat_history outside ``append`` must call ``invalidate`` (or ``clear``).
+    This holds only while a single process writes the database.
+    """
+
+    def __init__(self, window=20, max_conversations=1000, max_bytes=64 * 1024 * 1024, idle_ttl=1800.0):
+        self.window = window
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        # key -> number of loads in flight; keys written meanwhile are stale
+        self._loading = {}
+        self._stale = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_conversations > 0 and self.max_bytes > 0
+
+    def get_or_load(self, key, limit, loader):
+        """Cached history for ``key``, or ``loader(window)`` stored for next time"""
+        if not self.enabled or limit > self.window:
+            return loader(limit)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.last_access > self.idle_ttl:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                entry.last_access = now
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry.messages)[-limit:] if limit else []
+            self.misses += 1
+            self._loading[key] = self._loading.get(key, 0) + 1
+
+        try:
+            messages = loader(self.window)
+        except Exception:
+            with self._lock:
+                self._finish_load(key)
+            raise
+
+        with self._lock:
+            if key not in self._stale and key not in self._entries:
+                self._store(key, _Entry(messages, self.window))
+            self._finish_load(key)
+        return list(messages)[-limit:] if limit else []
+
+    def append(self, key, messages):
+        """Record messages just saved for ``key`` (no-op when it is not cached)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if key in self._loading:
+                self._stale.add(key)
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            for row in messages:
+                if len(entry.messages) == self.window:
+                    entry.size -= _message_size(entry.messages[0])
+                    self._bytes -= _message_size(entry.messages[0])
+                entry.messages.append(row)
+                entry.size += _message_size(row)
+                self._bytes += _message_size(row)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def invalidate(self, key):
+        """Drop ``key`` so the next read goes to the database"""
+        with self._lock:
+            if key in self._loading:
+                self._stale.add(key)
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._stale.update(self._loading)
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "conversations": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _finish_load(self, key):
+        remaining = self._loading[key] - 1
+        if remaining:
+            self._loading[key] = remaining
+        else:
+            del self._loading[key]
+            self._stale.discard(key)
+
+    def _evict(self):
+        now = time.monotonic()
+        # Idle entries first: the least recently used end holds the oldest accesses
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.last_access <= self.idle_ttl:
+                break
+            self._remove(key)
+            self.expirations += 1
+        while self._entries and (len(self._entries) > self.max_conversations or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
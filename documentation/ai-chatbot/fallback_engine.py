@@ -0,0 +1,101 @@
+# ============================================================================
+# FALLBACK ENGINE - Rule-based answers while phi3:mini is unavailable
+# Specialist keyword tables + red-flag keywords + advice, stdlib only
+# ============================================================================
+
+import json
+import os
+import re
+from typing import NamedTuple
+
+from specialty_classifier import DEFAULT_KEYWORDS_PATH, SpecialtyClassifier
+
+DEFAULT_RULES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'fallback_rules.json'
+)
+
+# Appended to every answer, by the model path and the fallback alike
+RECOMMENDATION_TEMPLATES = {
+    "fr": "\n\n👨‍⚕️ **Recommandation médicale**: Je vous conseille de consulter un **{specialist}** {reason}.",
+    "ar": "\n\n👨‍⚕️ **نصيحة طبية**: نصحك تشوف **{specialist}** {reason}."
+}
+DISCLAIMERS = {
+    "fr": "\n\n⚠️ **Rappel**: Cette conversation est à titre informatif uniquement. **Consultez un professionnel de santé** pour tout problème médical.",
+    "ar": "\n\n⚠️ **تذكير**: هاد المحادثة غير للمعلومات فقط. **شوف طبيب مختص** لأي مشكل صحي."
+}
+# Why that specialist: the classifier's first matched keyword, or a general visit
+SPECIALIST_REASONS = {
+    "fr": {"matched": "pour les problèmes de {keyword}", "default": "pour une consultation générale"},
+    "ar": {"matched": "على حساب {keyword}", "default": "لفحص عام"}
+}
+# Text whose presence means an answer already carries a disclaimer
+DISCLAIMER_MARKERS = {"fr": "professionnel de santé", "ar": "طبيب مختص"}
+
+_ARABIC_LETTER = re.compile(r'[؀-ۿ]')
+
+
+def detect_language(message):
+    """'ar' for messages written in Arabic script, 'fr' otherwise"""
+    return "ar" if _ARABIC_LETTER.search(message) else "fr"
+
+
+class FallbackAnswer(NamedTuple):
+    text: str
+    language: str
+    specialist: str
+    urgent: bool
+    red_flags: tuple
+
+
+class FallbackEngine:
+    """Structured answer built from keyword tables, in well under a millisecond.
+
+    - red flags (chest pain, breathing difficulty, bleeding...) put an
+      emergency notice first
+    - the specialist is chosen with the same classifier as the model path
+    - a few generic, non-diagnostic tips for that specialty follow
+    - the usual recommendation and disclaimer close the answer
+
+    Red-flag keywords reuse the classifier's inverted index, with one table
+    entry per category, so the cost per message stays a couple of passes
+    over its tokens.
+    """
+
+    def __init__(self, classifier, rules):
+        self.classifier = classifier
+        self.rules = rules
+        self.red_flags = SpecialtyClassifier(rules["red_flags"], default_specialist=None)
+
+    @classmethod
+    def from_files(cls, keywords_path=DEFAULT_KEYWORDS_PATH, rules_path=DEFAULT_RULES_PATH):
+        with open(rules_path, encoding='utf-8') as f:
+            rules = json.load(f)
+        return cls(SpecialtyClassifier.from_file(keywords_path), rules)
+
+    def answer(self, message, language=None):
+        """Build the fallback answer; ``language`` is detected when omitted"""
+        if language not in self.rules["intro"]:
+            language = detect_language(message)
+
+        flags = tuple(match.specialist for match in self.red_flags.classify(message, top_k=None))
+        matches = self.classifier.classify(message, top_k=1)
+        reasons = SPECIALIST_REASONS[language]
+        if matches:
+            specialist = matches[0].specialist
+            reason = reasons["matched"].format(keyword=matches[0].keywords[0])
+        else:
+            specialist = self.classifier.default_specialist
+            reason = reasons["default"]
+
+        parts = []
+        if flags:
+            labels = self.rules["red_flag_labels"][language]
+            reasons_text = ", ".join(labels[flag] for flag in flags)
+            parts.append(self.rules["emergency"][language].format(reasons=reasons_text) + "\n\n")
+        parts.append(self.rules["intro"][language])
+        for tip in self.rules["advice"][language].get(specialist, ()):
+            parts.append(f"\n- {tip}")
+        parts.append(RECOMMENDATION_TEMPLATES[language].format(specialist=specialist, reason=reason))
+        parts.append(DISCLAIMERS[language])
+
+        return FallbackAnswer("".join(parts), language, specialist, bool(flags), flags)
@@ -0,0 +1,109 @@
+# ============================================================================
+# HEALTH MONITOR - Cached Ollama and SQLite liveness for /status and probes
+# One background thread runs the checks; requests only read the last result
+# ============================================================================
+
+import threading
+import time
+
+
+def _matches(name, model):
+    """'phi3:mini' matches 'phi3:mini'; an untagged 'phi3' matches any phi3 tag"""
+    return name == model or (":" not in model and name.split(":", 1)[0] == model)
+
+
+class HealthMonitor:
+    """Checks the model server and the database every ``interval`` seconds.
+
+    - Ollama: the model list (no generation) tells whether the server
+      answers and the model is installed; the running-models list whether
+      it is loaded in memory right now
+    - SQLite: ``SELECT 1`` on the monitor thread's own reader connection
+
+    ``snapshot()`` returns the last result with its age and never waits
+    for a check, so polling /status costs nothing on the model side. A
+    result older than ``stale_after`` seconds (three intervals by default)
+    is flagged stale.
+    """
+
+    def __init__(self, client, db, model="phi3:mini", interval=10.0, stale_after=None):
+        self.client = client
+        self.db = db
+        self.model = model
+        self.interval = interval
+        self.stale_after = stale_after or 3 * interval
+
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.checks = 0
+
+    def start(self):
+        """Check now and then every ``interval`` seconds, on a background thread"""
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            self.check()
+            if self._stop.wait(self.interval):
+                return
+
+    def check(self):
+        """Run both checks and cache the result"""
+        result = {"ollama": self._check_ollama(), "database": self._check_database()}
+        with self._lock:
+            self._result = result
+            self._checked_at = time.monotonic()
+            self.checks += 1
+        return result
+
+    def snapshot(self):
+        """Last check result, with ``age_s`` and ``stale``"""
+        with self._lock:
+            result, checked_at = self._result, self._checked_at
+        if result is None:
+            return {"age_s": None, "stale": True, "ollama": None, "database": None}
+        age = time.monotonic() - checked_at
+        return {"age_s": round(age, 2), "stale": age > self.stale_after, **result}
+
+    def _check_ollama(self):
+        started = time.perf_counter()
+        try:
+            installed = [entry["model"] for entry in self.client.list()["models"]]
+            loaded = [entry["model"] for entry in self.client.ps()["models"]]
+        except Exception as e:
+            return {
+                "reachable": False,
+                "model_available": False,
+                "model_loaded": False,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                "error": str(e)
+            }
+        return {
+            "reachable": True,
+            "model_available": any(_matches(name, self.model) for name in installed),
+            "model_loaded": any(_matches(name, self.model) for name in loaded),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "error": None
+        }
+
+    def _check_database(self):
+        started = time.perf_counter()
+        try:
+            with self.db.read() as conn:
+                conn.execute("SELECT 1").fetchone()
+        except Exception as e:
+            return {"reachable": False, "latency_ms": None, "error": str(e)}
+        return {
+            "reachable": True,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "error": None
+        }
@@ -0,0 +1,317 @@
+# ============================================================================
+# INFERENCE EXECUTION LAYER
+# Runs blocking phi3:mini generations off the asyncio event loop, in the
+# order chosen by admission control (urgent first, patients taking turns)
+# ============================================================================
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import URGENT, AdmissionQueue, DeadlineExceededError, QueueFullError, Ticket, retry_after_seconds
+
+# Marks the end of a streamed generation on the hand-off queue
+_STREAM_END = object()
+# Weight of the newest task in the moving average of task durations
+_SERVICE_TIME_ALPHA = 0.2
+
+
+class _WorkItem:
+    __slots__ = ("ticket", "key", "call", "future", "started")
+
+    def __init__(self, ticket, key, call, future):
+        self.ticket = ticket
+        self.key = key
+        self.call = call
+        self.future = future
+        self.started = None
+
+
+class InferenceExecutor:
+    """Bounded worker pool for blocking model calls, with admission control.
+
+    At most ``max_concurrency`` generations run at once; up to ``queue_depth``
+    more wait in an ``AdmissionQueue`` (urgent lane first, round-robin
+    between patients). A request is refused with ``QueueFullError`` instead
+    of piling up behind the model when:
+
+    - the queue is full (an urgent request evicts a normal one instead)
+    - its patient already has ``max_per_patient`` requests in flight
+      (urgent requests are exempt)
+    - its ticket's deadline falls before the estimated time it would be
+      answered, from the queue ahead of it and recent task durations
+
+    A queued request whose deadline passes before a worker frees up is
+    dropped with ``DeadlineExceededError`` and never runs. Once ``drain``
+    has been called every new request is refused ('shutting_down').
+    Submitting and completing tasks happens on the event loop thread.
+    """
+
+    def __init__(self, max_concurrency=2, queue_depth=16, max_per_patient=0):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        if queue_depth < 0:
+            raise ValueError("queue_depth must be >= 0")
+
+        self.max_concurrency = max_concurrency
+        self.queue_depth = queue_depth
+        self.max_per_patient = max_per_patient
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="inference"
+        )
+        self._lock = threading.Lock()
+        self._queue = AdmissionQueue(queue_depth)
+        self._per_patient = Counter()
+        self._active = 0
+        self._in_flight = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = Counter()
+        self._expired = 0
+        self._draining = False
+        # Moving average of task durations (seconds), None before the first one
+        self._service_time = None
+
+    async def submit(self, fn, *args, ticket=None, **kwargs):
+        """Run ``fn`` on a worker thread and await its result"""
+        return await self._enqueue(ticket, fn, *args, **kwargs)
+
+    def stream(self, gen_fn, *args, ticket=None, **kwargs):
+        """Run a blocking generator on a worker thread and relay its items.
+
+        Admission happens immediately (so ``QueueFullError`` surfaces before a
+        response is started); the returned async generator yields each item
+        as soon as the worker produces it.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def forward(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop already closed, nobody is listening anymore
+                stop.set()
+
+        def pump():
+            if stop.is_set():
+                # The client left while the request was queued
+                return
+            generator = gen_fn(*args, **kwargs)
+            try:
+                for item in generator:
+                    if stop.is_set():
+                        break
+                    forward((item, None))
+            except Exception as e:
+                forward((_STREAM_END, e))
+                return
+            finally:
+                generator.close()
+            forward((_STREAM_END, None))
+
+        def dropped(future):
+            # Evicted or past its deadline while queued: pump never ran
+            if not future.cancelled() and future.exception() is not None:
+                queue.put_nowait((_STREAM_END, future.exception()))
+
+        self._enqueue(ticket, pump).add_done_callback(dropped)
+        return self._relay(queue, stop)
+
+    async def _relay(self, queue, stop):
+        try:
+            while True:
+                item, error = await queue.get()
+                if item is _STREAM_END:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            # Client went away or consumer stopped early: let the worker bail out
+            stop.set()
+
+    def _enqueue(self, ticket, fn, *args, **kwargs):
+        """Admit the call, then start it now or queue it; returns its future"""
+        ticket = ticket or Ticket()
+        loop = asyncio.get_running_loop()
+        # Like asyncio.to_thread: the worker sees the caller's context
+        # variables (the request's trace span)
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, self._run, fn, *args, **kwargs)
+        # Requests without a patient are their own patient
+        key = ticket.patient_id if ticket.patient_id is not None else object()
+        item = _WorkItem(ticket, key, call, loop.create_future())
+
+        with self._lock:
+            self._admit(item)
+            self._in_flight += 1
+            self._per_patient[key] += 1
+            if self._active < self.max_concurrency:
+                self._start(item)
+                return item.future
+            try:
+                evicted = self._queue.push(item, key)
+            except QueueFullError as e:
+                self._forget(item)
+                self._reject("queue_full", str(e))
+            if evicted is not None:
+                self._forget(evicted)
+                self._rejected["evicted"] += 1
+                evicted.future.set_exception(QueueFullError(
+                    "Replaced in the queue by an urgent request", "evicted", self._retry_after()
+                ))
+        return item.future
+
+    def _admit(self, item):
+        ticket = item.ticket
+        if self._draining:
+            self._reject("shutting_down", "Server is shutting down")
+        # Urgent messages are never held back by the patient's other requests
+        if self.max_per_patient and ticket.patient_id is not None and not ticket.urgent \
+                and self._per_patient[item.key] >= self.max_per_patient:
+            # Their own requests finish first: about one task from now
+            self._reject(
+                "patient_limit", f"Patient already has {self.max_per_patient} requests in flight",
+                retry_after_seconds(self._service_time or 1)
+            )
+        if self._active < self.max_concurrency or ticket.deadline is None or self._service_time is None:
+            return
+        ahead = self._queue.queued(URGENT) if ticket.urgent else len(self._queue)
+        # Half a task for the running ones, then rounds of the queue ahead, then this one
+        eta = (ahead // self.max_concurrency + 1.5) * self._service_time
+        if time.monotonic() + eta > ticket.deadline:
+            self._reject("deadline", f"Estimated answer in {eta:.1f}s, after the client's deadline")
+
+    def _reject(self, reason, message, retry_after=None):
+        self._rejected[reason] += 1
+        raise QueueFullError(message, reason, retry_after or self._retry_after())
+
+    def _retry_after(self):
+        """Seconds until the queue has drained, as far as we can tell"""
+        waiting = len(self._queue)
+        return retry_after_seconds((waiting / self.max_concurrency + 1) * (self._service_time or 1))
+
+    def _forget(self, item):
+        self._in_flight -= 1
+        self._per_patient[item.key] -= 1
+        if not self._per_patient[item.key]:
+            del self._per_patient[item.key]
+
+    def _start(self, item):
+        self._active += 1
+        item.started = time.monotonic()
+        worker_future = asyncio.get_running_loop().run_in_executor(self._pool, item.call)
+        # The slot is only freed once the worker is really done, even if the
+        # awaiting request was cancelled in the meantime
+        worker_future.add_done_callback(functools.partial(self._finished, item))
+
+    def _finished(self, item, worker_future):
+        with self._lock:
+            self._active -= 1
+            self._forget(item)
+            took = time.monotonic() - item.started
+            if self._service_time is None:
+                self._service_time = took
+            else:
+                self._service_time += _SERVICE_TIME_ALPHA * (took - self._service_time)
+            self._start_next()
+        if item.future.cancelled():
+            return
+        if worker_future.cancelled():
+            item.future.cancel()
+        elif worker_future.exception() is not None:
+            item.future.set_exception(worker_future.exception())
+        else:
+            item.future.set_result(worker_future.result())
+
+    def _start_next(self):
+        """Fill free workers from the queue, dropping requests nobody waits for anymore"""
+        while self._active < self.max_concurrency:
+            item = self._queue.pop()
+            if item is None:
+                return
+            if item.future.cancelled():
+                self._forget(item)
+                continue
+            # The answer would only be ready after the client has given up
+            deadline = item.ticket.deadline
+            if deadline is not None and time.monotonic() + (self._service_time or 0) > deadline:
+                self._forget(item)
+                self._expired += 1
+                item.future.set_exception(DeadlineExceededError(
+                    "Client deadline reached while waiting for a worker"
+                ))
+                continue
+            self._start(item)
+
+    def _run(self, fn, *args, **kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    def run_on_each_worker(self, fn, timeout=30.0):
+        """Start every worker thread and call ``fn`` once on each.
+
+        Used at startup to open per-thread resources (SQLite readers) before
+        the first request needs them. Each call waits on a barrier, so the
+        pool has to start a new thread for the next one.
+        """
+        barrier = threading.Barrier(self.max_concurrency, timeout=timeout)
+
+        def task():
+            barrier.wait()
+            return fn()
+
+        futures = [self._pool.submit(task) for _ in range(self.max_concurrency)]
+        return [future.result() for future in futures]
+
+    def stats(self):
+        """Snapshot of pool occupancy for monitoring"""
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "queue_depth": self.queue_depth,
+                "in_flight": self._in_flight,
+                "running": self._running,
+                "queued": len(self._queue),
+                "queued_urgent": self._queue.queued(URGENT),
+                "max_per_patient": self.max_per_patient,
+                "completed": self._completed,
+                "rejected": sum(self._rejected.values()),
+                "rejected_by_reason": dict(self._rejected),
+                "expired": self._expired,
+                "service_time_s": round(self._service_time, 3) if self._service_time is not None else None
+            }
+
+    async def drain(self, timeout=None):
+        """Refuse new requests, then wait until the admitted ones are answered.
+
+        Queued requests still start as workers free up (the event loop keeps
+        running meanwhile). Returns how many were still in flight after
+        ``timeout`` seconds: 0 when everything drained.
+        """
+        with self._lock:
+            self._draining = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                in_flight = self._in_flight
+            if not in_flight or (deadline is not None and time.monotonic() >= deadline):
+                return in_flight
+            await asyncio.sleep(0.05)
+
+    def shutdown(self, wait=True):
+        """Stop accepting work and optionally wait for running generations"""
+        self._pool.shutdown(wait=wait)
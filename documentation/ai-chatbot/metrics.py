@@ -0,0 +1,321 @@
+# ============================================================================
+# METRICS - Prometheus text-format counters, gauges and histograms
+# Dependency-free: recording is a dict lookup, a bisect and a lock; the
+# text exposition is only built when /metrics is scraped
+# ============================================================================
+
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds: from a cached answer (sub-millisecond) to a long phi3:mini generation
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+TOKEN_COUNT_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """One metric family: a name, its help text and one value per label set"""
+
+    kind = None
+    suffix = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        self.sample_name = name + self.suffix
+
+    def labels(self, *values, **labels):
+        """Child for one label set, e.g. ``stage_seconds.labels(stage="history", language="fr")``"""
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}: use .labels()")
+        return self.labels()
+
+    def render(self):
+        name = self.sample_name
+        lines = [f"# HELP {name} {self.documentation}", f"# TYPE {name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonic total; exposed with the conventional ``_total`` suffix"""
+
+    kind = "counter"
+    suffix = "_total"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def _render_child(self, values, child):
+        yield f"{self.sample_name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (requests in flight, cache entries)"""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the seconds spent in its block"""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Histogram(_Metric):
+    """Distribution over fixed buckets (cumulative ``le`` counts, sum and count)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _format_value(float(bound)) + '"'
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+        labels = _format_labels(self.labelnames, values)
+        yield f"{self.name}_sum{labels} {_format_value(total)}"
+        yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Metric families plus collectors read at scrape time.
+
+    Collectors return ``(name, kind, help, samples)`` tuples with samples as
+    ``[(labels_dict, value), ...]``; they expose numbers other components
+    already keep (pool occupancy, cache counters) without touching their
+    hot paths.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect):
+        self._collectors.append(collect)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, documentation, samples in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class ChatMetrics:
+    """Metrics of the chat pipeline, labelled by language and model.
+
+    Stages of one answer: ``cache_lookup``, ``history`` (loading the
+    conversation window), ``prompt`` (budgeting and building the messages),
+    ``inference`` (phi3:mini), ``postprocess`` (specialist recommendation,
+    disclaimer, bold terms) and ``persist`` (saving the turn).
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        registry = self.registry
+        self.stage_seconds = registry.histogram(
+            "chatbot_stage_seconds", "Time spent in each chat pipeline stage",
+            ("stage", "language", "model")
+        )
+        self.response_seconds = registry.histogram(
+            "chatbot_response_seconds", "Time to produce a complete answer",
+            ("mode", "language", "model", "outcome")
+        )
+        self.time_to_first_token = registry.histogram(
+            "chatbot_time_to_first_token_seconds", "Streamed answers: time until the first token",
+            ("language", "model")
+        )
+        self.prompt_tokens = registry.counter(
+            "chatbot_prompt_tokens", "Prompt tokens evaluated by the model", ("language", "model")
+        )
+        self.cached_tokens = registry.counter(
+            "chatbot_prompt_cached_tokens", "Prompt tokens served from the model's prefix cache, when the backend reports them",
+            ("language", "model")
+        )
+        self.completion_tokens = registry.counter(
+            "chatbot_completion_tokens", "Tokens generated by the model", ("language", "model")
+        )
+        self.prompt_size = registry.histogram(
+            "chatbot_prompt_tokens_per_request", "Prompt tokens evaluated for one generation",
+            ("language", "model"), buckets=TOKEN_COUNT_BUCKETS
+        )
+        self.tokens_per_second = registry.histogram(
+            "chatbot_generation_tokens_per_second", "Decode speed of one generation",
+            ("language", "model"), buckets=TOKENS_PER_SECOND_BUCKETS
+        )
+        self.errors = registry.counter(
+            "chatbot_errors", "Failed answers by exception type", ("type", "language", "model")
+        )
+        self.in_flight = registry.gauge(
+            "chatbot_requests_in_flight", "Answers being produced right now", ("mode",)
+        )
+
+    def stage(self, stage, language, model):
+        """``with metrics.stage("history", "fr", "phi3:mini"):`` times one stage"""
+        return self.stage_seconds.labels(stage, language, model).time()
+
+    def record_generation(self, language, model, prompt_tokens, completion_tokens, decode_seconds, cached_tokens=None):
+        """Token counts of one model call; decode speed when its duration is known
+
+        ``prompt_tokens`` are the tokens the model evaluated, ``cached_tokens``
+        the rest of the prompt, reused from its prefix cache.
+        """
+        if prompt_tokens:
+            self.prompt_tokens.labels(language, model).inc(prompt_tokens)
+            self.prompt_size.labels(language, model).observe(prompt_tokens)
+        if cached_tokens:
+            self.cached_tokens.labels(language, model).inc(cached_tokens)
+        if completion_tokens:
+            self.completion_tokens.labels(language, model).inc(completion_tokens)
+            if decode_seconds:
+                self.tokens_per_second.labels(language, model).observe(completion_tokens / decode_seconds)
+
+    def record_error(self, error, language, model):
+        self.errors.labels(type(error).__name__, language, model).inc()
+
+    def render(self):
+        return self.registry.render()
@@ -0,0 +1,109 @@
+# ============================================================================
+# MICRO-BATCHER - Groups generations that arrive together into one batch
+# Callers block in submit(); a dispatcher thread collects up to
+# max_batch_size requests (waiting at most max_wait seconds after the first
+# one), runs them as one batch and hands each caller its own result
+# ============================================================================
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Dynamic batching in front of a model backend.
+
+    ``dispatch(items)`` receives the batch as a list and returns one entry
+    per item, in order: the result, or an Exception instance for an item
+    that failed on its own. An exception raised by ``dispatch`` itself
+    fails the whole batch. Batches run one at a time, so the backend never
+    sees more than ``max_batch_size`` generations at once; requests that
+    arrive meanwhile form the next batch.
+
+    A lone request waits at most ``max_wait`` seconds for company, and not
+    at all once the batch is full. Every caller of a batch gets its result
+    when the whole batch is done, so only put this in front of a backend
+    whose batch call costs much less than separate calls.
+    """
+
+    def __init__(self, dispatch, max_batch_size=8, max_wait=0.01):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.dispatch = dispatch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._batch_sizes = Counter()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Add ``item`` to the next batch and wait for its result"""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._pending.append((time.monotonic(), item, future))
+            self._condition.notify()
+        return future.result()
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return None
+            deadline = self._pending[0][0] + self.max_wait
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._batch_sizes[len(batch)] += 1
+            try:
+                results = self.dispatch([item for _, item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"dispatch returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, _, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        with self._condition:
+            queued = len(self._pending)
+        sizes = dict(self._batch_sizes)
+        batches = sum(sizes.values())
+        items = sum(size * count for size, count in sizes.items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "queued": queued,
+            "batches": batches,
+            "batched_requests": items,
+            "mean_batch_size": round(items / batches, 2) if batches else 0.0,
+            "batch_sizes": {str(size): count for size, count in sorted(sizes.items())}
+        }
+
+    def close(self):
+        """Run what is already queued, then stop the dispatcher"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout=60)
@@ -0,0 +1,424 @@
+# ============================================================================
+# MODEL BACKENDS - Registry of model servers behind one ollama-style client
+# Several Ollama instances or OpenAI-compatible servers (llama.cpp, vLLM...),
+# least-outstanding-requests balancing, per-backend health and latency,
+# and routing rules (short messages, Darija) to other models
+# ============================================================================
+
+import json
+import re
+import threading
+import time
+import urllib.request
+from collections import Counter
+from typing import NamedTuple, Optional
+
+_ARABIC_LETTER = re.compile(r'[؀-ۿ]')
+# Weight of the newest call in a backend's moving average latency
+_LATENCY_ALPHA = 0.2
+
+
+class OpenAICompatibleClient:
+    """``ollama.Client`` look-alike for servers speaking the OpenAI API.
+
+    ``base_url`` is the API root, e.g. ``http://127.0.0.1:8080/v1`` for
+    llama.cpp's server. Answers are translated to Ollama's shape: the
+    message, and prompt_eval_count / eval_count from ``usage`` (or from
+    llama.cpp's ``timings``, which also count only the prompt tokens it had
+    to evaluate). The prompt tokens reused from the server's prefix cache,
+    when it reports them, go in prompt_cache_count. keep_alive has no equivalent and is ignored: these
+    servers keep their model loaded.
+    """
+
+    def __init__(self, base_url, api_key=None, timeout=300.0):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def _request(self, path, payload=None):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    @staticmethod
+    def _payload(model, messages, options, stream):
+        payload = {"model": model, "messages": list(messages), "stream": stream}
+        for name, value in (options or {}).items():
+            if name in ("temperature", "top_p", "max_tokens", "seed", "stop"):
+                payload[name] = value
+            elif name == "num_predict":
+                payload["max_tokens"] = value
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    @staticmethod
+    def _counts(body):
+        timings = body.get("timings")
+        if timings:
+            return {
+                "prompt_eval_count": timings.get("prompt_n"),
+                "prompt_cache_count": timings.get("cache_n"),
+                "prompt_eval_duration": int(timings.get("prompt_ms", 0) * 1e6) or None,
+                "eval_count": timings.get("predicted_n"),
+                "eval_duration": int(timings.get("predicted_ms", 0) * 1e6) or None
+            }
+        usage = body.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        # OpenAI's prompt_tokens include the cached ones
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if prompt_tokens is not None and cached is not None:
+            prompt_tokens -= cached
+        return {
+            "prompt_eval_count": prompt_tokens,
+            "prompt_cache_count": cached,
+            "eval_count": usage.get("completion_tokens")
+        }
+
+    def chat(self, model, messages, options=None, stream=False, keep_alive=None, **kwargs):
+        payload = self._payload(model, messages, options, stream)
+        if stream:
+            return self._stream(model, payload)
+        with self._request("/chat/completions", payload) as response:
+            body = json.loads(response.read())
+        return {
+            "model": body.get("model", model),
+            "message": {"role": "assistant", "content": body["choices"][0]["message"]["content"]},
+            "done": True,
+            **self._counts(body)
+        }
+
+    def _stream(self, model, payload):
+        counts = {}
+        with self._request("/chat/completions", payload) as response:
+            for line in response:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage") or chunk.get("timings"):
+                    counts = self._counts(chunk)
+                for choice in chunk.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield {"model": model, "message": {"role": "assistant", "content": content}, "done": False}
+        yield {"model": model, "message": {"role": "assistant", "content": ""}, "done": True, **counts}
+
+    def list(self):
+        with self._request("/models") as response:
+            body = json.loads(response.read())
+        return {"models": [{"model": entry["id"], "name": entry["id"]} for entry in body.get("data", [])]}
+
+    def ps(self):
+        return self.list()
+
+    def embed(self, model, input, **kwargs):
+        with self._request("/embeddings", {"model": model, "input": input}) as response:
+            body = json.loads(response.read())
+        return {"model": model, "embeddings": [entry["embedding"] for entry in body["data"]]}
+
+
+class Backend:
+    """One model server: its client, the models it serves and its live numbers.
+
+    ``weight`` is its relative capacity (e.g. its OLLAMA_NUM_PARALLEL): the
+    balancer compares outstanding requests divided by it. After
+    ``max_failures`` failed calls in a row, or a failed health check, the
+    backend is skipped for ``cooldown`` seconds, or until a health check
+    reaches it again.
+    """
+
+    def __init__(self, name, client, models, weight=1.0, max_failures=3, cooldown=10.0):
+        self.name = name
+        self.client = client
+        self.models = tuple(models)
+        self.weight = weight
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.reachable = None
+        self.latency_s = None
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+    def serves(self, model):
+        return model in self.models
+
+    def snapshot(self):
+        return {
+            "name": self.name,
+            "models": list(self.models),
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "reachable": self.reachable,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ms": round(self.latency_s * 1000, 1) if self.latency_s is not None else None
+        }
+
+
+class RoutingRule(NamedTuple):
+    """Send matching chat requests to ``model`` instead of the default one
+
+    ``language`` ('ar' or 'fr') is read from the patient's message (Arabic
+    script means Darija); ``max_chars`` matches messages up to that length.
+    Unset conditions match everything.
+    """
+    model: str
+    language: Optional[str] = None
+    max_chars: Optional[int] = None
+
+    def matches(self, language, chars):
+        if self.language is not None and self.language != language:
+            return False
+        return self.max_chars is None or chars <= self.max_chars
+
+
+class ModelRouter:
+    """Drop-in for ``ollama.Client`` spreading calls over several backends.
+
+    A chat for ``default_model`` first goes through the routing rules (the
+    first match wins, if a backend serves its model); other models are
+    used as asked. Among the healthy backends serving the model, the one
+    with the fewest outstanding requests per unit of weight gets the call,
+    the faster one on a tie. A failed call is retried once on the next
+    best backend; a stream only when nothing was produced yet. When every
+    candidate is cooling down they are all tried anyway.
+
+    ``list()`` and ``ps()`` ask every backend (this is the health check:
+    it updates their state) and merge the answers, so HealthMonitor works
+    unchanged; they only fail when no backend answers.
+    """
+
+    def __init__(self, backends, default_model, rules=(), retries=1):
+        if not backends:
+            raise ValueError("at least one model backend is required")
+        self.backends = list(backends)
+        self.default_model = default_model
+        self.rules = list(rules)
+        self.retries = retries
+        self.routed = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec, default_model, **kwargs):
+        """Router for CHATBOT_BACKENDS: a JSON file, comma-separated Ollama URLs, or empty
+
+        Empty means one Ollama on OLLAMA_HOST (localhost:11434 by default).
+        """
+        spec = (spec or "").strip()
+        if spec.endswith(".json"):
+            with open(spec, encoding="utf-8") as f:
+                return cls.from_config(json.load(f), default_model, **kwargs)
+        hosts = [host.strip() for host in spec.split(",") if host.strip()] or [None]
+        backends = [
+            Backend(host or "ollama", _ollama_client(host), [default_model])
+            for host in hosts
+        ]
+        return cls(backends, default_model, **kwargs)
+
+    @classmethod
+    def from_config(cls, config, default_model, **kwargs):
+        """Router from ``{"backends": [...], "routes": [...]}`` (see data/backends.example.json)"""
+        backends = []
+        for i, entry in enumerate(config["backends"]):
+            kind = entry.get("type", "ollama")
+            if kind == "ollama":
+                client = _ollama_client(entry.get("url"))
+            elif kind == "openai":
+                client = OpenAICompatibleClient(entry["url"], entry.get("api_key"), entry.get("timeout", 300.0))
+            else:
+                raise ValueError(f"unknown backend type {kind!r} (expected 'ollama' or 'openai')")
+            backends.append(Backend(
+                entry.get("name", f"{kind}-{i}"),
+                client,
+                entry.get("models", [default_model]),
+                weight=entry.get("weight", 1.0),
+                max_failures=entry.get("max_failures", 3),
+                cooldown=entry.get("cooldown", 10.0)
+            ))
+        rules = [RoutingRule(**rule) for rule in config.get("routes", [])]
+        return cls(backends, default_model, rules, **kwargs)
+
+    def route(self, model, messages):
+        """Model a chat for ``model`` should use, after the routing rules"""
+        if model != self.default_model or not self.rules:
+            return model
+        message = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        language = "ar" if _ARABIC_LETTER.search(message) else "fr"
+        for rule in self.rules:
+            if rule.matches(language, len(message)) and any(b.serves(rule.model) for b in self.backends):
+                return rule.model
+        return model
+
+    def _serving(self, model):
+        """Backends serving ``model``; all of them when none lists it (let the servers decide)"""
+        return [b for b in self.backends if b.serves(model)] or self.backends
+
+    def _should_retry(self, model, tried):
+        return len(tried) <= self.retries and len(tried) < len(self._serving(model))
+
+    def _acquire(self, model, exclude=()):
+        """Least loaded backend for ``model`` not in ``exclude``, with its in-flight count taken"""
+        with self._lock:
+            candidates = [b for b in self._serving(model) if b not in exclude]
+            healthy = [b for b in candidates if b.healthy] or candidates
+            backend = min(healthy, key=lambda b: ((b.in_flight + 1) / b.weight, b.latency_s or 0.0))
+            backend.in_flight += 1
+            backend.requests += 1
+            return backend
+
+    def _release(self, backend, started, outcome="ok"):
+        """Give back the in-flight slot; 'failed' counts toward the cooldown, 'cancelled' is not timed"""
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            backend.in_flight -= 1
+            if outcome == "cancelled":
+                return
+            if outcome == "failed":
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= backend.max_failures:
+                    backend.down_until = time.monotonic() + backend.cooldown
+                return
+            backend.consecutive_failures = 0
+            backend.down_until = 0.0
+            if backend.latency_s is None:
+                backend.latency_s = elapsed
+            else:
+                backend.latency_s += _LATENCY_ALPHA * (elapsed - backend.latency_s)
+
+    def chat(self, model, messages, options=None, stream=False, keep_alive=None, **kwargs):
+        model = self.route(model, messages)
+        with self._lock:
+            self.routed[model] += 1
+        if stream:
+            return self._stream(model, messages, options, keep_alive, kwargs)
+
+        tried = []
+        while True:
+            backend = self._acquire(model, tried)
+            started = time.perf_counter()
+            try:
+                response = backend.client.chat(
+                    model=model, messages=messages, options=options, keep_alive=keep_alive, **kwargs
+                )
+            except Exception:
+                self._release(backend, started, "failed")
+                tried.append(backend)
+                if not self._should_retry(model, tried):
+                    raise
+                continue
+            self._release(backend, started)
+            return response
+
+    def _stream(self, model, messages, options, keep_alive, kwargs):
+        tried = []
+        while True:
+            backend = self._acquire(model, tried)
+            started = time.perf_counter()
+            produced = False
+            chunks = None
+            try:
+                chunks = backend.client.chat(
+                    model=model, messages=messages, options=options, keep_alive=keep_alive, stream=True, **kwargs
+                )
+                for chunk in chunks:
+                    produced = True
+                    yield chunk
+            except GeneratorExit:
+                # The client went away mid-answer: stop the backend's stream too
+                if hasattr(chunks, "close"):
+                    chunks.close()
+                self._release(backend, started, "cancelled")
+                raise
+            except Exception:
+                self._release(backend, started, "failed")
+                tried.append(backend)
+                if produced or not self._should_retry(model, tried):
+                    raise
+                continue
+            self._release(backend, started)
+            return
+
+    def embed(self, model, input, **kwargs):
+        backend = self._acquire(model)
+        started = time.perf_counter()
+        try:
+            response = backend.client.embed(model=model, input=input, **kwargs)
+        except Exception:
+            self._release(backend, started, "failed")
+            raise
+        self._release(backend, started)
+        return response
+
+    def warm_up(self, messages, options=None, keep_alive=None):
+        """Load every model on every backend serving it; fails only if none loads"""
+        errors = []
+        for backend in self.backends:
+            for model in backend.models:
+                try:
+                    backend.client.chat(model=model, messages=messages, options=options, keep_alive=keep_alive)
+                except Exception as e:
+                    errors.append(f"{backend.name}/{model}: {e}")
+        if len(errors) == sum(len(backend.models) for backend in self.backends):
+            raise ConnectionError("; ".join(errors))
+
+    def _each(self, method):
+        """Merge ``method``'s model list over the backends, recording who answered"""
+        models, errors = {}, []
+        for backend in self.backends:
+            try:
+                entries = getattr(backend.client, method)()["models"]
+            except Exception as e:
+                errors.append(f"{backend.name}: {e}")
+                with self._lock:
+                    backend.reachable = False
+                    backend.down_until = time.monotonic() + backend.cooldown
+                continue
+            with self._lock:
+                # A server that answers again gets traffic before its cooldown ends
+                if not backend.reachable or backend.consecutive_failures >= backend.max_failures:
+                    backend.consecutive_failures = 0
+                    backend.down_until = 0.0
+                backend.reachable = True
+            for entry in entries:
+                models.setdefault(entry["model"], entry)
+        if errors and len(errors) == len(self.backends):
+            raise ConnectionError("; ".join(errors))
+        return {"models": list(models.values())}
+
+    def list(self):
+        return self._each("list")
+
+    def ps(self):
+        return self._each("ps")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "default_model": self.default_model,
+                "rules": [rule._asdict() for rule in self.rules],
+                "routed": dict(self.routed),
+                "backends": [backend.snapshot() for backend in self.backends]
+            }
+
+
+def _ollama_client(host=None):
+    # Imported on first use: ollama (with httpx) is half the chatbot's import time
+    import ollama
+    return ollama.Client(host=host)
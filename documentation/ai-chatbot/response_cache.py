@@ -0,0 +1,175 @@
+# ============================================================================
+# RESPONSE CACHE - Reuse phi3:mini answers to repeated first questions
+# Exact tier on normalized text, optional embedding-similarity tier
+# ============================================================================
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from specialty_classifier import tokenize
+
+
+def normalize_question(text):
+    """Accent-, case- and punctuation-insensitive form of a question"""
+    return " ".join(tokenize(text))
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class CacheLookup:
+    """Result of ``ResponseCache.lookup``; pass it back to ``store`` on a miss"""
+
+    __slots__ = ("language", "key", "embedding", "answer", "tier")
+
+    def __init__(self, language, key, embedding=None, answer=None, tier=None):
+        self.language = language
+        self.key = key
+        self.embedding = embedding
+        self.answer = answer
+        self.tier = tier
+
+    @property
+    def hit(self):
+        return self.answer is not None
+
+
+class _Entry:
+    __slots__ = ("answer", "embedding", "generation_seconds", "created")
+
+    def __init__(self, answer, embedding, generation_seconds):
+        self.answer = answer
+        self.embedding = embedding
+        self.generation_seconds = generation_seconds
+        self.created = time.monotonic()
+
+
+class ResponseCache:
+    """Raw model answers to context-free questions, keyed by language.
+
+    - exact tier: same language and same normalized text
+      ("J'ai mal à la tête depuis 2 jours" == "j'ai mal a la tete depuis 2 jours !")
+    - semantic tier (only with ``embed``): the closest cached question of the
+      same language whose cosine similarity reaches ``similarity_threshold``
+    - entries expire after ``ttl`` seconds; beyond ``max_entries`` the least
+      recently used one is evicted
+
+    Answers are stored before post-processing: callers still run the
+    specialist/disclaimer step on every hit, for the question actually asked.
+    Only first-turn questions belong here; answers that depend on history
+    must bypass the cache.
+    """
+
+    def __init__(self, max_entries=500, ttl=3600.0, embed=None, similarity_threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.embed_errors = 0
+        self.saved_seconds = 0.0
+
+    def lookup(self, language, message):
+        """Find a cached answer for ``message``; always returns a CacheLookup"""
+        key = (language, normalize_question(message))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live_entry(key, now)
+            if entry is not None:
+                return self._hit(key, entry, "exact")
+
+        if self.embed is None:
+            with self._lock:
+                self.misses += 1
+            return CacheLookup(language, key)
+
+        try:
+            embedding = _unit(self.embed(message))
+        except Exception:
+            with self._lock:
+                self.embed_errors += 1
+                self.misses += 1
+            return CacheLookup(language, key)
+
+        # Candidates are copied under the lock and scored outside it: the scan
+        # is O(entries x dimensions) and must not hold up exact lookups
+        with self._lock:
+            candidates = [
+                (other_key, entry) for other_key, entry in self._entries.items()
+                if other_key[0] == language and entry.embedding is not None
+                and now - entry.created <= self.ttl
+            ]
+
+        best_key, best_entry, best_score = None, None, self.similarity_threshold
+        for other_key, entry in candidates:
+            score = sum(a * b for a, b in zip(embedding, entry.embedding))
+            if score >= best_score:
+                best_key, best_entry, best_score = other_key, entry, score
+
+        with self._lock:
+            # The entry may have been evicted or replaced while scoring
+            if best_key is not None and self._entries.get(best_key) is best_entry:
+                lookup = self._hit(best_key, best_entry, "semantic")
+                lookup.embedding = embedding
+                return lookup
+            self.misses += 1
+        return CacheLookup(language, key, embedding)
+
+    def store(self, lookup, answer, generation_seconds):
+        """Remember the raw answer generated after a missed ``lookup``"""
+        if lookup.hit or not answer:
+            return
+        with self._lock:
+            self._entries[lookup.key] = _Entry(answer, lookup.embedding, generation_seconds)
+            self._entries.move_to_end(lookup.key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "embed_errors": self.embed_errors,
+                "saved_inference_seconds": round(self.saved_seconds, 2)
+            }
+
+    def _live_entry(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.created > self.ttl:
+            del self._entries[key]
+            entry = None
+        return entry
+
+    def _hit(self, key, entry, tier):
+        self._entries.move_to_end(key)
+        if tier == "exact":
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        self.saved_seconds += entry.generation_seconds
+        return CacheLookup(key[0], key, entry.embedding, entry.answer, tier)
@@ -0,0 +1,133 @@
+# ============================================================================
+# SPECIALTY CLASSIFIER - Which specialist should the patient see?
+# Inverted index over normalized keyword tokens, scored in one pass
+# ============================================================================
+
+import json
+import os
+import re
+import unicodedata
+from typing import NamedTuple
+
+DEFAULT_KEYWORDS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'specialty_keywords.json'
+)
+
+_TOKEN = re.compile(r'\w+')
+_ARABIC_LETTER = re.compile(r'[؀-ۿ]')
+# Darija glues the article and some prepositions to the noun: الراس, فالصدر, والكرش
+_ARABIC_PREFIXES = ('وال', 'بال', 'فال', 'لل', 'ال')
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ى': 'ي', 'ـ': None})
+# Latin accents and Arabic harakat/hamza marks left over after NFKD
+_COMBINING_MARKS = re.compile('[\u0300-\u036f\u064b-\u065f\u0670]')
+
+
+def normalize_text(text):
+    """Lowercase, drop accents and Arabic diacritics (é -> e, أ -> ا)"""
+    decomposed = unicodedata.normalize('NFKD', text.lower().translate(_LIGATURES))
+    return _COMBINING_MARKS.sub('', decomposed)
+
+
+def _fold_token(token):
+    if _ARABIC_LETTER.match(token):
+        for prefix in _ARABIC_PREFIXES:
+            if token.startswith(prefix) and len(token) - len(prefix) >= 3:
+                return token[len(prefix):]
+        return token
+    # French plural: douleurs -> douleur, articulations -> articulation
+    if len(token) > 3 and token.endswith('s'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Accent-normalized word tokens, identical for keywords and messages"""
+    return [_fold_token(token) for token in _TOKEN.findall(normalize_text(text))]
+
+
+class SpecialtyMatch(NamedTuple):
+    specialist: str
+    score: int
+    confidence: float
+    keywords: tuple
+
+
+class SpecialtyClassifier:
+    """Scores every specialty against a message in a single left-to-right pass.
+
+    Keywords are indexed by their first normalized token, so the work per
+    message depends on the message length, not on the size of the keyword
+    tables. Multi-word keywords ('mal de tête') are matched longest first and
+    weigh one point per word, so they outrank the single words they contain.
+    """
+
+    def __init__(self, tables, default_specialist="médecin généraliste"):
+        self.tables = tables
+        self.default_specialist = default_specialist
+        self._index = {}
+
+        phrases = {}
+        for table in tables.values():
+            for specialist, keywords in table.items():
+                for keyword in keywords:
+                    tokens = tuple(tokenize(keyword))
+                    if not tokens:
+                        continue
+                    phrases.setdefault(tokens, []).append((specialist, keyword))
+
+        for tokens, owners in phrases.items():
+            self._index.setdefault(tokens[0], []).append((tokens, owners))
+        for candidates in self._index.values():
+            candidates.sort(key=lambda candidate: -len(candidate[0]))
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_KEYWORDS_PATH):
+        """Load keyword tables ({language: {specialist: [keywords]}}) from JSON"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['keywords'], data.get('default_specialist', "médecin généraliste"))
+
+    def classify(self, message, top_k=3):
+        """Ranked specialists for ``message`` (empty list when nothing matches)"""
+        tokens = tokenize(message)
+        scores = {}
+        hits = {}
+        first_seen = {}
+
+        i = 0
+        while i < len(tokens):
+            matched = None
+            for phrase, owners in self._index.get(tokens[i], ()):
+                if tuple(tokens[i:i + len(phrase)]) == phrase:
+                    matched = (phrase, owners)
+                    break
+
+            if matched is None:
+                i += 1
+                continue
+
+            phrase, owners = matched
+            for specialist, keyword in owners:
+                scores[specialist] = scores.get(specialist, 0) + len(phrase)
+                hits.setdefault(specialist, []).append(keyword)
+                first_seen.setdefault(specialist, i)
+            i += len(phrase)
+
+        if not scores:
+            return []
+
+        total = sum(scores.values())
+        ranked = sorted(scores, key=lambda specialist: (-scores[specialist], first_seen[specialist]))
+        return [
+            SpecialtyMatch(
+                specialist=specialist,
+                score=scores[specialist],
+                confidence=round(scores[specialist] / total, 3),
+                keywords=tuple(hits[specialist])
+            )
+            for specialist in ranked[:top_k]
+        ]
+
+    def classify_many(self, messages, top_k=3):
+        """Batch variant for offline analytics over large message logs"""
+        return [self.classify(message, top_k) for message in messages]
@@ -0,0 +1,78 @@
+# ============================================================================
+# TERM HIGHLIGHTER - Bold formatting for important medical terms
+# Compiled once at startup, applied in a single pass over each response
+# ============================================================================
+
+import re
+
+# Terms highlighted in every assistant answer
+MEDICAL_TERMS = [
+    'urgent', 'important', 'consultation', 'médecin', 'docteur',
+    'symptômes', 'douleur', 'traitement', 'médicament', 'urgence',
+    'neurologue', 'cardiologue', 'gastro-entérologue', 'dermatologue',
+    'gynécologue', 'urologue', 'pneumologue', 'rhumatologue',
+    'endocrinologue', 'psychiatre', 'orl', 'ophtalmologue',
+    '24h', '48h', '72h', 'heures', 'jours', 'semaines'
+]
+
+# Text that is already bold is copied through untouched
+_BOLD_SPAN = r'\*\*[^\n]*?\*\*'
+
+
+def _trie_pattern(terms):
+    """Build a prefix-factored alternation that tries the longest term first.
+
+    'urgent' and 'urgence' become 'urgen(?:ce|t)', so the regex engine walks
+    shared prefixes once instead of retrying every term at every position.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        is_terminal = '' in node
+        branches = [
+            re.escape(char) + build(child)
+            for char, child in sorted(node.items())
+            if char != ''
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if is_terminal:
+            # Greedy optional group: the longer term wins, shorter one is the fallback
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class TermHighlighter:
+    """Wraps whole-word occurrences of a fixed term list in ``**...**``.
+
+    - one compiled regex, one left-to-right pass per text
+    - longest match first (given 'urgence' and 'urgences', 'urgences' wins)
+    - whole words only ('orl' never matches inside another word)
+    - spans already inside ``**...**`` are left alone, so no '****' artifacts
+    - the matched text keeps its original casing
+    """
+
+    def __init__(self, terms=MEDICAL_TERMS):
+        self.terms = sorted({term.lower() for term in terms})
+        self.pattern = re.compile(
+            rf'({_BOLD_SPAN})|(?<!\w)({_trie_pattern(self.terms)})(?!\w)',
+            re.IGNORECASE
+        )
+
+    def highlight(self, text):
+        """Return ``text`` with every medical term in bold"""
+        return self.pattern.sub(self._replace, text)
+
+    @staticmethod
+    def _replace(match):
+        if match.group(1) is not None:
+            return match.group(1)
+        return f'**{match.group(2)}**'
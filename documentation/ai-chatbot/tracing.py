@@ -0,0 +1,354 @@
+# ============================================================================
+# TRACING - W3C trace context, spans exported as JSON lines, and opt-in
+# per-request profiling (wall-clock stack sampler or cProfile)
+#
+# The current span lives in a context variable, so stages running on the
+# inference workers attach to the request that submitted them (the
+# executor copies the context into the worker). Without an active sampled
+# span every hook is a single context variable lookup.
+# ============================================================================
+
+import cProfile
+import functools
+import inspect
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager, nullcontext
+from contextvars import ContextVar
+
+TRACEPARENT_HEADER = "traceparent"
+PROFILE_HEADER = "x-chatbot-profile"
+PROFILE_MODES = ("sample", "cprofile")
+
+_current_span = ContextVar("chatbot_current_span", default=None)
+# (mode, output path without extension) when the request asked for a profile
+_profile_request = ContextVar("chatbot_profile_request", default=None)
+_NO_SPAN = nullcontext()
+# cProfile can only be active on one thread at a time (Python 3.12+)
+_cprofile_lock = threading.Lock()
+
+
+def parse_traceparent(header):
+    """``00-<trace id>-<parent span id>-<flags>`` -> (trace_id, parent_id, sampled), or None"""
+    parts = header.strip().split("-") if header else []
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class Span:
+    """One timed operation of a trace; exported when it ends if sampled"""
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "kind", "attributes",
+                 "sampled", "start_time", "_started", "duration_ms", "error")
+
+    def __init__(self, tracer, name, trace_id, parent_id=None, sampled=True, kind="internal", attributes=None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.sampled = sampled
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+
+    def traceparent(self):
+        """Header value making this span the parent of the callee's spans"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self.sampled and self.tracer.exporter is not None:
+            self.tracer.exporter(self.to_dict())
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": self.tracer.service,
+            "start_time": round(self.start_time, 6),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class Tracer:
+    """Creates spans for one service and hands finished ones to ``exporter``.
+
+    ``exporter`` is any callable taking the span dict (``JsonlExporter`` for
+    a local file). Without an exporter nothing is recorded, but spans still
+    carry trace IDs for propagation and profiling. New traces are sampled
+    with probability ``sample_rate``; a caller's sampled traceparent is
+    always honoured.
+    """
+
+    def __init__(self, service, exporter=None, sample_rate=1.0):
+        self.service = service
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def start_span(self, name, parent=None, traceparent=None, kind="internal", attributes=None):
+        """Span under ``parent`` (a Span), a remote ``traceparent``, or a new trace"""
+        if parent is not None:
+            return Span(self, name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+        remote = parse_traceparent(traceparent)
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+            sampled = self.enabled and (sampled or random.random() < self.sample_rate)
+            return Span(self, name, trace_id, parent_id, sampled, kind, attributes)
+        sampled = self.enabled and random.random() < self.sample_rate
+        return Span(self, name, "%032x" % random.getrandbits(128), None, sampled, kind, attributes)
+
+    def current_span(self):
+        """The span current in this thread or task, if any"""
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Child of the current span (or a new trace), current while the block runs"""
+        span = self.start_span(name, parent=_current_span.get(), attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+
+class JsonlExporter:
+    """Appends one JSON object per finished span to ``path``
+
+    Each span is one line-buffered write in append mode, so the worker
+    processes of a multi-worker server can share the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def __call__(self, span):
+        line = json.dumps(span, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def current_span():
+    return _current_span.get()
+
+
+def trace_span(name, **attributes):
+    """Context manager timing ``name`` under the current sampled span (no-op otherwise)"""
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        return _NO_SPAN
+    return parent.tracer.span(name, **attributes)
+
+
+class WallClockSampler:
+    """Samples one thread's Python stack every ``interval`` seconds.
+
+    Unlike cProfile it sees time spent waiting (SQLite, HTTP to Ollama), which
+    is most of an answer. ``write`` produces collapsed stacks
+    (``frame;frame;frame count``) for flamegraph.pl, speedscope or inferno.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def _profiled(mode, path):
+    """Profile the calling thread while the block runs; writes ``path`` + .folded or .prof
+
+    A cProfile request falls back to the sampler while another one is running.
+    """
+    if mode == "cprofile" and _cprofile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(path + ".prof")
+        finally:
+            _cprofile_lock.release()
+        return
+    sampler = WallClockSampler(threading.get_ident())
+    try:
+        with sampler:
+            yield
+    finally:
+        sampler.write(path + ".folded")
+
+
+def _span_and_profile(name):
+    profile = _profile_request.get()
+    span = trace_span(name)
+    if profile is None:
+        return span
+    # Profile once per request: nested traced calls run without it
+    _profile_request.set(None)
+    stack = ExitStack()
+    stack.enter_context(span)
+    stack.enter_context(_profiled(*profile))
+    return stack
+
+
+def traced(name):
+    """Decorator: run the function (or whole generator) in a span named ``name``.
+
+    This is also where a requested profile is taken, on the thread that
+    actually runs the function (an inference worker for the chat pipeline).
+    """
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                with _span_and_profile(name):
+                    yield from fn(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span_and_profile(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TracingMiddleware:
+    """ASGI middleware: one server span per HTTP request.
+
+    Continues the caller's ``traceparent`` and returns this request's span as
+    ``traceparent`` on the response. When ``profile_dir`` is set, a request
+    with ``X-Chatbot-Profile: sample`` (or ``cprofile``) is profiled on the
+    worker that answers it and written to ``<profile_dir>/<trace id>.folded``
+    (or ``.prof``). With neither tracing nor profiling enabled requests pass
+    straight through.
+    """
+
+    def __init__(self, app, tracer, profile_dir=""):
+        self.app = app
+        self.tracer = tracer
+        self.profile_dir = profile_dir
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (self.tracer.enabled or self.profile_dir):
+            return await self.app(scope, receive, send)
+
+        headers = {}
+        for key, value in scope["headers"]:
+            if key in (b"traceparent", b"x-chatbot-profile"):
+                headers[key.decode("latin-1")] = value.decode("latin-1")
+        profile_mode = headers.get(PROFILE_HEADER, "").strip().lower() if self.profile_dir else ""
+        if profile_mode and profile_mode not in PROFILE_MODES:
+            profile_mode = "sample"
+
+        span = self.tracer.start_span(
+            f"{scope['method']} {scope['path']}",
+            traceparent=headers.get(TRACEPARENT_HEADER),
+            kind="server",
+            attributes={"http.method": scope["method"], "http.path": scope["path"]}
+        )
+        if not span.sampled and not profile_mode:
+            return await self.app(scope, receive, send)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                extra = [(b"traceparent", span.traceparent().encode("latin-1"))]
+                if profile_mode:
+                    extra.append((b"x-chatbot-profile", span.trace_id.encode("latin-1")))
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        span_token = _current_span.set(span)
+        profile_token = None
+        if profile_mode:
+            profile_token = _profile_request.set((profile_mode, os.path.join(self.profile_dir, span.trace_id)))
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            # Name by route template once routing is done: one name per endpoint, not per ID
+            route = scope.get("route")
+            if getattr(route, "path", None):
+                span.name = f"{scope['method']} {route.path}"
+            if profile_token is not None:
+                _profile_request.reset(profile_token)
+            _current_span.reset(span_token)
+            span.end()
@@ -0,0 +1,195 @@
+# Circuit breaker and retry helpers for calls to the Colab medical chatbot
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, Dict, Any, Tuple, Type
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling an unhealthy backend and lets callers fall back at once
+
+    - closed: calls go through; the outcome of the last ``window_size``
+      calls is kept, and once ``min_calls`` are recorded a failure rate of
+      ``failure_rate_threshold`` or more opens the circuit
+    - open: ``allow_request()`` returns False immediately. With a ``probe``
+      (e.g. client.test_connection) a background thread checks the backend
+      every ``probe_interval`` seconds and moves to half-open when it
+      answers; without one the circuit goes half-open after ``open_duration``
+    - half_open: up to ``half_open_max_calls`` trial calls are let through;
+      one success closes the circuit, one failure opens it again
+
+    Calls slower than ``slow_call_threshold`` seconds count as failures.
+    """
+
+    def __init__(self,
+                 window_size: int = 20,
+                 min_calls: int = 5,
+                 failure_rate_threshold: float = 0.5,
+                 open_duration: float = 30.0,
+                 half_open_max_calls: int = 1,
+                 probe: Optional[Callable[[], bool]] = None,
+                 probe_interval: float = 5.0,
+                 slow_call_threshold: Optional[float] = None):
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self.slow_call_threshold = slow_call_threshold
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._probing = False
+        self._stop = threading.Event()
+
+        self.counters = {
+            "successes": 0,
+            "failures": 0,
+            "rejected": 0,
+            "opened": 0,
+            "probes": 0,
+            "probe_failures": 0
+        }
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """True if the call may go to the backend; False means use the fallback"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self, duration: Optional[float] = None):
+        if self.slow_call_threshold is not None and duration is not None and duration > self.slow_call_threshold:
+            self.record_failure()
+            return
+        with self._lock:
+            self.counters["successes"] += 1
+            if self._state == HALF_OPEN:
+                self._close()
+            else:
+                self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self.counters["failures"] += 1
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(False)
+            if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                if self._failure_rate() >= self.failure_rate_threshold:
+                    self._open()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state,
+                "failure_rate": round(self._failure_rate(), 3),
+                "window_calls": len(self._outcomes),
+                "open_for_s": round(time.monotonic() - self._opened_at, 1) if self._state != CLOSED else 0.0,
+                **self.counters
+            }
+
+    def close(self):
+        """Stop the background probe"""
+        self._stop.set()
+
+    # Transitions (called with the lock held)
+
+    def _failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_calls = 0
+        self.counters["opened"] += 1
+        if self.probe is not None and not self._probing:
+            self._probing = True
+            threading.Thread(target=self._probe_loop, name="circuit-probe", daemon=True).start()
+
+    def _close(self):
+        self._state = CLOSED
+        self._outcomes.clear()
+        self._half_open_calls = 0
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and self.probe is None:
+            if time.monotonic() - self._opened_at >= self.open_duration:
+                self._state = HALF_OPEN
+                self._half_open_calls = 0
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            try:
+                healthy = bool(self.probe())
+            except Exception:
+                healthy = False
+            with self._lock:
+                if self._state != OPEN:
+                    self._probing = False
+                    return
+                self.counters["probes"] += 1
+                if not healthy:
+                    self.counters["probe_failures"] += 1
+                    continue
+                self._state = HALF_OPEN
+                self._half_open_calls = 0
+                # Cleared under the lock, so the next _open() starts a new probe
+                self._probing = False
+                return
+        with self._lock:
+            self._probing = False
+
+
+class RetryableError(Exception):
+    """Raised for responses worth retrying (e.g. HTTP 502/503/504)"""
+
+
+def retry_with_backoff(fn: Callable[[], Any],
+                       attempts: int = 3,
+                       base_delay: float = 0.2,
+                       max_delay: float = 2.0,
+                       retry_on: Tuple[Type[BaseException], ...] = (RetryableError,),
+                       on_retry: Optional[Callable[[int, BaseException], None]] = None):
+    """
+    Call ``fn`` until it succeeds, sleeping a random ("full jitter") delay
+    between 0 and min(max_delay, base_delay * 2**attempt) between tries
+
+    Only for idempotent calls such as history reads: a retried POST /chat
+    could generate and save the same answer twice.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt == attempts - 1:
+                raise
+            if on_retry is not None:
+                on_retry(attempt + 1, e)
+            time.sleep(random.uniform(0, min(max_delay, base_delay * (2 ** attempt))))
@@ -0,0 +1,424 @@
+# Async client for the Colab medical chatbot (requires: pip install httpx)
+import asyncio
+import json
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any, AsyncIterator, Iterator
+
+import httpx
+
+from colab_integration import (
+    Conversation, api_error, chat_headers, end_client_span, endpoint_label, request_histogram, start_client_span
+)
+
+
+class AsyncConversation:
+    """Handle on one patient's conversation, for the async client"""
+
+    def __init__(self, client: "AsyncColabMedicalChatbot", conversation_id: str, patient_id: str, language: str = "fr"):
+        self.client = client
+        self.conversation_id = conversation_id
+        self.patient_id = patient_id
+        self.language = language
+
+    async def send(self, message: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send a message in this conversation"""
+        return await self.client.send_message(
+            message, self.patient_id, self.conversation_id, timeout, language=self.language
+        )
+
+    def stream(self, message: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the answer to a message in this conversation"""
+        return self.client.stream_message(message, self.patient_id, self.conversation_id, language=self.language)
+
+    async def history(self, page_size: int = 20, cursor: Optional[int] = None) -> Dict[str, Any]:
+        """Most recent messages of this conversation"""
+        return await self.client.get_conversation_history(self.conversation_id, self.patient_id, page_size, cursor)
+
+    def __repr__(self):
+        return f"AsyncConversation({self.conversation_id!r}, patient_id={self.patient_id!r})"
+
+
+class AsyncColabMedicalChatbot:
+    def __init__(self,
+                 colab_api_url: str,
+                 max_concurrency: int = 32,
+                 max_connections: int = 32,
+                 timeout: float = 30.0,
+                 connect_timeout: float = 10.0,
+                 metrics=None,
+                 tracer=None):
+        """
+        Asyncio version of ColabMedicalChatbot for services handling many patients
+
+        All calls share one pooled httpx.AsyncClient (HTTP keep-alive), so
+        thousands of conversations can be in flight without one thread each.
+        Like ColabMedicalChatbot it keeps no conversation state.
+
+        Args:
+            colab_api_url: The public URL from ngrok (e.g., "https://xxxxx.ngrok.io")
+            max_concurrency: Requests allowed in flight at once; extra calls wait
+            max_connections: Size of the HTTP connection pool. Keep it small:
+                the chatbot only runs a few generations at a time, and the
+                httpx pool gets CPU-bound past a few dozen connections
+            timeout: Default read/write timeout in seconds (override per call)
+            connect_timeout: Timeout for opening a new connection
+            metrics: Optional metrics registry recording each call's latency
+                and status (see colab_integration.request_histogram)
+            tracer: Optional tracer; chat calls then send a traceparent
+                header and return the trace_id (see colab_integration.start_client_span)
+        """
+        self.api_url = colab_api_url.rstrip('/')
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_concurrency = max_concurrency
+        self.request_seconds = request_histogram(metrics)
+        self.tracer = tracer
+        self.client = httpx.AsyncClient(
+            base_url=self.api_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout)
+        )
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close pooled connections"""
+        await self.client.aclose()
+
+    def _timeout(self, timeout: Optional[float]) -> httpx.Timeout:
+        return httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout)
+
+    async def _request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        # Created lazily: the semaphore belongs to the loop that uses the client
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            if self.request_seconds is None:
+                return await self.client.request(method, path, timeout=self._timeout(timeout), **kwargs)
+            # Timed once a slot is free: the latency of the chatbot, not of this client's queue
+            started = time.perf_counter()
+            status = "error"
+            try:
+                response = await self.client.request(method, path, timeout=self._timeout(timeout), **kwargs)
+                status = response.status_code
+                return response
+            except httpx.TimeoutException:
+                status = "timeout"
+                raise
+            finally:
+                self.request_seconds.labels(endpoint_label(path), str(status)).observe(
+                    time.perf_counter() - started
+                )
+
+    async def test_connection(self) -> bool:
+        """Test connection to Colab API"""
+        try:
+            response = await self._request("GET", "/", timeout=10)
+            return response.status_code == 200
+        except Exception as e:
+            print(f"Connection error: {e}")
+            return False
+
+    async def start_new_conversation(self) -> str:
+        """Start a new conversation and return its ID"""
+        try:
+            response = await self._request("POST", "/reset-conversation", timeout=10)
+            if response.status_code == 200:
+                return response.json()["conversation_id"]
+            raise Exception(f"Failed to start new conversation: {response.text}")
+        except Exception as e:
+            print(f"Error starting new conversation: {e}")
+            return str(uuid.uuid4())
+
+    async def new_conversation(self, patient_id: str = "windows_patient", language: str = "fr") -> AsyncConversation:
+        """Start a conversation for a patient and return its handle"""
+        return AsyncConversation(self, await self.start_new_conversation(), patient_id, language)
+
+    def conversation(self, conversation_id: str, patient_id: str = "windows_patient", language: str = "fr") -> AsyncConversation:
+        """Handle on an existing conversation"""
+        return AsyncConversation(self, conversation_id, patient_id, language)
+
+    async def send_message(self,
+                           message: str,
+                           patient_id: str = "windows_patient",
+                           conversation_id: Optional[str] = None,
+                           timeout: Optional[float] = None,
+                           language: str = "fr") -> Dict[str, Any]:
+        """
+        Send message to medical chatbot
+
+        Without conversation_id a new conversation is started; its ID is
+        returned in the result.
+
+        Returns:
+            Dictionary with response, conversation_id, status
+        """
+        conv_id = conversation_id or await self.start_new_conversation()
+        payload = {
+            "message": message,
+            "conversation_id": conv_id,
+            "patient_id": patient_id,
+            "language": language
+        }
+
+        status = "error"
+        span, headers = start_client_span(self.tracer, "POST /chat", conversation_id=conv_id)
+        try:
+            response = await self._request(
+                "POST", "/chat", json=payload, headers=chat_headers(headers, timeout or self.timeout), timeout=timeout
+            )
+            status = response.status_code
+            if response.status_code == 200:
+                result = response.json()
+                if span is not None:
+                    result["trace_id"] = span.trace_id
+                return result
+            return api_error(response, conv_id)
+        except httpx.TimeoutException:
+            status = "timeout"
+            return {
+                "response": "Timeout: Le serveur met trop de temps à répondre. Veuillez réessayer.",
+                "conversation_id": conv_id,
+                "status": "timeout"
+            }
+        except Exception as e:
+            return {
+                "response": f"Erreur de connexion: {str(e)}",
+                "conversation_id": conv_id,
+                "status": "error"
+            }
+        finally:
+            end_client_span(span, status)
+
+    async def stream_message(self,
+                             message: str,
+                             patient_id: str = "windows_patient",
+                             conversation_id: Optional[str] = None,
+                             language: str = "fr") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Send message and yield response events as the model produces them
+
+        Same events as ColabMedicalChatbot.stream_message: 'start', 'token'
+        events, then 'done' (with client_time_to_first_token_ms) or 'error'.
+        The read timeout applies between chunks, not to the whole answer.
+        """
+        conv_id = conversation_id or await self.start_new_conversation()
+        payload = {
+            "message": message,
+            "conversation_id": conv_id,
+            "patient_id": patient_id,
+            "language": language
+        }
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        status = "error"
+        span, headers = start_client_span(self.tracer, "POST /chat/stream", conversation_id=conv_id)
+        async with self._semaphore:
+            started = time.perf_counter()
+            first_token_at = None
+            try:
+                async with self.client.stream(
+                    "POST", "/chat/stream", json=payload, headers=headers, timeout=self._timeout(None)
+                ) as response:
+                    status = response.status_code
+                    if response.status_code != 200:
+                        await response.aread()
+                        yield {
+                            "type": "error",
+                            "response": f"Erreur API: {response.text}",
+                            "conversation_id": conv_id,
+                            "status": "error"
+                        }
+                        return
+
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event["type"] == "token" and first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        if event["type"] == "done":
+                            finished = first_token_at or time.perf_counter()
+                            event["client_time_to_first_token_ms"] = round((finished - started) * 1000, 1)
+                            if span is not None:
+                                event["trace_id"] = span.trace_id
+                        yield event
+            except httpx.TimeoutException:
+                status = "timeout"
+                yield {
+                    "type": "error",
+                    "response": "Timeout: Le serveur met trop de temps à répondre. Veuillez réessayer.",
+                    "conversation_id": conv_id,
+                    "status": "timeout"
+                }
+            except Exception as e:
+                yield {
+                    "type": "error",
+                    "response": f"Erreur de connexion: {str(e)}",
+                    "conversation_id": conv_id,
+                    "status": "error"
+                }
+            finally:
+                # Whole stream, from the request to the last event
+                if self.request_seconds is not None:
+                    self.request_seconds.labels("/chat/stream", str(status)).observe(time.perf_counter() - started)
+                end_client_span(span, status)
+
+    async def get_conversation_history(self,
+                                       conversation_id: str,
+                                       patient_id: str = "windows_patient",
+                                       page_size: int = 20,
+                                       cursor: Optional[int] = None,
+                                       timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Get conversation history (most recent page; pass next_cursor as cursor for older messages)"""
+        conv_id = conversation_id
+        if not conv_id:
+            return {"history": [], "error": "No conversation ID"}
+
+        params = {"patient_id": patient_id, "page_size": page_size}
+        if cursor is not None:
+            params["cursor"] = cursor
+        try:
+            response = await self._request("GET", f"/conversations/{conv_id}", params=params, timeout=timeout)
+            if response.status_code == 200:
+                return response.json()
+            return {"history": [], "error": response.text}
+        except Exception as e:
+            return {"history": [], "error": str(e)}
+
+
+class SyncColabMedicalChatbot:
+    def __init__(self,
+                 async_client: AsyncColabMedicalChatbot,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        Blocking facade over an AsyncColabMedicalChatbot
+
+        Calls run on the event loop that owns the async client, so threaded
+        code and asyncio code share one connection pool and one concurrency
+        limit. Pass the running loop of your async service as ``loop``;
+        without it a private loop thread is started.
+
+        Never call it from the loop thread itself: it would wait on itself.
+        """
+        self.async_client = async_client
+        self._owns_loop = loop is None
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, name="colab-client-loop", daemon=True)
+            self._thread.start()
+        self.loop = loop
+
+    @classmethod
+    def from_url(cls, colab_api_url: str, **client_options) -> "SyncColabMedicalChatbot":
+        """Create the async client and its facade in one step"""
+        return cls(AsyncColabMedicalChatbot(colab_api_url, **client_options))
+
+    def _run(self, coroutine):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            coroutine.close()
+            raise RuntimeError("SyncColabMedicalChatbot called from its own event loop; await the async client instead")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def test_connection(self) -> bool:
+        return self._run(self.async_client.test_connection())
+
+    def start_new_conversation(self) -> str:
+        return self._run(self.async_client.start_new_conversation())
+
+    def new_conversation(self, patient_id: str = "windows_patient", language: str = "fr") -> Conversation:
+        """Start a conversation for a patient and return its (blocking) handle"""
+        return Conversation(self, self.start_new_conversation(), patient_id, language)
+
+    def conversation(self, conversation_id: str, patient_id: str = "windows_patient", language: str = "fr") -> Conversation:
+        return Conversation(self, conversation_id, patient_id, language)
+
+    def send_message(self,
+                     message: str,
+                     patient_id: str = "windows_patient",
+                     conversation_id: Optional[str] = None,
+                     timeout: Optional[float] = None,
+                     language: str = "fr") -> Dict[str, Any]:
+        return self._run(self.async_client.send_message(message, patient_id, conversation_id, timeout, language))
+
+    def stream_message(self,
+                       message: str,
+                       patient_id: str = "windows_patient",
+                       conversation_id: Optional[str] = None,
+                       language: str = "fr") -> Iterator[Dict[str, Any]]:
+        """Blocking iterator over the async client's stream_message events"""
+        events = self.async_client.stream_message(message, patient_id, conversation_id, language)
+
+        async def next_event():
+            return await events.__anext__()
+
+        try:
+            while True:
+                try:
+                    yield self._run(next_event())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Stopped early (break, close): release the connection on the loop
+            self._run(events.aclose())
+
+    def get_conversation_history(self,
+                                 conversation_id: str,
+                                 patient_id: str = "windows_patient",
+                                 page_size: int = 20,
+                                 cursor: Optional[int] = None,
+                                 timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self._run(self.async_client.get_conversation_history(
+            conversation_id, patient_id, page_size, cursor, timeout
+        ))
+
+    def close(self):
+        """Close the pool; stops the private loop thread if this facade started it"""
+        self._run(self.async_client.aclose())
+        if self._owns_loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+            self.loop.close()
+
+
+# Example usage and testing
+if __name__ == "__main__":
+    COLAB_API_URL = "https://your-ngrok-url.ngrok.io"  # Update this!
+
+    async def main():
+        async with AsyncColabMedicalChatbot(COLAB_API_URL) as chatbot:
+            if not await chatbot.test_connection():
+                print("❌ Failed to connect to Colab Medical Chatbot")
+                return
+
+            # Several patients at once over the same connection pool
+            questions = [
+                "J'ai des maux de tête depuis 2 jours",
+                "J'ai de la fièvre depuis hier",
+                "Mon enfant tousse la nuit"
+            ]
+            conversations = [await chatbot.new_conversation(f"patient_{i}") for i in range(len(questions))]
+            results = await asyncio.gather(*[
+                conversation.send(question)
+                for conversation, question in zip(conversations, questions)
+            ])
+            for question, result in zip(questions, results):
+                print(f"\n👤 User: {question}")
+                print(f"🤖 Bot: {result['response']}")
+
+    asyncio.run(main())
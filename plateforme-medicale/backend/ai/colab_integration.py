@@ -1,20 +1,188 @@
 # Save this as colab_integration.py on your Windows machine
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import os
+import sys
+import time
 import uuid
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
+
+from circuit_breaker import CircuitBreaker, RetryableError, retry_with_backoff
+
+# Rule-based answers during outages come from the chatbot's fallback_engine
+# (with specialty_classifier and data/). Found next to this file, else in
+# CHATBOT_FALLBACK_DIR, by default documentation/ai-chatbot of this repository.
+FALLBACK_DIR = os.getenv("CHATBOT_FALLBACK_DIR", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    "documentation", "ai-chatbot"
+))
+
+def import_fallback_engine(directory: str = FALLBACK_DIR):
+    """The FallbackEngine class, or None when it cannot be found"""
+    try:
+        from fallback_engine import FallbackEngine
+        return FallbackEngine
+    except ImportError:
+        pass
+    if not os.path.isfile(os.path.join(directory, "fallback_engine.py")):
+        return None
+    # Appended: modules next to this file keep precedence
+    if directory not in sys.path:
+        sys.path.append(directory)
+    from fallback_engine import FallbackEngine
+    return FallbackEngine
+
+FallbackEngine = import_fallback_engine()
+
+# Gateway/overload answers worth retrying for idempotent reads
+RETRYABLE_STATUS_CODES = (502, 503, 504)
+# Tells the server how long we wait for an answer, so it can refuse (429)
+# or drop a request it could not answer in time instead of generating it
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
+def chat_headers(headers: Optional[Dict[str, str]], timeout: float) -> Dict[str, str]:
+    """Headers of a /chat call: tracing (if any) plus our timeout"""
+    return {**(headers or {}), REQUEST_TIMEOUT_HEADER: f"{timeout:g}"}
+
+def api_error(response, conversation_id: str) -> Dict[str, Any]:
+    """
+    Result for a non-200 chat answer
+    
+    A saturated server answers 429 with Retry-After: it is passed on as
+    retry_after (seconds) so callers can back off or show the fallback.
+    """
+    result = {
+        "response": f"Erreur API: {response.text}",
+        "conversation_id": conversation_id,
+        "status": "error",
+        "status_code": response.status_code
+    }
+    retry_after = response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        result["retry_after"] = int(retry_after)
+    return result
+
+def request_histogram(metrics):
+    """
+    Client-side latency histogram on a metrics registry (None without one)
+    
+    Pass a metrics.MetricsRegistry (copy metrics.py from
+    documentation/ai-chatbot here) and serve its render() to Prometheus.
+    The per-status _count series double as request counts by status.
+    Clients sharing a registry share the histogram.
+    """
+    if metrics is None:
+        return None
+    name = "colab_client_request_seconds"
+    existing = metrics.get(name)
+    if existing is not None:
+        return existing
+    try:
+        return metrics.histogram(
+            name,
+            "Chatbot API calls seen from the backend, by endpoint and HTTP status (or timeout/error)",
+            ("endpoint", "status")
+        )
+    except ValueError:
+        # Registered by another client in the meantime
+        return metrics.get(name)
+
+def start_client_span(tracer, name: str, parent=None, **attributes):
+    """
+    (span, headers) for an outgoing chatbot call, or (None, None) without a tracer
+    
+    Pass a tracing.Tracer (copy tracing.py from documentation/ai-chatbot
+    here). The span is a child of ``parent``, by default the tracer's
+    current span (e.g. the backend request opened with ``tracer.span``), so
+    backend, client and server spans share one trace. The traceparent
+    header makes the server's request and stage spans children of this
+    one, so the gap between the two durations is the time spent in ngrok
+    and on the network.
+    """
+    if tracer is None:
+        return None, None
+    if parent is None:
+        parent = tracer.current_span()
+    span = tracer.start_span(name, parent=parent, kind="client", attributes=attributes)
+    return span, {"traceparent": span.traceparent()}
+
+def end_client_span(span, status):
+    if span is not None:
+        span.set_attribute("http.status_code", status)
+        span.end()
+
+def endpoint_label(path: str) -> str:
+    """'/conversations/<id>' -> '/conversations', so IDs never become label values"""
+    if path.startswith("/conversations/"):
+        return "/conversations"
+    return path
+
+class Conversation:
+    """
+    Handle on one patient's conversation
+    
+    Carries its own conversation_id and patient_id, so any number of
+    handles can share one client from different threads without their
+    messages ever being posted to another conversation.
+    """
+    
+    def __init__(self, client, conversation_id: str, patient_id: str, language: str = "fr"):
+        self.client = client
+        self.conversation_id = conversation_id
+        self.patient_id = patient_id
+        self.language = language
+    
+    def send(self, message: str) -> Dict[str, Any]:
+        """Send a message in this conversation"""
+        return self.client.send_message(message, self.patient_id, self.conversation_id, language=self.language)
+    
+    def stream(self, message: str) -> Iterator[Dict[str, Any]]:
+        """Stream the answer to a message in this conversation"""
+        return self.client.stream_message(message, self.patient_id, self.conversation_id, language=self.language)
+    
+    def history(self, page_size: int = 20, cursor: Optional[int] = None) -> Dict[str, Any]:
+        """Most recent messages of this conversation"""
+        return self.client.get_conversation_history(self.conversation_id, self.patient_id, page_size, cursor)
+    
+    def __repr__(self):
+        return f"Conversation({self.conversation_id!r}, patient_id={self.patient_id!r})"
 
 class ColabMedicalChatbot:
-    def __init__(self, colab_api_url: str):
+    def __init__(self,
+                 colab_api_url: str,
+                 max_connections: int = 32,
+                 timeout: float = 30.0,
+                 read_retries: int = 3,
+                 metrics=None,
+                 tracer=None):
         """
         Initialize connection to your Google Colab medical chatbot
         
+        The client keeps no conversation state: every call names its
+        conversation (or use the handles from new_conversation), so one
+        instance can be shared by all patients and threads of the backend.
+        
         Args:
             colab_api_url: The public URL from ngrok (e.g., "https://xxxxx.ngrok.io")
+            max_connections: Keep-alive connections kept for concurrent threads
+            timeout: Seconds to wait for a chat answer
+            read_retries: Attempts for history reads (jittered backoff between them)
+            metrics: Optional metrics registry recording each call's latency
+                and status (see request_histogram)
+            tracer: Optional tracer; chat calls then send a traceparent
+                header and return the trace_id (see start_client_span)
         """
         self.api_url = colab_api_url.rstrip('/')
+        self.timeout = timeout
+        self.read_retries = read_retries
+        self.retried_reads = 0
+        self.request_seconds = request_histogram(metrics)
+        self.tracer = tracer
         self.session = requests.Session()
-        self.current_conversation_id = None
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         
         # Test connection
         if self.test_connection():
@@ -32,110 +200,277 @@ class ColabMedicalChatbot:
             return False
     
     def start_new_conversation(self) -> str:
-        """Start a new conversation"""
+        """Start a new conversation and return its ID"""
+        started = time.perf_counter()
+        status = "error"
         try:
-            response = self.session.post(f"{self.api_url}/reset-conversation")
+            response = self.session.post(f"{self.api_url}/reset-conversation", timeout=10)
+            status = response.status_code
             if response.status_code == 200:
-                data = response.json()
-                self.current_conversation_id = data["conversation_id"]
-                return self.current_conversation_id
+                return response.json()["conversation_id"]
             else:
                 raise Exception(f"Failed to start new conversation: {response.text}")
         except Exception as e:
             print(f"Error starting new conversation: {e}")
-            self.current_conversation_id = str(uuid.uuid4())
-            return self.current_conversation_id
+            return str(uuid.uuid4())
+        finally:
+            self._observe("/reset-conversation", status, started)
+    
+    def new_conversation(self, patient_id: str = "windows_patient", language: str = "fr") -> Conversation:
+        """Start a conversation for a patient and return its handle"""
+        return Conversation(self, self.start_new_conversation(), patient_id, language)
+    
+    def conversation(self, conversation_id: str, patient_id: str = "windows_patient", language: str = "fr") -> Conversation:
+        """Handle on an existing conversation (e.g. an ID stored by your backend)"""
+        return Conversation(self, conversation_id, patient_id, language)
     
     def send_message(self, 
                     message: str, 
                     patient_id: str = "windows_patient",
-                    conversation_id: Optional[str] = None) -> Dict[str, Any]:
+                    conversation_id: Optional[str] = None,
+                    language: str = "fr") -> Dict[str, Any]:
         """
         Send message to medical chatbot
         
         Args:
             message: User's medical question
             patient_id: Unique patient identifier
-            conversation_id: Conversation ID (optional, will create new if None)
+            conversation_id: Conversation ID (a new conversation is started if None;
+                its ID is returned in the result)
+            language: "fr" or "ar"
         
         Returns:
             Dictionary with response, conversation_id, status
         """
+        conversation_id = conversation_id or self.start_new_conversation()
+        started = time.perf_counter()
+        status = "error"
+        span, headers = start_client_span(self.tracer, "POST /chat", conversation_id=conversation_id)
         try:
-            # Use provided conversation_id or current one
-            if conversation_id:
-                self.current_conversation_id = conversation_id
-            elif not self.current_conversation_id:
-                self.start_new_conversation()
-            
             # Prepare request
             payload = {
                 "message": message,
-                "conversation_id": self.current_conversation_id,
+                "conversation_id": conversation_id,
                 "patient_id": patient_id,
-                "language": "fr"
+                "language": language
             }
             
             # Send request
             response = self.session.post(
                 f"{self.api_url}/chat",
                 json=payload,
-                timeout=30  # Longer timeout for AI response
+                headers=chat_headers(headers, self.timeout),
+                timeout=self.timeout  # Longer timeout for AI response
             )
+            status = response.status_code
             
             if response.status_code == 200:
-                return response.json()
+                result = response.json()
+                if span is not None:
+                    result["trace_id"] = span.trace_id
+                return result
             else:
-                return {
-                    "response": f"Erreur API: {response.text}",
-                    "conversation_id": self.current_conversation_id,
-                    "status": "error"
-                }
+                return api_error(response, conversation_id)
                 
         except requests.exceptions.Timeout:
+            status = "timeout"
             return {
                 "response": "Timeout: Le serveur met trop de temps à répondre. Veuillez réessayer.",
-                "conversation_id": self.current_conversation_id,
+                "conversation_id": conversation_id,
                 "status": "timeout"
             }
         except Exception as e:
             return {
                 "response": f"Erreur de connexion: {str(e)}",
-                "conversation_id": self.current_conversation_id,
+                "conversation_id": conversation_id,
                 "status": "error"
             }
+        finally:
+            self._observe("/chat", status, started)
+            end_client_span(span, status)
+    
+    def stream_message(self,
+                       message: str,
+                       patient_id: str = "windows_patient",
+                       conversation_id: Optional[str] = None,
+                       language: str = "fr") -> Iterator[Dict[str, Any]]:
+        """
+        Send message and yield response events as the model produces them
+        
+        Yields 'start', then 'token' events ({"type": "token", "content": ...}),
+        then a final 'done' event holding the formatted response (specialist
+        recommendation, disclaimer, bold text) or an 'error' event. The 'done'
+        event also carries client-side time-to-first-token in milliseconds.
+        
+        The read timeout applies between chunks, not to the whole answer, so
+        long answers no longer hit the 30 s limit of send_message.
+        """
+        conversation_id = conversation_id or self.start_new_conversation()
+        payload = {
+            "message": message,
+            "conversation_id": conversation_id,
+            "patient_id": patient_id,
+            "language": language
+        }
+        
+        started = time.perf_counter()
+        first_token_at = None
+        status = "error"
+        span, headers = start_client_span(self.tracer, "POST /chat/stream", conversation_id=conversation_id)
+        try:
+            with self.session.post(
+                f"{self.api_url}/chat/stream",
+                json=payload,
+                headers=headers,
+                stream=True,
+                timeout=(10, 30)  # (connect, max silence between chunks)
+            ) as response:
+                status = response.status_code
+                if response.status_code != 200:
+                    yield {
+                        "type": "error",
+                        "response": f"Erreur API: {response.text}",
+                        "conversation_id": conversation_id,
+                        "status": "error"
+                    }
+                    return
+                
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line.decode("utf-8"))
+                    if event["type"] == "token" and first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    if event["type"] == "done":
+                        finished = first_token_at or time.perf_counter()
+                        event["client_time_to_first_token_ms"] = round((finished - started) * 1000, 1)
+                        if span is not None:
+                            event["trace_id"] = span.trace_id
+                    yield event
+                    
+        except requests.exceptions.Timeout:
+            status = "timeout"
+            yield {
+                "type": "error",
+                "response": "Timeout: Le serveur met trop de temps à répondre. Veuillez réessayer.",
+                "conversation_id": conversation_id,
+                "status": "timeout"
+            }
+        except Exception as e:
+            yield {
+                "type": "error",
+                "response": f"Erreur de connexion: {str(e)}",
+                "conversation_id": conversation_id,
+                "status": "error"
+            }
+        finally:
+            # Whole stream, from the request to the last event
+            self._observe("/chat/stream", status, started)
+            end_client_span(span, status)
     
     def get_conversation_history(self, 
-                               conversation_id: Optional[str] = None,
-                               patient_id: str = "windows_patient") -> Dict[str, Any]:
-        """Get conversation history"""
+                               conversation_id: str,
+                               patient_id: str = "windows_patient",
+                               page_size: int = 20,
+                               cursor: Optional[int] = None) -> Dict[str, Any]:
+        """Get conversation history (most recent page; pass next_cursor as cursor for older messages)"""
+        started = time.perf_counter()
+        status = "error"
         try:
-            conv_id = conversation_id or self.current_conversation_id
-            if not conv_id:
+            if not conversation_id:
                 return {"history": [], "error": "No conversation ID"}
             
-            response = self.session.get(
-                f"{self.api_url}/conversations/{conv_id}",
-                params={"patient_id": patient_id}
+            params = {"patient_id": patient_id, "page_size": page_size}
+            if cursor is not None:
+                params["cursor"] = cursor
+            
+            def read():
+                response = self.session.get(
+                    f"{self.api_url}/conversations/{conversation_id}",
+                    params=params,
+                    timeout=10
+                )
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    raise RetryableError(f"HTTP {response.status_code}: {response.text}")
+                return response
+            
+            # Reads are idempotent, so transient failures are retried
+            response = retry_with_backoff(
+                read,
+                attempts=self.read_retries,
+                retry_on=(RetryableError, requests.exceptions.ConnectionError, requests.exceptions.Timeout),
+                on_retry=self._count_retry
             )
+            status = response.status_code
             
             if response.status_code == 200:
                 return response.json()
             else:
                 return {"history": [], "error": response.text}
                 
+        except requests.exceptions.Timeout as e:
+            status = "timeout"
+            return {"history": [], "error": str(e)}
         except Exception as e:
             return {"history": [], "error": str(e)}
+        finally:
+            if conversation_id:
+                self._observe("/conversations", status, started)
+    
+    def _count_retry(self, attempt: int, error: BaseException):
+        self.retried_reads += 1
+    
+    def _observe(self, endpoint: str, status, started: float):
+        if self.request_seconds is not None:
+            self.request_seconds.labels(endpoint, str(status)).observe(time.perf_counter() - started)
+
+def is_backend_failure(result: Dict[str, Any]) -> bool:
+    """
+    Timeouts, connection errors, 5xx and 429 count against the backend;
+    other 4xx do not
+    
+    A 429 is the server shedding load: counting it keeps the breaker's
+    window honest during overload, and opening sends patients to the
+    fallback instead of adding to the queue.
+    """
+    if result["status"] == "timeout":
+        return True
+    status_code = result.get("status_code")
+    return status_code is None or status_code == 429 or status_code >= 500
 
 # Integration with your existing backend
-def integrate_with_existing_backend(colab_api_url: str):
+def integrate_with_existing_backend(colab_api_url: str,
+                                    breaker: Optional[CircuitBreaker] = None,
+                                    client: Optional[ColabMedicalChatbot] = None,
+                                    fallback_engine=None,
+                                    require_fallback: bool = False):
     """
     Integration function for your existing medical platform
     Replace the Ollama service calls with this Colab integration
+    
+    While Colab/ngrok is failing, a circuit breaker sends messages straight
+    to the fallback instead of waiting for each request to time out. The
+    returned function exposes it as ``.breaker`` (``.breaker.stats()`` for
+    state and counters) and the client as ``.client``.
+    
+    Fallback answers come from the rule-based FallbackEngine (detected
+    specialist, red-flag urgency notice, general advice, disclaimer), see
+    FALLBACK_DIR. Without it outages get a generic apology and a warning
+    is printed; ``require_fallback=True`` raises instead.
     """
     
-    # Initialize Colab chatbot
-    colab_bot = ColabMedicalChatbot(colab_api_url)
+    # One stateless client (and connection pool) shared by every patient
+    colab_bot = client or ColabMedicalChatbot(colab_api_url)
+    if breaker is None:
+        breaker = CircuitBreaker(probe=colab_bot.test_connection)
+    if fallback_engine is None and FallbackEngine is not None:
+        fallback_engine = FallbackEngine.from_files()
+    if fallback_engine is None:
+        message = (f"fallback_engine not found next to colab_integration.py or in {FALLBACK_DIR} "
+                   "(set CHATBOT_FALLBACK_DIR)")
+        if require_fallback:
+            raise RuntimeError(message)
+        print(f"⚠️ {message}: outages will get a generic apology, without red-flag detection")
     
     def enhanced_generate_medical_response(message: str, 
                                         conversation_id: str,
@@ -144,7 +479,12 @@ def integrate_with_existing_backend(colab_api_url: str):
         Enhanced function that replaces your existing Ollama calls
         This maintains the same interface but uses Colab backend
         """
+        # Backend known to be down: answer from the fallback right away
+        if not breaker.allow_request():
+            return generate_fallback_response(message, patient_id)
+        
         try:
+            started = time.perf_counter()
             result = colab_bot.send_message(
                 message=message,
                 patient_id=patient_id,
@@ -152,21 +492,31 @@ def integrate_with_existing_backend(colab_api_url: str):
             )
             
             if result["status"] == "success":
+                breaker.record_success(time.perf_counter() - started)
                 return result["response"]
             else:
+                if is_backend_failure(result):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
                 # Fallback to your existing rule-based system
                 return generate_fallback_response(message, patient_id)
                 
         except Exception as e:
             print(f"Colab integration error: {e}")
+            breaker.record_failure()
             # Fallback to your existing system
             return generate_fallback_response(message, patient_id)
     
     def generate_fallback_response(message: str, patient_id: str) -> str:
         """Fallback to your existing rule-based system"""
-        # Use your existing enhanced rule-based system here
+        if fallback_engine is not None:
+            return fallback_engine.answer(message).text
         return "Je suis désolé, le service AI temporairement indisponible. Veuillez réessayer ou contacter un professionnel de santé."
     
+    enhanced_generate_medical_response.breaker = breaker
+    enhanced_generate_medical_response.client = colab_bot
+    enhanced_generate_medical_response.fallback_engine = fallback_engine
     return enhanced_generate_medical_response
 
 # Example usage and testing
@@ -178,8 +528,8 @@ if __name__ == "__main__":
     chatbot = ColabMedicalChatbot(COLAB_API_URL)
     
     # Start new conversation
-    conversation_id = chatbot.start_new_conversation()
-    print(f"Started conversation: {conversation_id}")
+    conversation = chatbot.new_conversation("test_patient")
+    print(f"Started conversation: {conversation.conversation_id}")
     
     # Test medical queries
     test_messages = [
@@ -190,10 +540,21 @@ if __name__ == "__main__":
     
     for message in test_messages:
         print(f"\n👤 User: {message}")
-        result = chatbot.send_message(message, "test_patient")
+        result = conversation.send(message)
         print(f"🤖 Bot: {result['response']}")
         print(f"Status: {result['status']}")
     
+    # Stream an answer token by token
+    print("\n👤 User: J'ai de la fièvre depuis hier")
+    print("🤖 Bot: ", end="", flush=True)
+    for event in conversation.stream("J'ai de la fièvre depuis hier"):
+        if event["type"] == "token":
+            print(event["content"], end="", flush=True)
+        elif event["type"] == "done":
+            print(f"\n⚡ Time to first token: {event['client_time_to_first_token_ms']} ms")
+        elif event["type"] == "error":
+            print(f"\n❌ {event['response']}")
+    
     # Get conversation history
-    history = chatbot.get_conversation_history()
+    history = conversation.history()
     print(f"\n📖 Conversation history: {len(history.get('history', []))} messages")
\ No newline at end of file